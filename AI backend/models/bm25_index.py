@@ -0,0 +1,209 @@
+"""
+Persistent inverted index with Okapi BM25 scoring.
+
+Complements the dense vector index with exact lexical matching, which
+embedding models handle poorly for short tokens such as "SQL", institute
+names or certification codes.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9+#]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "he", "her", "his", "i", "in", "is", "it", "me", "of", "on", "or", "she", "show",
+    "that", "the", "their", "to", "was", "who", "with", "find", "any", "all"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into terms, keeping tokens like c++, c# and node.js"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked ID lists with reciprocal rank fusion
+
+    Args:
+        rankings: Lists of document IDs, best first
+        k: Damping constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        List of (doc_id, fused_score) sorted by score, best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """Inverted index of document terms scored with Okapi BM25
+
+    Only per-document term frequencies are persisted (as JSON); the postings
+    lists are rebuilt when the index is loaded.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._dirty = False
+
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Load the index from disk if it exists"""
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index from {self.path}, starting empty: {e}")
+            return
+
+        with self._lock:
+            self.clear()
+            for doc_id, terms in data.get("documents", {}).items():
+                self._index_terms(doc_id, terms)
+            self._dirty = False
+
+        logger.info(f"Loaded BM25 index with {len(self._doc_terms)} documents from {self.path}")
+
+    def save(self):
+        """Write the index to disk atomically if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"k1": self.k1, "b": self.b, "documents": self._doc_terms}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def _index_terms(self, doc_id: str, terms: Dict[str, int]):
+        self._doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def add(self, doc_id: str, text: str):
+        """Add or replace a document"""
+        with self._lock:
+            self.remove(doc_id)
+            self._index_terms(doc_id, dict(Counter(tokenize(text))))
+            self._dirty = True
+
+    def add_many(self, doc_ids: Iterable[str], texts: Iterable[str]):
+        """Add or replace several documents"""
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                self.add(doc_id, text)
+
+    def remove(self, doc_id: str):
+        """Remove a document if it is indexed"""
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+
+            self._total_length -= self._doc_lengths.pop(doc_id, 0)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._dirty = True
+
+    def clear(self):
+        """Remove all documents"""
+        with self._lock:
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._postings = {}
+            self._total_length = 0
+            self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 10,
+        allowed_ids: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """Score documents against the query with BM25
+
+        Args:
+            query: Free-text query
+            n_results: Maximum number of results
+            allowed_ids: Optional set restricting which documents may match
+
+        Returns:
+            List of (doc_id, score) sorted by score, best first
+        """
+        terms = tokenize(query)
+
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not terms or n_docs == 0:
+                return []
+
+            avg_length = self._total_length / n_docs
+            scores: Dict[str, float] = {}
+
+            for term, query_tf in Counter(terms).items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed_ids is not None and doc_id not in allowed_ids:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + query_tf * idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
@@ -0,0 +1,313 @@
+"""
+Small in-process caching and request-coalescing helpers shared by the AI backend modules.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+import numpy as np
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional time-to-live and hit/miss counters"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value and mark it as recently used"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._data[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def purge_expired(self) -> int:
+        """Remove entries whose TTL has passed and return how many were removed"""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            expired = [key for key, (_, stored_at) in self._data.items() if self._expired(stored_at)]
+            for key in expired:
+                del self._data[key]
+            self.expirations += len(expired)
+            return len(expired)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not self._expired(entry[1])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict:
+        """Size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class SemanticCache:
+    """Thread-safe cache of values keyed by embedding similarity
+
+    An entry matches a lookup when the cosine similarity of their embeddings
+    is at least `threshold` and both were made against the same set of
+    retrieved documents. Entries expire after `ttl_seconds`, the least
+    recently used entry is evicted when full, and everything is dropped when
+    the caller reports a different index version.
+    """
+
+    def __init__(self, max_size: int = 512, threshold: float = 0.92, ttl_seconds: Optional[float] = 3600):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._next_key = 0
+        self._version: Hashable = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.doc_mismatches = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+
+    def _check_version(self, version: Hashable):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _similarities(self, vector: np.ndarray):
+        """Keys and cosine similarities of all entries, rebuilding the matrix if stale"""
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = (
+                np.vstack([self._entries[key][0] for key in self._matrix_keys])
+                if self._matrix_keys else np.empty((0, len(vector)), dtype=np.float32)
+            )
+        if self._matrix.shape[1] != len(vector):
+            return [], np.empty(0, dtype=np.float32)
+        return self._matrix_keys, self._matrix @ vector
+
+    def get(self, embedding, doc_ids: Iterable[str], version: Hashable = None, default: Any = None) -> Any:
+        """Value of the most similar live entry made against the same documents"""
+        vector = self._normalize(embedding)
+        doc_set = frozenset(doc_ids)
+
+        with self._lock:
+            self._check_version(version)
+            keys, similarities = self._similarities(vector)
+
+            doc_mismatch = False
+            for i in np.argsort(-similarities):
+                if similarities[i] < self.threshold:
+                    break
+                key = keys[i]
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if self._expired(entry[3]):
+                    del self._entries[key]
+                    self._matrix = None
+                    self.expirations += 1
+                    continue
+                if entry[1] != doc_set:
+                    doc_mismatch = True
+                    continue
+
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+
+            self.misses += 1
+            self.doc_mismatches += doc_mismatch
+            return default
+
+    def put(self, embedding, doc_ids: Iterable[str], value: Any, version: Hashable = None):
+        """Store a value, evicting the least recently used entry when full
+
+        Values computed against an older index version are discarded.
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            if self._version is not None and version != self._version:
+                # The index changed while the value was being computed
+                return
+            self._version = version
+            self._entries[self._next_key] = (self._normalize(embedding), frozenset(doc_ids), value, time.monotonic())
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        """Size, hit/miss counters and invalidations"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_size,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "doc_mismatches": self.doc_mismatches,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is running wait for it and receive the same result (or exception). The
+    result object is shared, so callers must treat it as read-only.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn, or wait for the in-flight call with the same key"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def get_stats(self) -> Dict:
+        """Executions and calls that shared another call's result"""
+        calls = self.executions + self.coalesced
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+            "in_flight": len(self._calls)
+        }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines running on one event loop
+
+    The shared execution runs as a task, so a waiter that is cancelled (for
+    example because its client disconnected) does not cancel it for the others.
+    """
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the in-flight call with the same key"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            self.executions += 1
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
@@ -0,0 +1,208 @@
+"""
+Incrementally maintained statistics for a vector database collection.
+
+Counts are updated from document metadata as records are added, replaced or
+deleted, and persisted as JSON next to the collection, so reading them is
+O(1) and always reflects the whole corpus.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bounds (exclusive) of the length histogram buckets, in characters
+LENGTH_BUCKETS = (100, 250, 500, 1000, 2000, 5000, 10000)
+
+LENGTH_FIELDS = ("instruction_length", "response_length")
+
+
+def _bucket_labels():
+    labels = []
+    lower = 0
+    for upper in LENGTH_BUCKETS:
+        labels.append(f"{lower}-{upper - 1}")
+        lower = upper
+    labels.append(f"{lower}+")
+    return labels
+
+
+BUCKET_LABELS = _bucket_labels()
+
+
+def length_bucket(length: int) -> str:
+    """Histogram bucket label for a text length"""
+    for label, upper in zip(BUCKET_LABELS, LENGTH_BUCKETS):
+        if length < upper:
+            return label
+    return BUCKET_LABELS[-1]
+
+
+class CollectionStats:
+    """Per-sector/per-source counts and length histograms for one collection"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._dirty = False
+        self.clear()
+        self._dirty = False
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Load the stats record from disk if it exists"""
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load collection stats from {self.path}, starting empty: {e}")
+            return
+
+        with self._lock:
+            self.documents = data.get("documents", 0)
+            self.sectors = data.get("sectors", {})
+            self.sources = data.get("sources", {})
+            self.length_totals = data.get("length_totals", {field: 0 for field in LENGTH_FIELDS})
+            self.length_histograms = data.get(
+                "length_histograms", {field: {} for field in LENGTH_FIELDS}
+            )
+            self.last_build_time = data.get("last_build_time")
+            self.last_build = data.get("last_build")
+            self._dirty = False
+
+    def save(self):
+        """Write the stats record to disk atomically if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._payload(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _payload(self) -> Dict:
+        return {
+            "documents": self.documents,
+            "sectors": self.sectors,
+            "sources": self.sources,
+            "length_totals": self.length_totals,
+            "length_histograms": self.length_histograms,
+            "last_build_time": self.last_build_time,
+            "last_build": self.last_build
+        }
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _increment(counter: Dict[str, int], key: str, delta: int):
+        value = counter.get(key, 0) + delta
+        if value > 0:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+    def _apply(self, metadata: Dict, delta: int):
+        metadata = metadata or {}
+        self.documents += delta
+        self._increment(self.sectors, metadata.get("Sector") or "Unknown", delta)
+        self._increment(self.sources, metadata.get("source") or "unknown", delta)
+
+        for field in LENGTH_FIELDS:
+            try:
+                length = int(metadata.get(field, 0))
+            except (TypeError, ValueError):
+                length = 0
+            self.length_totals[field] = self.length_totals.get(field, 0) + delta * length
+            self._increment(self.length_histograms.setdefault(field, {}), length_bucket(length), delta)
+
+        self._dirty = True
+
+    def add(self, metadata: Dict, previous: Optional[Dict] = None):
+        """Count a stored document, replacing the previous version's metadata if given"""
+        with self._lock:
+            if previous is not None:
+                self._apply(previous, -1)
+            self._apply(metadata, 1)
+
+    def remove(self, metadata: Dict):
+        """Stop counting a deleted document"""
+        with self._lock:
+            self._apply(metadata, -1)
+
+    def rebuild(self, metadatas: Iterable[Dict]):
+        """Recompute all counts from the stored metadata, keeping build info"""
+        with self._lock:
+            last_build_time, last_build = self.last_build_time, self.last_build
+            self.clear()
+            for metadata in metadatas:
+                self._apply(metadata, 1)
+            self.last_build_time, self.last_build = last_build_time, last_build
+            self._dirty = True
+
+    def record_build(self, summary: Dict):
+        """Remember when the collection was last synced and what changed"""
+        with self._lock:
+            self.last_build_time = datetime.now(timezone.utc).isoformat()
+            self.last_build = {
+                key: summary[key]
+                for key in ("processed", "added", "updated", "unchanged", "deleted")
+                if key in summary
+            }
+            self._dirty = True
+
+    def clear(self):
+        """Reset all counts"""
+        with self._lock:
+            self.documents = 0
+            self.sectors: Dict[str, int] = {}
+            self.sources: Dict[str, int] = {}
+            self.length_totals: Dict[str, int] = {field: 0 for field in LENGTH_FIELDS}
+            self.length_histograms: Dict[str, Dict[str, int]] = {field: {} for field in LENGTH_FIELDS}
+            self.last_build_time = None
+            self.last_build = None
+            self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def to_dict(self) -> Dict:
+        """Snapshot of the stats with averages and ordered histograms"""
+        with self._lock:
+            averages = {
+                f"avg_{field}": (self.length_totals.get(field, 0) // self.documents if self.documents else 0)
+                for field in LENGTH_FIELDS
+            }
+            histograms = {
+                field: {label: self.length_histograms.get(field, {}).get(label, 0) for label in BUCKET_LABELS}
+                for field in LENGTH_FIELDS
+            }
+            return {
+                "total_documents": self.documents,
+                "sectors": dict(sorted(self.sectors.items(), key=lambda item: item[1], reverse=True)),
+                "sources": dict(sorted(self.sources.items(), key=lambda item: item[1], reverse=True)),
+                "length_histograms": histograms,
+                "last_build_time": self.last_build_time,
+                "last_build": self.last_build,
+                **averages
+            }
+
+    def __len__(self) -> int:
+        return self.documents
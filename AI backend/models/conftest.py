@@ -0,0 +1,54 @@
+"""
+Shared fixtures for the unit tests.
+
+The embedding model is replaced by a deterministic bag-of-words hasher, so
+databases built with `make_db` need neither sentence-transformers nor Chroma.
+"""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+import vector_database
+from vector_database import VectorDatabase
+
+DIMENSION = 32
+
+
+class FakeEncoder:
+    """Deterministic stand-in for a SentenceTransformer"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        self.calls += 1
+        vectors = np.zeros((len(texts), DIMENSION), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % DIMENSION] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    fake = FakeEncoder()
+    monkeypatch.setattr(
+        vector_database, "resolve_encoder", lambda model_name, backend="torch", **kwargs: (fake, backend)
+    )
+    return fake
+
+
+@pytest.fixture
+def make_db(tmp_path, encoder):
+    def make(backend="numpy", name=None, **options):
+        options.setdefault("embedding_cache_size", 0)
+        return VectorDatabase(
+            persist_directory=str(tmp_path / (name or backend) / "vectordb"),
+            collection_name="cv_qa",
+            backend=backend,
+            **options
+        )
+    return make
@@ -0,0 +1,234 @@
+"""
+Storage for chat conversation histories.
+
+Every store keeps the last `max_messages` messages of each conversation and
+forgets conversations that have not been updated for `ttl_seconds`, so memory
+and disk use stay bounded on a long-running server. The in-memory store is
+private to one process; the SQLite store can be shared by several API
+workers on the same host.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cache_utils import LRUCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STORES = ("memory", "sqlite")
+
+
+class ConversationStore(ABC):
+    """Interface implemented by all conversation stores
+
+    Args:
+        max_conversations: Conversations kept; the least recently updated are evicted
+        max_messages: Messages kept per conversation (oldest are dropped)
+        ttl_seconds: Conversations idle for longer are forgotten (None keeps them)
+    """
+
+    def __init__(self, max_conversations: int = 10_000, max_messages: int = 10, ttl_seconds: Optional[float] = 86_400):
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> List[Dict]:
+        """Messages of a conversation, oldest first (empty if unknown or expired)"""
+
+    @abstractmethod
+    def append(self, conversation_id: str, messages: List[Dict]):
+        """Add messages to a conversation, keeping only the last max_messages"""
+
+    @abstractmethod
+    def delete(self, conversation_id: str):
+        """Forget a conversation"""
+
+    @abstractmethod
+    def active_count(self) -> int:
+        """Number of conversations that have not expired"""
+
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        """Active conversations and eviction/expiration counters"""
+
+    def close(self):
+        """Release resources (no-op for stores without any)"""
+
+
+class MemoryConversationStore(ConversationStore):
+    """Per-process store: an LRU of conversations with a time-to-live"""
+
+    def __init__(self, max_conversations: int = 10_000, max_messages: int = 10, ttl_seconds: Optional[float] = 86_400):
+        super().__init__(max_conversations, max_messages, ttl_seconds)
+        self._conversations = LRUCache(max_size=max_conversations, ttl_seconds=ttl_seconds)
+        # Serializes read-modify-write of one conversation's message list
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> List[Dict]:
+        return list(self._conversations.get(conversation_id) or [])
+
+    def append(self, conversation_id: str, messages: List[Dict]):
+        with self._lock:
+            history = list(self._conversations.get(conversation_id) or [])
+            history.extend(messages)
+            self._conversations.put(conversation_id, history[-self.max_messages:])
+
+    def delete(self, conversation_id: str):
+        self._conversations.pop(conversation_id)
+
+    def active_count(self) -> int:
+        self._conversations.purge_expired()
+        return len(self._conversations)
+
+    def get_stats(self) -> Dict:
+        active = self.active_count()
+        return {
+            "store": "memory",
+            "active_conversations": active,
+            "max_conversations": self.max_conversations,
+            "max_messages": self.max_messages,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self._conversations.evictions,
+            "expirations": self._conversations.expirations
+        }
+
+
+class SqliteConversationStore(ConversationStore):
+    """SQLite store in WAL mode, shared by all API workers using the same file
+
+    Updates run in an immediate transaction, so concurrent workers appending
+    to the same conversation do not lose messages. Expired and excess
+    conversations are removed every PRUNE_INTERVAL appends; the eviction
+    counters are kept in the database so every worker reports the same totals.
+    """
+
+    PRUNE_INTERVAL = 100
+
+    def __init__(
+        self,
+        path: str,
+        max_conversations: int = 100_000,
+        max_messages: int = 10,
+        ttl_seconds: Optional[float] = 86_400
+    ):
+        super().__init__(max_conversations, max_messages, ttl_seconds)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._appends = 0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        logger.info(f"Conversation store at {self.path} holds {self.active_count()} active conversations")
+
+    def _cutoff(self) -> float:
+        """Oldest updated_at that has not expired"""
+        return float("-inf") if self.ttl_seconds is None else time.time() - self.ttl_seconds
+
+    def _count(self, name: str, delta: int):
+        if delta > 0:
+            self._conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, delta)
+            )
+
+    def _prune(self):
+        """Delete expired conversations and the least recently updated beyond the limit"""
+        expired = self._conn.execute(
+            "DELETE FROM conversations WHERE updated_at < ?", (self._cutoff(),)
+        ).rowcount
+        evicted = self._conn.execute(
+            "DELETE FROM conversations WHERE id IN ("
+            "SELECT id FROM conversations ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_conversations,)
+        ).rowcount
+        self._count("expirations", expired)
+        self._count("evictions", evicted)
+
+    def get(self, conversation_id: str) -> List[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages FROM conversations WHERE id = ? AND updated_at >= ?",
+                (conversation_id, self._cutoff())
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def append(self, conversation_id: str, messages: List[Dict]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT messages FROM conversations WHERE id = ? AND updated_at >= ?",
+                    (conversation_id, self._cutoff())
+                ).fetchone()
+                history = (json.loads(row[0]) if row else []) + list(messages)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO conversations (id, messages, updated_at) VALUES (?, ?, ?)",
+                    (conversation_id, json.dumps(history[-self.max_messages:], ensure_ascii=False), time.time())
+                )
+                self._appends += 1
+                if self._appends % self.PRUNE_INTERVAL == 0:
+                    self._prune()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, conversation_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def active_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM conversations WHERE updated_at >= ?", (self._cutoff(),)
+            ).fetchone()[0]
+
+    def get_stats(self) -> Dict:
+        active = self.active_count()
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "store": "sqlite",
+            "active_conversations": active,
+            "max_conversations": self.max_conversations,
+            "max_messages": self.max_messages,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": counters.get("evictions", 0),
+            "expirations": counters.get("expirations", 0)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_conversation_store(store: str = "memory", **options) -> ConversationStore:
+    """Instantiate a conversation store by name ("memory" or "sqlite")
+
+    The SQLite store requires a `path` option.
+    """
+    store = store.lower()
+    if store == "memory":
+        options.pop("path", None)
+        return MemoryConversationStore(**options)
+    if store == "sqlite":
+        return SqliteConversationStore(**options)
+    raise ValueError(f"Unknown conversation store '{store}', expected one of {STORES}")
@@ -0,0 +1,292 @@
+"""
+Persistent, memory-mapped cache of text embeddings.
+
+Embeddings are keyed by (embedding model, normalized text hash) so that the
+same text is never encoded twice - not across rebuilds, collection resets or
+processes sharing the same data directory.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, every instance is a writer
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 32  # sha256 digest size
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different texts share a cache entry"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class EmbeddingCache:
+    """Size-capped embedding cache stored in memory-mapped NumPy files
+
+    Layout of ``<cache_dir>/<model>/``:
+        vectors.npy  float32 (capacity, dim) embedding rows
+        keys.npy     uint8 (capacity, 32) sha256 key of the text in each row
+        ticks.npy    int64 (capacity,) last-use counter (0 = empty row)
+        meta.json    model name, dimension and capacity
+
+    The key of every row is stored next to its vector, so the index is rebuilt
+    from disk on startup. When the cache is full, the least recently used rows
+    are evicted.
+
+    The cache is safe to share between threads. Across processes it is
+    single-writer: the first instance to take an exclusive lock on
+    ``writer.lock`` may add entries, later instances open the files read-only
+    and only serve what was cached when they started. Every read compares the
+    stored key of the row with the requested one (before and after copying the
+    vector), so a row the writer has since reused is reported as a miss
+    instead of being served for the wrong text.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        max_entries: int = 100_000,
+        evict_fraction: float = 0.1,
+        initial_capacity: int = 1024
+    ):
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir) / re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.evict_fraction = evict_fraction
+        self.initial_capacity = min(initial_capacity, max_entries)
+
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._free_rows: List[int] = []
+        self._tick = 0
+        self._vectors = None
+        self._keys = None
+        self._ticks = None
+        self.dimension = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock_file = None
+        self.read_only = not self._acquire_writer_lock()
+        if self.read_only:
+            logger.info(f"Embedding cache at {self.cache_dir} is owned by another process; opening read-only")
+
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _path(self, name: str) -> Path:
+        return self.cache_dir / name
+
+    def _acquire_writer_lock(self) -> bool:
+        """Try to become the single writer of this cache directory"""
+        if fcntl is None:
+            return True
+
+        lock_file = open(self._path("writer.lock"), "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        # Held (and the lock with it) for the lifetime of this instance
+        self._lock_file = lock_file
+        return True
+
+    def _load(self):
+        """Open existing cache files and rebuild the in-memory index"""
+        meta_path = self._path("meta.json")
+        if not meta_path.exists():
+            return
+
+        mmap_mode = "r" if self.read_only else "r+"
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dimension = int(meta["dimension"])
+            self._vectors = np.load(self._path("vectors.npy"), mmap_mode=mmap_mode)
+            self._keys = np.load(self._path("keys.npy"), mmap_mode=mmap_mode)
+            self._ticks = np.load(self._path("ticks.npy"), mmap_mode=mmap_mode)
+        except Exception as e:
+            logger.warning(f"Embedding cache at {self.cache_dir} is unreadable, starting empty: {e}")
+            self._vectors = self._keys = self._ticks = None
+            self.dimension = None
+            return
+
+        used = np.flatnonzero(self._ticks > 0)
+        self._rows = {self._keys[row].tobytes(): int(row) for row in used}
+        self._free_rows = [int(row) for row in np.flatnonzero(self._ticks == 0)][::-1]
+        self._tick = int(self._ticks.max()) if len(self._ticks) else 0
+
+        logger.info(f"Loaded embedding cache with {len(self._rows)} entries from {self.cache_dir}")
+
+    def _allocate(self, capacity: int):
+        """Create (or grow) the memory-mapped files to hold `capacity` rows"""
+        old_capacity = 0 if self._vectors is None else len(self._vectors)
+
+        arrays = {}
+        for name, dtype, shape in (
+            ("vectors", np.float32, (capacity, self.dimension)),
+            ("keys", np.uint8, (capacity, KEY_BYTES)),
+            ("ticks", np.int64, (capacity,)),
+        ):
+            tmp_path = self._path(f"{name}.tmp.npy")
+            array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+            if old_capacity:
+                array[:old_capacity] = getattr(self, f"_{name}")[:old_capacity]
+            array.flush()
+            arrays[name] = array
+
+        # Release all maps before replacing the files they point to
+        self._vectors = self._keys = self._ticks = None
+        arrays.clear()
+        for name in ("vectors", "keys", "ticks"):
+            os.replace(self._path(f"{name}.tmp.npy"), self._path(f"{name}.npy"))
+
+        self._vectors = np.load(self._path("vectors.npy"), mmap_mode="r+")
+        self._keys = np.load(self._path("keys.npy"), mmap_mode="r+")
+        self._ticks = np.load(self._path("ticks.npy"), mmap_mode="r+")
+        self._free_rows.extend(range(capacity - 1, old_capacity - 1, -1))
+
+        with open(self._path("meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "dimension": self.dimension,
+                "capacity": capacity
+            }, f)
+
+    def _evict(self):
+        """Free the least recently used rows"""
+        n_evict = max(1, int(len(self._rows) * self.evict_fraction))
+        used = np.flatnonzero(self._ticks > 0)
+        oldest = used[np.argpartition(self._ticks[used], min(n_evict, len(used)) - 1)[:n_evict]]
+
+        for row in oldest:
+            self._rows.pop(self._keys[row].tobytes(), None)
+            self._ticks[row] = 0
+            self._free_rows.append(int(row))
+
+        self.evictions += len(oldest)
+
+    def _next_row(self) -> int:
+        """Return a free row, growing or evicting as needed"""
+        if not self._free_rows:
+            capacity = 0 if self._vectors is None else len(self._vectors)
+            if capacity < self.max_entries:
+                self._allocate(min(max(capacity * 2, self.initial_capacity), self.max_entries))
+            else:
+                self._evict()
+        return self._free_rows.pop()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def key(self, text: str) -> bytes:
+        """Cache key for a text under this cache's model"""
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings; missing texts are returned as None"""
+        results: List[Optional[np.ndarray]] = []
+
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                row = self._rows.get(key)
+                embedding = None
+                if row is not None and self._keys[row].tobytes() == key:
+                    embedding = np.array(self._vectors[row])
+                    # The writer replaces the key before the vector, so an
+                    # unchanged key after the copy means the vector is ours
+                    if self._keys[row].tobytes() != key:
+                        embedding = None
+
+                if embedding is None:
+                    if row is not None:
+                        self._rows.pop(key, None)
+                    self.misses += 1
+                    results.append(None)
+                    continue
+
+                self.hits += 1
+                if not self.read_only:
+                    self._tick += 1
+                    self._ticks[row] = self._tick
+                results.append(embedding)
+
+        return results
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """Store embeddings for texts, evicting old entries if the cache is full"""
+        if self.max_entries <= 0 or len(texts) == 0 or self.read_only:
+            return
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = int(embeddings.shape[1])
+            elif embeddings.shape[1] != self.dimension:
+                logger.warning(
+                    f"Embedding dimension {embeddings.shape[1]} does not match cache "
+                    f"dimension {self.dimension}; not caching"
+                )
+                return
+
+            for text, embedding in zip(texts, embeddings):
+                key = self.key(text)
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._next_row()
+                    self._rows[key] = row
+                    self._keys[row] = np.frombuffer(key, dtype=np.uint8)
+
+                self._tick += 1
+                self._vectors[row] = embedding
+                self._ticks[row] = self._tick
+
+    def flush(self):
+        """Write pending changes to disk"""
+        if self.read_only:
+            return
+        with self._lock:
+            for array in (self._vectors, self._keys, self._ticks):
+                if array is not None:
+                    array.flush()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_stats(self) -> Dict:
+        """Cache size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "read_only": self.read_only
+        }
@@ -0,0 +1,360 @@
+"""
+Sentence embedding encoders with selectable inference backends.
+
+    torch      SentenceTransformer in PyTorch eager mode (reference)
+    onnx       same model exported to ONNX and run with ONNX Runtime
+    onnx-int8  ONNX export with dynamic int8 weight quantization
+
+ONNX exports are cached under `cache_dir`, so the export only runs once.
+Before an ONNX encoder is used, a parity check compares its cosine
+similarities against the torch encoder. If they drift beyond the tolerance,
+loading falls back to torch. The ONNX backends need
+`pip install sentence-transformers[onnx]`.
+
+Run this module to benchmark ingest throughput and single-query latency:
+
+    python encoders.py --backends torch onnx onnx-int8
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+PARITY_SENTENCES = [
+    "Senior business analyst with SQL, Power BI and stakeholder management experience",
+    "Python developer familiar with Django, REST APIs and PostgreSQL",
+    "MBA in Business Analytics from IIM Bangalore",
+    "Data scientist with machine learning and deep learning projects",
+    "DevOps engineer experienced with Kubernetes, Docker and CI/CD pipelines",
+    "HR generalist handling recruitment, onboarding and payroll",
+    "AWS Certified Solutions Architect - Associate",
+    "Find candidates who know Java and Spring Boot",
+]
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+
+
+def cosine_matrix(embeddings: np.ndarray) -> np.ndarray:
+    """Pairwise cosine similarities between rows"""
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return normalized @ normalized.T
+
+
+def parity_error(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Largest difference between two encoders' cosine similarity matrices
+
+    Self-similarity between each reference/candidate pair is included, so
+    a uniformly rotated or scaled encoder is also caught.
+    """
+    pairwise = np.abs(cosine_matrix(reference) - cosine_matrix(candidate)).max()
+    self_similarity = np.sum(
+        reference * candidate, axis=1
+    ) / (np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1))
+    return float(max(pairwise, np.abs(1.0 - self_similarity).max()))
+
+
+def _export_onnx(model_name: str, backend: str, export_dir: Path, quantization_config: str) -> Dict:
+    """Export the model to ONNX (and int8) under export_dir if not already done"""
+    from sentence_transformers import SentenceTransformer
+
+    if not (export_dir / "onnx" / "model.onnx").exists():
+        logger.info(f"Exporting {model_name} to ONNX at {export_dir}")
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save_pretrained(str(export_dir))
+
+    if backend == "onnx":
+        return {}
+
+    file_name = f"onnx/model_qint8_{quantization_config}.onnx"
+    if not (export_dir / file_name).exists():
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        logger.info(f"Quantizing ONNX model to int8 ({quantization_config})")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(str(export_dir), backend="onnx"),
+            quantization_config=quantization_config,
+            model_name_or_path=str(export_dir)
+        )
+    return {"file_name": file_name}
+
+
+def _check_parity(model_name: str, backend: str, encoder, export_dir: Path, tolerance: float) -> bool:
+    """Compare an ONNX encoder against torch; the result is cached per export"""
+    marker = export_dir / f"parity_{backend}.json"
+    if marker.exists():
+        with open(marker, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("tolerance") == tolerance:
+            return cached["passed"]
+
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name).encode(PARITY_SENTENCES, convert_to_numpy=True)
+    candidate = encoder.encode(PARITY_SENTENCES, convert_to_numpy=True)
+    error = parity_error(reference, candidate)
+    passed = error <= tolerance
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"backend": backend, "tolerance": tolerance, "max_error": error, "passed": passed}, f)
+
+    if passed:
+        logger.info(f"✅ {backend} encoder parity check passed (max cosine error {error:.5f})")
+    else:
+        logger.warning(f"❌ {backend} encoder parity check failed (max cosine error {error:.5f} > {tolerance})")
+    return passed
+
+
+def load_encoder(
+    model_name: str,
+    backend: str = "torch",
+    cache_dir: str = "data/encoders",
+    parity_check: bool = True,
+    tolerance: float = 0.02,
+    quantization_config: Optional[str] = None
+):
+    """Load a SentenceTransformer-compatible encoder for the given backend
+
+    See resolve_encoder() for the arguments; use that function when the
+    caller needs to know whether loading fell back to torch.
+    """
+    return resolve_encoder(model_name, backend, cache_dir, parity_check, tolerance, quantization_config)[0]
+
+
+def prepare_encoder(model_name: str, backend: str = "torch", cache_dir: str = "data/encoders") -> str:
+    """Run the ONNX export and parity check once, before worker processes load the model
+
+    Returns:
+        The backend workers should load: `backend`, or "torch" if the ONNX
+        encoder could not be exported or failed the parity check
+    """
+    if backend == "torch":
+        return backend
+    return resolve_encoder(model_name, backend, cache_dir)[1]
+
+
+def resolve_encoder(
+    model_name: str,
+    backend: str = "torch",
+    cache_dir: str = "data/encoders",
+    parity_check: bool = True,
+    tolerance: float = 0.02,
+    quantization_config: Optional[str] = None
+) -> Tuple[object, str]:
+    """Load an encoder and report which backend it actually uses
+
+    Args:
+        model_name: Hugging Face model name or local path
+        backend: "torch", "onnx" or "onnx-int8"
+        cache_dir: Directory where ONNX exports are cached
+        parity_check: Compare ONNX output with torch and fall back on mismatch
+        tolerance: Maximum allowed cosine similarity difference
+        quantization_config: Int8 kernel target ("avx2", "avx512", "avx512_vnni", "arm64")
+
+    Returns:
+        (encoder with a SentenceTransformer-style encode() method, backend
+        in use after any fallback to torch)
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {ENCODER_BACKENDS}")
+
+    if backend == "torch":
+        return SentenceTransformer(model_name), "torch"
+
+    export_dir = Path(cache_dir) / f"{_slug(model_name)}-onnx"
+    quantization_config = quantization_config or os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2")
+
+    try:
+        model_kwargs = _export_onnx(model_name, backend, export_dir, quantization_config)
+        encoder = SentenceTransformer(str(export_dir), backend="onnx", model_kwargs=model_kwargs)
+    except Exception as e:
+        logger.warning(
+            f"Could not load {backend} encoder ({e}); falling back to torch. "
+            f"Install ONNX support with: pip install sentence-transformers[onnx]"
+        )
+        return SentenceTransformer(model_name), "torch"
+
+    if parity_check and not _check_parity(model_name, backend, encoder, export_dir, tolerance):
+        logger.warning(f"Falling back to torch encoder for {model_name}")
+        return SentenceTransformer(model_name), "torch"
+
+    logger.info(f"Using {backend} encoder for {model_name}")
+    return encoder, backend
+
+
+_worker_encoder = None
+
+
+def _init_worker(model_name: str, backend: str, cache_dir: str, threads: int):
+    """Load the encoder once per pool process with a fixed thread count"""
+    global _worker_encoder
+
+    # Set before torch/onnxruntime initialize their thread pools
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    _worker_encoder = load_encoder(model_name, backend, cache_dir=cache_dir)
+
+
+def _encode_in_worker(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+
+class EncoderPool:
+    """Pool of encoder processes that shards encode() calls across CPU cores
+
+    Each worker loads its own copy of the model and is pinned to
+    `threads_per_worker` intra-op threads, so workers do not oversubscribe
+    the CPU. ONNX exports and parity checks run once in the parent before the
+    workers start, so workers never export into the same directory at once.
+    Use as a context manager or call close() when done.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str = "torch",
+        cache_dir: str = "data/encoders",
+        workers: int = 2,
+        threads_per_worker: Optional[int] = None,
+        batch_size: int = 32
+    ):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.batch_size = batch_size
+        self.backend = prepare_encoder(model_name, backend, cache_dir)
+
+        logger.info(
+            f"Starting encoder pool: {workers} workers x {self.threads_per_worker} threads ({self.backend})"
+        )
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, self.backend, cache_dir, self.threads_per_worker)
+        )
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        """Encode texts by splitting them into one shard per worker"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        shard_size = -(-len(texts) // self.workers)
+        shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+        results = self._executor.map(_encode_in_worker, shards, [self.batch_size] * len(shards))
+        return np.vstack(list(results))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def cache_model_key(model_name: str, backend: str) -> str:
+    """Embedding cache namespace for a model/backend pair
+
+    Quantized encoders produce slightly different vectors, so they get their
+    own cache entries; the fp32 ONNX export shares entries with torch.
+    """
+    return model_name if backend in ("torch", "onnx") else f"{model_name}@{backend}"
+
+
+def benchmark_encoders(
+    model_name: str,
+    backends: List[str],
+    texts: List[str],
+    batch_size: int = 64,
+    n_queries: int = 50,
+    cache_dir: str = "data/encoders"
+) -> List[Dict]:
+    """Measure load time, ingest throughput and single-query latency per backend"""
+    report = []
+    reference = None
+
+    for backend in backends:
+        started = time.perf_counter()
+        encoder = load_encoder(model_name, backend, cache_dir=cache_dir, parity_check=False)
+        load_seconds = time.perf_counter() - started
+
+        encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+
+        started = time.perf_counter()
+        embeddings = encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        ingest_seconds = time.perf_counter() - started
+
+        latencies = []
+        for text in texts[:n_queries]:
+            started = time.perf_counter()
+            encoder.encode([text])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        if reference is None:
+            reference = embeddings
+
+        report.append({
+            "backend": backend,
+            "load_seconds": round(load_seconds, 2),
+            "docs_per_second": round(len(texts) / ingest_seconds, 1),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "query_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "parity_error": round(parity_error(reference[:256], embeddings[:256]), 5)
+        })
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding encoder backends")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backends", nargs="+", default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+    parser.add_argument("--data", help="CV JSON file to take texts from (default: synthetic sentences)")
+    parser.add_argument("--n", type=int, default=2000, help="Number of texts to encode")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--cache-dir", default="../data/encoders")
+    args = parser.parse_args()
+
+    if args.data:
+        with open(args.data, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        texts = [json.dumps(record, ensure_ascii=False)[:2000] for record in records][:args.n]
+    else:
+        texts = [f"{PARITY_SENTENCES[i % len(PARITY_SENTENCES)]} (profile {i})" for i in range(args.n)]
+
+    print(f"{len(texts)} texts, batch size {args.batch_size}, model {args.model}")
+    print(f"{'backend':<10} {'load s':>7} {'docs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'parity':>8}")
+    for row in benchmark_encoders(args.model, args.backends, texts, args.batch_size, cache_dir=args.cache_dir):
+        print(
+            f"{row['backend']:<10} {row['load_seconds']:>7.2f} {row['docs_per_second']:>9.1f} "
+            f"{row['query_p50_ms']:>8.2f} {row['query_p95_ms']:>8.2f} {row['parity_error']:>8.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,648 @@
+"""
+Storage/search backends for the vector index.
+
+Every backend exposes the same small interface (add/upsert/delete/query/get/
+count) and returns results in ChromaDB's dictionary format, so VectorDatabase
+and the API can switch engines without changing result handling.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from cache_utils import LRUCache
+from quantization import STORAGE_MODES, dequantize, quantize, squared_l2
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("chroma", "numpy")
+
+
+class IndexBackend(ABC):
+    """Interface implemented by all vector index backends"""
+
+    def __init__(self, persist_directory: str, collection_name: str):
+        self.persist_directory = Path(persist_directory)
+        self.collection_name = collection_name
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        """Add new documents"""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        """Insert documents or replace existing ones with the same IDs"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Delete documents by ID"""
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict:
+        """Nearest-neighbour search; returns one result list per query embedding"""
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict:
+        """Fetch documents by ID and/or metadata filter"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored documents"""
+
+    @abstractmethod
+    def reset(self):
+        """Delete all documents and their storage"""
+
+    def flush(self):
+        """Persist pending writes (no-op for backends that write through)"""
+
+    def drop(self):
+        """Delete the collection entirely; the backend must not be used afterwards"""
+        self.reset()
+
+
+class ChromaBackend(IndexBackend):
+    """Backend storing documents in a persistent ChromaDB collection"""
+
+    def __init__(self, persist_directory: str, collection_name: str):
+        super().__init__(persist_directory, collection_name)
+
+        import chromadb
+        from chromadb.config import Settings
+
+        self.client = chromadb.PersistentClient(
+            path=str(self.persist_directory),
+            settings=Settings(
+                anonymized_telemetry=False,
+                allow_reset=True
+            )
+        )
+        self.collection = self._get_or_create_collection()
+
+    def _get_or_create_collection(self):
+        """Get existing collection or create new one"""
+        try:
+            collection = self.client.get_collection(name=self.collection_name)
+            count = collection.count()
+            logger.info(f"Loaded existing collection '{self.collection_name}' with {count} documents")
+            return collection
+        except Exception:
+            logger.info(f"Creating new collection '{self.collection_name}'")
+            return self.client.create_collection(
+                name=self.collection_name,
+                metadata={"description": "Indian Law Q&A Dataset - Instruction-Response pairs"}
+            )
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def query(self, query_embeddings, n_results=5, where=None, include=None):
+        params = {"query_embeddings": query_embeddings, "n_results": n_results}
+        if where:
+            params["where"] = where
+        if include is not None:
+            params["include"] = include
+        return self.collection.query(**params)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        params = {}
+        for key, value in (("ids", ids), ("where", where), ("limit", limit), ("offset", offset), ("include", include)):
+            if value is not None:
+                params[key] = value
+        return self.collection.get(**params)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def reset(self):
+        self.client.delete_collection(name=self.collection_name)
+        self.collection = self._get_or_create_collection()
+
+    def drop(self):
+        self.client.delete_collection(name=self.collection_name)
+
+
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma-style `where` filter against one metadata dict
+
+    Supports field equality, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin,
+    $contains/$not_contains (list membership or substring) and $and/$or.
+    """
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        for operator, operand in condition.items():
+            if not _compare(value, operator, operand):
+                return False
+
+    return True
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if operator in ("$contains", "$not_contains"):
+        contained = value is not None and operand in value
+        return contained if operator == "$contains" else not contained
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+class _IndexView(NamedTuple):
+    """Consistent snapshot of a NumpyBackend's rows, read without holding its lock"""
+    generation: int
+    size: int
+    arrays: Dict[str, Optional[np.ndarray]]
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict]
+
+
+class NumpyBackend(IndexBackend):
+    """Exact brute-force search over a contiguous vector matrix
+
+    Vectors are stored in ``vectors.npy`` and memory-mapped on load; IDs,
+    documents and metadata are kept in ``records.json``. Writes are applied in
+    memory and persisted by flush(). Distances are squared L2, matching
+    Chroma's default space, so scores are interchangeable between backends.
+
+    `storage` selects how vectors are kept: "float32", "float16" or "int8"
+    (scalar-quantized with a per-vector scale). With a compact format and
+    `rescore=True`, a full-precision copy is kept memory-mapped on disk
+    (``full.npy``) and the top `n_results * rescore_factor` candidates are
+    re-ranked with exact distances.
+
+    Queries score against a snapshot of the arrays taken under the lock, so
+    concurrent searches run in parallel. Writes only append past the rows a
+    snapshot covers; before changing existing rows they copy whatever a
+    reader may still hold (copy-on-write, only when a snapshot was taken).
+    """
+
+    # Row-aligned arrays and their on-disk files; "full" only exists for compact storage with rescoring
+    ARRAYS = ("vectors", "scales", "sq_norms", "full")
+
+    def __init__(
+        self,
+        persist_directory: str,
+        collection_name: str,
+        storage: str = "float32",
+        rescore: bool = True,
+        rescore_factor: int = 4
+    ):
+        super().__init__(persist_directory, collection_name)
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage}', expected one of {STORAGE_MODES}")
+
+        self.directory = self.persist_directory / f"numpy_{collection_name}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.storage = storage
+        self.keep_full = rescore and storage != "float32"
+        self.rescore_factor = rescore_factor
+
+        self._lock = threading.RLock()
+        self._arrays: Dict[str, Optional[np.ndarray]] = {name: None for name in self.ARRAYS}
+        self._size = 0
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._dirty = False
+        self._mask_cache = LRUCache(max_size=64)
+        self._generation = 0
+        self._shared = False
+
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _array_path(self, name: str) -> Path:
+        return self.directory / f"{name}.npy"
+
+    def _load(self):
+        records_path = self.directory / "records.json"
+        if not records_path.exists() or not self._array_path("vectors").exists():
+            logger.info(f"Creating new NumPy index '{self.collection_name}' ({self.storage})")
+            return
+
+        with open(records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+
+        self._ids = records["ids"]
+        self._documents = records["documents"]
+        self._metadatas = records["metadatas"]
+        self._size = len(self._ids)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+        for name in self.ARRAYS:
+            path = self._array_path(name)
+            if path.exists():
+                self._arrays[name] = np.load(path, mmap_mode="r")
+
+        stored_storage = records.get("storage", "float32")
+        if (
+            stored_storage != self.storage
+            or self._arrays["scales"] is None
+            or self._arrays["sq_norms"] is None
+            or (self.keep_full and self._arrays["full"] is None)
+        ):
+            self._convert_storage(stored_storage)
+        elif not self.keep_full and self._arrays["full"] is not None:
+            # Rescoring was switched off; drop the full-precision copy on the next flush
+            self._arrays["full"] = None
+            self._dirty = True
+
+        logger.info(f"Loaded NumPy index '{self.collection_name}' with {self._size} documents ({self.storage})")
+
+    def _convert_storage(self, stored_storage: str):
+        """Re-encode vectors saved in a different storage format"""
+        if self._arrays["full"] is not None:
+            source = np.asarray(self._arrays["full"][:self._size], dtype=np.float32)
+        else:
+            source = dequantize(self._arrays["vectors"][:self._size], self._arrays["scales"][:self._size])
+            if stored_storage != "float32":
+                logger.warning(
+                    f"Converting index from {stored_storage} to {self.storage} without full-precision "
+                    f"vectors; precision lost earlier cannot be recovered"
+                )
+
+        logger.info(f"Converting NumPy index '{self.collection_name}' from {stored_storage} to {self.storage}")
+        self._arrays = {name: None for name in self.ARRAYS}
+        encoded = self._encode_rows(source)
+        for name, rows in encoded.items():
+            self._arrays[name] = np.ascontiguousarray(rows)
+        self._dirty = True
+        self.flush()
+
+    def flush(self):
+        """Write vectors and records to disk and re-map the vector files"""
+        with self._lock:
+            if not self._dirty:
+                return
+
+            for name in self.ARRAYS:
+                path = self._array_path(name)
+                array = self._arrays[name]
+                if array is None:
+                    if path.exists():
+                        path.unlink()
+                    continue
+                tmp_path = self.directory / f"{name}.tmp.npy"
+                np.save(tmp_path, np.ascontiguousarray(array[:self._size]))
+                os.replace(tmp_path, path)
+
+            tmp_records = self.directory / "records.tmp.json"
+            with open(tmp_records, "w", encoding="utf-8") as f:
+                json.dump({
+                    "storage": self.storage,
+                    "ids": self._ids,
+                    "documents": self._documents,
+                    "metadatas": self._metadatas
+                }, f, ensure_ascii=False)
+            os.replace(tmp_records, self.directory / "records.json")
+
+            for name in self.ARRAYS:
+                if self._arrays[name] is not None:
+                    self._arrays[name] = np.load(self._array_path(name), mmap_mode="r")
+            self._dirty = False
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _encode_rows(self, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+        """Storage representation of float32 vectors, one entry per array"""
+        codes, scales = quantize(vectors, self.storage)
+        decoded = dequantize(codes, scales)
+        encoded = {
+            "vectors": codes,
+            "scales": scales,
+            "sq_norms": np.einsum("ij,ij->i", decoded, decoded).astype(np.float32)
+        }
+        if self.keep_full:
+            encoded["full"] = np.asarray(vectors, dtype=np.float32)
+        return encoded
+
+    def _ensure_writable(self, extra_rows: int, encoded: Dict[str, np.ndarray]):
+        """Copy memory-mapped arrays into RAM with room for more rows"""
+        vectors = self._arrays["vectors"]
+        capacity = 0 if vectors is None else len(vectors)
+        writable = vectors is not None and not isinstance(vectors, np.memmap)
+
+        if writable and self._size + extra_rows <= capacity:
+            return
+
+        new_capacity = max(self._size + extra_rows, capacity * 2 if writable else 0, 1024)
+        for name, template in encoded.items():
+            array = np.zeros((new_capacity,) + template.shape[1:], dtype=template.dtype)
+            current = self._arrays[name]
+            if current is not None and self._size:
+                array[:self._size] = current[:self._size]
+            self._arrays[name] = array
+
+    def _changed(self):
+        self._dirty = True
+        self._generation += 1
+        self._mask_cache.clear()
+
+    def _detach(self):
+        """Copy arrays and record lists before existing rows are modified, if a reader may hold them"""
+        if not self._shared:
+            return
+        for name, array in self._arrays.items():
+            if array is not None and not isinstance(array, np.memmap):
+                self._arrays[name] = array.copy()
+        self._ids = list(self._ids)
+        self._documents = list(self._documents)
+        self._metadatas = list(self._metadatas)
+        self._shared = False
+
+    def add(self, ids, embeddings, documents, metadatas):
+        with self._lock:
+            existing = [doc_id for doc_id in ids if doc_id in self._rows]
+            if existing:
+                raise ValueError(f"IDs already exist: {existing[:5]}")
+            self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not len(ids):
+            return
+
+        encoded = self._encode_rows(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._ensure_writable(len(ids), encoded)
+            if any(doc_id in self._rows for doc_id in ids):
+                self._detach()
+
+            for i, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                else:
+                    self._documents[row] = document
+                    self._metadatas[row] = metadata
+
+                for name, rows in encoded.items():
+                    self._arrays[name][row] = rows[i]
+
+            self._changed()
+
+    def delete(self, ids):
+        with self._lock:
+            to_delete = [doc_id for doc_id in ids if doc_id in self._rows]
+            if not to_delete:
+                return
+
+            present = {name: array[:1] for name, array in self._arrays.items() if array is not None}
+            self._ensure_writable(0, present)
+            self._detach()
+
+            # Move the last row into each deleted slot to keep the matrix contiguous
+            for doc_id in to_delete:
+                row = self._rows.pop(doc_id)
+                last = self._size - 1
+                if row != last:
+                    moved_id = self._ids[last]
+                    for array in self._arrays.values():
+                        if array is not None:
+                            array[row] = array[last]
+                    self._ids[row] = moved_id
+                    self._documents[row] = self._documents[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[moved_id] = row
+                self._ids.pop()
+                self._documents.pop()
+                self._metadatas.pop()
+                self._size -= 1
+
+            self._changed()
+
+    def reset(self):
+        with self._lock:
+            self._arrays = {name: None for name in self.ARRAYS}
+            self._size = 0
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._rows = {}
+            self._changed()
+            for path in [self._array_path(name) for name in self.ARRAYS] + [self.directory / "records.json"]:
+                if path.exists():
+                    path.unlink()
+            self._dirty = False
+
+    def drop(self):
+        with self._lock:
+            self.reset()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _view(self) -> _IndexView:
+        """Snapshot of the current rows; the caller must hold the lock"""
+        self._shared = True
+        return _IndexView(
+            self._generation, self._size, dict(self._arrays),
+            self._ids, self._documents, self._metadatas
+        )
+
+    def _where_mask(self, where: Optional[Dict], view: _IndexView) -> Optional[np.ndarray]:
+        """Boolean row mask for a filter, cached until the next write"""
+        if not where:
+            return None
+
+        key = (view.generation, json.dumps(where, sort_keys=True))
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (matches_where(metadata, where) for metadata in islice(view.metadatas, view.size)),
+                dtype=bool,
+                count=view.size
+            )
+            self._mask_cache.put(key, mask)
+        return mask
+
+    @staticmethod
+    def _full_precision(rows: List[int], view: _IndexView) -> np.ndarray:
+        """Best available float32 vectors for the given rows"""
+        if view.arrays["full"] is not None:
+            return np.asarray(view.arrays["full"][rows], dtype=np.float32)
+        return dequantize(view.arrays["vectors"][rows], view.arrays["scales"][rows])
+
+    def _select(self, rows: List[int], include: List[str], view: _IndexView, distances: Optional[List[float]] = None) -> Dict:
+        result = {"ids": [view.ids[row] for row in rows]}
+        result["documents"] = [view.documents[row] for row in rows] if "documents" in include else None
+        result["metadatas"] = [view.metadatas[row] for row in rows] if "metadatas" in include else None
+        result["embeddings"] = list(self._full_precision(rows, view)) if "embeddings" in include and rows else (
+            [] if "embeddings" in include else None
+        )
+        if distances is not None:
+            result["distances"] = distances if "distances" in include else None
+        return result
+
+    def query(self, query_embeddings, n_results=5, where=None, include=None):
+        include = ["documents", "metadatas", "distances"] if include is None else include
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+
+        # Only the snapshot is taken under the lock; scoring runs concurrently
+        with self._lock:
+            view = self._view()
+
+        batched = {"ids": [], "documents": [], "metadatas": [], "embeddings": [], "distances": []}
+        if view.size == 0:
+            for field in batched:
+                batched[field] = [[] for _ in range(len(queries))]
+            return batched
+
+        distances = squared_l2(
+            queries,
+            view.arrays["vectors"][:view.size],
+            view.arrays["scales"][:view.size],
+            view.arrays["sq_norms"][:view.size]
+        )
+
+        mask = self._where_mask(where, view)
+        if mask is not None:
+            distances[:, ~mask] = np.inf
+            available = int(mask.sum())
+        else:
+            available = view.size
+
+        k = min(n_results, available)
+        rescore = self.storage != "float32" and view.arrays["full"] is not None
+        n_candidates = min(k * self.rescore_factor, available) if rescore else k
+
+        for query, query_distances in zip(queries, distances):
+            if k == 0:
+                rows, row_distances = np.array([], dtype=int), np.array([], dtype=np.float32)
+            else:
+                rows = np.argpartition(query_distances, n_candidates - 1)[:n_candidates]
+                row_distances = query_distances[rows]
+                if rescore:
+                    # Exact re-ranking of the candidates with full-precision vectors
+                    row_distances = ((self._full_precision(rows.tolist(), view) - query) ** 2).sum(axis=1)
+                order = np.argsort(row_distances)[:k]
+                rows, row_distances = rows[order], row_distances[order]
+
+            selected = self._select(
+                rows.tolist(),
+                include,
+                view,
+                [max(float(distance), 0.0) for distance in row_distances]
+            )
+            for field in batched:
+                batched[field].append(selected.get(field))
+
+        for field in ("documents", "metadatas", "embeddings", "distances"):
+            if field not in include:
+                batched[field] = None
+        return batched
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        include = ["documents", "metadatas"] if include is None else include
+
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+            else:
+                rows = list(range(self._size))
+
+            view = self._view()
+            if where:
+                mask = self._where_mask(where, view)
+                rows = [row for row in rows if mask[row]]
+
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._select(rows, include, view)
+
+    def count(self) -> int:
+        return self._size
+
+    def memory_footprint(self) -> Dict:
+        """Bytes used by each stored array (resident in RAM or memory-mapped)"""
+        footprint = {
+            name: int(array[:self._size].nbytes)
+            for name, array in self._arrays.items()
+            if array is not None
+        }
+        footprint["total"] = sum(footprint.values())
+        return footprint
+
+
+def create_backend(backend: str, persist_directory: str, collection_name: str, **options) -> IndexBackend:
+    """Instantiate a backend by name ("chroma" or "numpy")
+
+    Extra options (storage, rescore, rescore_factor) are passed to the NumPy backend.
+    """
+    backend = backend.lower()
+    if backend == "chroma":
+        if options.get("storage", "float32") != "float32":
+            logger.warning("Chroma backend always stores float32 vectors; ignoring storage option")
+        return ChromaBackend(persist_directory, collection_name)
+    if backend == "numpy":
+        return NumpyBackend(persist_directory, collection_name, **options)
+    raise ValueError(f"Unknown vector DB backend '{backend}', expected one of {BACKENDS}")
@@ -1,16 +1,28 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import logging
 from datetime import datetime
+from itertools import chain, islice
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Import our modules (assuming they're in the same package)
-from vector_database import VectorDatabase, load_qa_data, load_cv_data
+from vector_database import VectorDatabase, load_qa_data, load_cv_data, parse_skills
+from snapshot import SnapshotError
 try:
     from rag_pipeline import RAGPipeline
+    from prompt_budget import TokenCounter
+    from prompt_cache import PromptCache
+    from conversation_store import create_conversation_store
 except Exception:
     RAGPipeline = None
 
@@ -43,6 +55,23 @@ app.add_middleware(
 # Initialize components
 vector_database = None
 rag_pipeline = None
+# Bounded pool for blocking embedding and index work, so the event loop is never
+# blocked and concurrent requests do not oversubscribe the CPU
+blocking_executor: Optional[ThreadPoolExecutor] = None
+startup_report: Dict[str, Any] = {"phases": {}}
+
+def timed_phase(name: str, fn, *args, **kwargs):
+    """Run one startup phase and record its duration in startup_report"""
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        startup_report["phases"][name] = round(time.perf_counter() - started, 3)
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking vector database call on the bounded executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, partial(fn, *args, **kwargs))
 
 # Pydantic models
 class ChatRequest(BaseModel):
@@ -57,6 +86,8 @@ class ChatResponse(BaseModel):
     sources: List[Dict]
     conversation_id: str
     timestamp: str
+    prompt_tokens: Optional[int] = None
+    cached: Optional[bool] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -70,38 +101,168 @@ class StatsResponse(BaseModel):
     categories: List[str]
     document_types: List[str]
     collection_name: str
+    active_collection: Optional[str] = None
+    index_version: Optional[int] = None
+    sectors: Dict[str, int] = {}
+    sources: Dict[str, int] = {}
+    length_histograms: Dict[str, Dict[str, int]] = {}
+    avg_instruction_length: Optional[int] = None
+    avg_response_length: Optional[int] = None
+    last_build_time: Optional[str] = None
+    last_build: Optional[Dict[str, int]] = None
+    backend: Optional[str] = None
+    embedding_model: Optional[str] = None
+    embedding_backend: Optional[str] = None
+    shard_by: Optional[str] = None
+    sharding: Optional[Dict[str, Any]] = None
+    near_duplicates: Optional[Dict[str, Any]] = None
+    index_memory_bytes: Optional[Dict[str, int]] = None
+    query_cache: Optional[Dict[str, Any]] = None
+    search_coalescing: Optional[Dict[str, Any]] = None
+    chat_coalescing: Optional[Dict[str, Any]] = None
+    embedding_cache: Optional[Dict[str, Any]] = None
+    response_cache: Optional[Dict[str, Any]] = None
+    prompt_cache: Optional[Dict[str, Any]] = None
+    conversations: Optional[Dict[str, Any]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=20, description="Search queries")
+    top_k: Optional[int] = Field(5, ge=1, le=20, description="Number of results per query")
+    sector: Optional[str] = Field(None, description="Only return candidates from this sector")
+    skill: Optional[str] = Field(None, description="Only return candidates with this skill")
+    mode: Optional[str] = Field("vector", pattern="^(vector|keyword|hybrid)$", description="Retrieval mode, as for /api/search")
+    dedupe: Optional[bool] = Field(False, description="Collapse near-duplicate CVs into their best match")
 
 
 class BuildRequest(BaseModel):
     reset: Optional[bool] = Field(False, description="If true, reset the DB before adding data")
     max_items: Optional[int] = Field(None, description="Max number of items to add (for testing)")
-    filename: Optional[str] = Field("Dataset_CV.json", description="Data filename to load from data/raw")
+    filename: Optional[str] = Field("Dataset_CV.json", description="Data filename (.json or .jsonl) to load from data/raw")
+    workers: Optional[int] = Field(1, ge=1, le=64, description="Encoder processes to shard embedding across")
+    duplicates: Optional[str] = Field("tag", pattern="^(off|tag|skip|merge)$", description="Near-duplicate policy for new records")
+    prune: Optional[bool] = Field(False, description="Delete stored documents that are not in this data file")
+
+class SnapshotRequest(BaseModel):
+    name: str = Field(..., pattern=r"^[A-Za-z0-9._-]+$", description="Snapshot directory name under SNAPSHOT_DIR")
+    force: Optional[bool] = Field(False, description="Import even if the embedding model differs")
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", "../data/snapshots"))
+
+def vector_backend_options() -> Dict[str, Any]:
+    """Index backend options from the environment (NumPy backend only)"""
+    if os.getenv("VECTOR_DB_BACKEND", "chroma").lower() != "numpy":
+        return {}
+    return {
+        "storage": os.getenv("VECTOR_DB_STORAGE", "float32"),
+        "rescore": os.getenv("VECTOR_DB_RESCORE", "true").lower() in ("1", "true", "yes"),
+        "rescore_factor": int(os.getenv("VECTOR_DB_RESCORE_FACTOR", "4"))
+    }
+
+def shard_router_options() -> Dict[str, Any]:
+    """Shard router options from the environment (sharded databases only)"""
+    fanout = os.getenv("SHARD_ROUTER_FANOUT")
+    return {
+        "margin": float(os.getenv("SHARD_ROUTER_MARGIN", "0.05")),
+        "min_similarity": float(os.getenv("SHARD_ROUTER_MIN_SIMILARITY", "0.2")),
+        "fanout": int(fanout) if fanout else None,
+        "audit_rate": float(os.getenv("SHARD_ROUTER_AUDIT_RATE", "0.0"))
+    }
+
+def build_prompt_cache() -> Optional["PromptCache"]:
+    """Exact prompt -> response cache from the environment (PROMPT_CACHE_SIZE=0 disables it)"""
+    size = int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+    if size <= 0:
+        return None
+    return PromptCache(
+        path=os.getenv("PROMPT_CACHE_PATH", "../data/prompt_cache.sqlite3") or None,
+        max_entries=size,
+        max_disk_entries=int(os.getenv("PROMPT_CACHE_DISK_SIZE", "10000"))
+    )
+
+def build_conversation_store():
+    """Conversation store from the environment ("memory" per worker, or "sqlite" shared by workers)"""
+    ttl = os.getenv("CONVERSATION_TTL", "86400")
+    return create_conversation_store(
+        os.getenv("CONVERSATION_STORE", "memory"),
+        path=os.getenv("CONVERSATION_DB_PATH", "../data/conversations.sqlite3"),
+        max_conversations=int(os.getenv("MAX_CONVERSATIONS", "10000")),
+        max_messages=10,
+        ttl_seconds=float(ttl) if ttl else None
+    )
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Initialize components on startup"""
-    global vector_database, rag_pipeline
+    global vector_database, rag_pipeline, blocking_executor
     
     logger.info("Initializing AI CV Resume Chatbot API...")
     
+    blocking_executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv("BLOCKING_WORKERS", "4")), thread_name_prefix="blocking"
+    )
+    
+    started = time.perf_counter()
+    
     try:
-        # Initialize vector database
-        vector_database = VectorDatabase(
-            persist_directory=os.getenv("VECTOR_DB_PATH", "../data/vectordb"),
-            embedding_model=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
-            collection_name=os.getenv("VECTOR_DB_COLLECTION", "cv_qa")
+        # Opening the vector database (which itself loads the encoder in the
+        # background) and loading the prompt tokenizer are independent
+        def build_vector_database():
+            return VectorDatabase(
+                persist_directory=os.getenv("VECTOR_DB_PATH", "../data/vectordb"),
+                embedding_model=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+                collection_name=os.getenv("VECTOR_DB_COLLECTION", "cv_qa"),
+                embedding_cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "100000")),
+                query_cache_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+                backend=os.getenv("VECTOR_DB_BACKEND", "chroma"),
+                backend_options=vector_backend_options(),
+                embedding_backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+                shard_by=os.getenv("VECTOR_DB_SHARD_BY") or None,
+                router_options=shard_router_options(),
+                duplicate_threshold=float(os.getenv("DUPLICATE_THRESHOLD", "0.85")),
+                retain_versions=int(os.getenv("VECTOR_DB_RETAIN_VERSIONS", "1"))
+            )
+        
+        async def no_tokenizer():
+            return None
+        
+        vector_database, token_counter = await asyncio.gather(
+            asyncio.to_thread(timed_phase, "vector_database", build_vector_database),
+            asyncio.to_thread(timed_phase, "tokenizer", TokenCounter, os.getenv("PROMPT_TOKENIZER"))
+            if RAGPipeline else no_tokenizer()
         )
+        startup_report["vector_database"] = vector_database.init_timings
         logger.info("Vector database initialized")
         
+        # A fresh replica can be seeded from a snapshot instead of re-embedding
+        snapshot_path = os.getenv("VECTOR_DB_SNAPSHOT")
+        if snapshot_path and vector_database.count() == 0:
+            await asyncio.to_thread(timed_phase, "snapshot_import", vector_database.import_snapshot, snapshot_path)
+        
         # Initialize RAG pipeline
         if RAGPipeline:
             try:
-                rag_pipeline = RAGPipeline(
+                rag_pipeline = timed_phase(
+                    "rag_pipeline", RAGPipeline,
                     vector_database=vector_database,
                     ollama_model=os.getenv("OLLAMA_MODEL", "qwen2.5:7b"),
                     ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-                    relevance_threshold=0.15  # Lower threshold to use RAG more easily
+                    temperature=float(os.getenv("OLLAMA_TEMPERATURE", "0.1")),
+                    relevance_threshold=0.15,  # Lower threshold to use RAG more easily
+                    search_mode=os.getenv("RAG_SEARCH_MODE", "vector"),
+                    num_ctx=int(os.getenv("OLLAMA_NUM_CTX", "1024")),
+                    max_tokens=int(os.getenv("OLLAMA_MAX_TOKENS", "250")),
+                    token_counter=token_counter,
+                    executor=blocking_executor,
+                    max_connections=int(os.getenv("OLLAMA_MAX_CONNECTIONS", "50")),
+                    response_cache_size=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+                    response_cache_threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92")),
+                    response_cache_ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+                    prompt_cache=build_prompt_cache(),
+                    # Responses are only reused for temperature 0 unless opted in
+                    cache_nondeterministic=os.getenv("PROMPT_CACHE_NONDETERMINISTIC", "false").lower() in ("1", "true", "yes"),
+                    conversation_store=build_conversation_store()
                 )
                 logger.info("RAG pipeline initialized")
             except Exception as e:
@@ -110,12 +271,29 @@ async def startup_event():
         else:
             logger.info("RAG pipeline not available (module import failed). Continuing without it.")
         
-        logger.info("API startup complete")
+        # Warm-up waits for the encoder and runs one encode and query, so the
+        # first user request does not pay for model loading and allocation
+        if os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes"):
+            startup_report["warmup"] = await asyncio.to_thread(timed_phase, "warmup", vector_database.warm_up)
+        
+        startup_report["total_seconds"] = round(time.perf_counter() - started, 3)
+        startup_report["completed_at"] = datetime.now().isoformat()
+        phases = ", ".join(f"{name} {seconds}s" for name, seconds in startup_report["phases"].items())
+        logger.info(f"API startup complete in {startup_report['total_seconds']}s ({phases})")
+        logger.info(f"Vector database init phases: {vector_database.init_timings}")
         
     except Exception as e:
         logger.error(f"Error during startup: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled connections and worker threads"""
+    if rag_pipeline:
+        await rag_pipeline.aclose()
+    if blocking_executor:
+        blocking_executor.shutdown(wait=False)
+
 # Routes
 @app.get("/", tags=["Root"])
 async def root():
@@ -126,16 +304,21 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/api/startup", tags=["Health"])
+async def startup_timings():
+    """Per-phase startup timings in seconds"""
+    return startup_report
+
 @app.get("/api/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
     """Check API health and component status"""
     try:
         # Check vector DB
-        vector_db_count = vector_database.collection.count() if vector_database else 0
+        vector_db_count = await run_blocking(vector_database.count) if vector_database else 0
         vector_db_status = "healthy" if vector_db_count > 0 else "empty"
         
         # Check Ollama
-        ollama_status = "healthy" if rag_pipeline and rag_pipeline.check_ollama() else "unavailable"
+        ollama_status = "healthy" if rag_pipeline and await rag_pipeline.acheck_ollama() else "unavailable"
         
         return HealthResponse(
             status="healthy",
@@ -155,8 +338,25 @@ async def get_stats():
         if not vector_database:
             raise HTTPException(status_code=500, detail="Vector database not initialized")
         
-        stats = vector_database.get_stats()
-        return StatsResponse(**stats)
+        def collect_stats() -> Dict[str, Any]:
+            stats = vector_database.get_stats()
+            if rag_pipeline and rag_pipeline.response_cache is not None:
+                stats['response_cache'] = {
+                    "active": rag_pipeline.response_cache_active,
+                    **rag_pipeline.response_cache.get_stats()
+                }
+            if rag_pipeline:
+                stats['conversations'] = rag_pipeline.conversations.get_stats()
+                stats['chat_coalescing'] = rag_pipeline.aquery_flights.get_stats()
+            if rag_pipeline and rag_pipeline.prompt_cache is not None:
+                stats['prompt_cache'] = {
+                    "active": rag_pipeline.prompt_cache_active,
+                    **rag_pipeline.prompt_cache.get_stats()
+                }
+            return stats
+        
+        # Conversation and prompt cache stats are read from SQLite
+        return StatsResponse(**await run_blocking(collect_stats))
         
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
@@ -167,6 +367,45 @@ async def chat_options():
     """Handle CORS preflight for chat endpoint"""
     return {"message": "OK"}
 
+def enhance_query(request: ChatRequest) -> str:
+    """Prefix the query with a minimal summary of the user's CV, if provided"""
+    enhanced_query = request.query
+    if request.cv_context:
+        # Ultra-minimal CV context for speed
+        cv_parts = []
+        
+        if request.cv_score is not None:
+            cv_parts.append(f"Score:{request.cv_score}")
+        
+        if request.cv_context.get('Sector'):
+            cv_parts.append(f"Role:{request.cv_context['Sector']}")
+        
+        if request.cv_context.get('Skills'):
+            skills = request.cv_context['Skills']
+            if isinstance(skills, list) and len(skills) > 0:
+                cv_parts.append(f"Skills:{skills[0]}")  # Only first skill
+        
+        # Ultra-short prompt
+        if cv_parts:
+            cv_summary = " ".join(cv_parts)
+            enhanced_query = f"{cv_summary}. {request.query} Be brief."
+            logger.info(f"Query enhanced with minimal CV context")
+    return enhanced_query
+
+def format_sources(documents: List[str], metadatas: List[Dict]) -> List[Dict]:
+    """Source cards shown next to a chat answer"""
+    sources = []
+    for doc, metadata in zip(documents, metadatas):
+        source = {
+            "title": metadata.get('Name') or "Unknown Candidate",
+            "source": metadata.get('source', 'CV Database'),
+            "category": metadata.get('Sector') or "Unknown Sector",
+            "url": metadata.get('url', ''),
+            "preview": doc[:200] + "..." if len(doc) > 200 else doc
+        }
+        sources.append(source)
+    return sources
+
 @app.post("/api/chat", response_model=ChatResponse, tags=["Chat"])
 async def chat(request: ChatRequest):
     """Process chat query and return response"""
@@ -176,122 +415,134 @@ async def chat(request: ChatRequest):
         
         logger.info(f"Processing query: {request.query[:100]}...")
         
-        # Enhance query with CV context if provided
-        enhanced_query = request.query
-        if request.cv_context:
-            # Ultra-minimal CV context for speed
-            cv_parts = []
-            
-            if request.cv_score is not None:
-                cv_parts.append(f"Score:{request.cv_score}")
-            
-            if request.cv_context.get('Sector'):
-                cv_parts.append(f"Role:{request.cv_context['Sector']}")
-            
-            if request.cv_context.get('Skills'):
-                skills = request.cv_context['Skills']
-                if isinstance(skills, list) and len(skills) > 0:
-                    cv_parts.append(f"Skills:{skills[0]}")  # Only first skill
-            
-            # Ultra-short prompt
-            if cv_parts:
-                cv_summary = " ".join(cv_parts)
-                enhanced_query = f"{cv_summary}. {request.query} Be brief."
-                logger.info(f"Query enhanced with minimal CV context")
-        
         # Generate response using RAG pipeline
-        result = rag_pipeline.query(
-            query=enhanced_query,
+        result = await rag_pipeline.aquery(
+            query=enhance_query(request),
             top_k=1,  # Always use only 1 document for maximum speed
             conversation_id=request.conversation_id
         )
         
-        # Prepare sources
-        sources = []
-        for doc, metadata in zip(result['documents'], result['metadatas']):
-            # Extract CV information from the response field
-            response_text = metadata.get('response', '')
-            name = sector = None
-            
-            # Parse name from response
-            if '**Name:**' in response_text:
-                name_line = [line for line in response_text.split('\n') if '**Name:**' in line]
-                if name_line:
-                    name = name_line[0].replace('**Name:**', '').strip()
-            
-            # Parse sector from response  
-            if '**Sector/Role:**' in response_text:
-                sector_line = [line for line in response_text.split('\n') if '**Sector/Role:**' in line]
-                if sector_line:
-                    sector = sector_line[0].replace('**Sector/Role:**', '').strip()
-            
-            source = {
-                "title": name or "Unknown Candidate",
-                "source": metadata.get('source', 'CV Database'),
-                "category": sector or "Unknown Sector",
-                "url": metadata.get('url', ''),
-                "preview": doc[:200] + "..." if len(doc) > 200 else doc
-            }
-            sources.append(source)
-        
         return ChatResponse(
             response=result['response'],
-            sources=sources,
+            sources=format_sources(result['documents'], result['metadatas']),
             conversation_id=result['conversation_id'],
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            prompt_tokens=result.get('prompt_tokens'),
+            cached=result.get('cached')
         )
         
     except Exception as e:
         logger.error(f"Error processing chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: Dict) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.options("/api/chat/stream", tags=["Chat"])
+async def chat_stream_options():
+    """Handle CORS preflight for streaming chat endpoint"""
+    return {"message": "OK"}
+
+@app.post("/api/chat/stream", tags=["Chat"])
+async def chat_stream(request: ChatRequest):
+    """Process chat query and stream the response as server-sent events
+    
+    Events, in order:
+      sources  source cards, conversation_id, mode and prompt_tokens, sent as
+               soon as retrieval is done
+      token    {"text": ...} for each fragment Ollama generates
+      done     full response, time_to_first_token, total_seconds and whether
+               the answer came from the response cache (`cached`); the
+               conversation history has been updated at this point
+      error    {"message": ...} if generation fails (history is not updated)
+    """
+    if not rag_pipeline:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    
+    logger.info(f"Streaming query: {request.query[:100]}...")
+    
+    async def events():
+        try:
+            async for event, data in rag_pipeline.aquery_stream(
+                query=enhance_query(request),
+                top_k=1,  # Always use only 1 document for maximum speed
+                conversation_id=request.conversation_id
+            ):
+                if event == 'sources':
+                    data = {
+                        "sources": format_sources(data.pop('documents'), data.pop('metadatas')),
+                        **data
+                    }
+                elif event == 'done':
+                    data["timestamp"] = datetime.now().isoformat()
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Error streaming chat: {e}")
+            yield sse_event("error", {"message": str(e)})
+    
+    # Retrieval runs on the bounded executor and tokens are read with the
+    # pooled async client, so open streams do not hold worker threads
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def format_search_results(results: Dict, index: int = 0) -> List[Dict]:
+    """Format the results of one query from a vector database search response"""
+    documents = []
+    docs = results.get('documents', [[]])[index]
+    metadatas = results.get('metadatas', [[]])[index]
+    distances = results.get('distances', [[]])[index] if results.get('distances') else [None] * len(docs)
+
+    for doc, metadata, dist in zip(docs, metadatas, distances):
+        documents.append({
+            "id": metadata.get('id'),
+            "name": metadata.get('Name'),
+            "sector": metadata.get('Sector'),
+            "email": metadata.get('Email'),
+            # Stored as one comma-separated string, since metadata values are scalars
+            "skills": parse_skills(metadata.get('skills')),
+            "instruction": metadata.get('instruction'),
+            "response": metadata.get('response'),
+            "content_preview": doc[:400] + "..." if len(doc) > 400 else doc,
+            "score": None if dist is None else float(dist)
+        })
+
+    return documents
+
 @app.post("/api/search", tags=["Search"])
-async def search_documents(query: str, top_k: int = 5):
-    """Search for relevant documents without generating response"""
+async def search_documents(
+    query: str,
+    top_k: int = 5,
+    sector: Optional[str] = None,
+    skill: Optional[str] = None,
+    mode: str = "vector",
+    dedupe: bool = False
+):
+    """Search for relevant documents without generating response
+    
+    Optional sector and skill filters are applied inside the vector index.
+    `mode` selects dense ("vector"), lexical BM25 ("keyword") or fused
+    ("hybrid") retrieval; keyword mode does not call the embedding model.
+    With `dedupe`, near-duplicate CVs are collapsed into their best match.
+    """
     try:
         if not vector_database:
             raise HTTPException(status_code=500, detail="Vector database not initialized")
         
-        results = vector_database.search(query, n_results=top_k)
-
-        documents = []
-        docs = results.get('documents', [[]])[0]
-        metadatas = results.get('metadatas', [[]])[0]
-        distances = results.get('distances', [[]])[0] if 'distances' in results else [None] * len(docs)
-
-        for doc, metadata, dist in zip(docs, metadatas, distances):
-            # Extract CV information from the response field
-            response_text = metadata.get('response', '')
-            name = sector = email = None
-            
-            # Parse name from response
-            if '**Name:**' in response_text:
-                name_line = [line for line in response_text.split('\n') if '**Name:**' in line]
-                if name_line:
-                    name = name_line[0].replace('**Name:**', '').strip()
-            
-            # Parse sector from response  
-            if '**Sector/Role:**' in response_text:
-                sector_line = [line for line in response_text.split('\n') if '**Sector/Role:**' in line]
-                if sector_line:
-                    sector = sector_line[0].replace('**Sector/Role:**', '').strip()
-            
-            # Parse email from response
-            if '**Email:**' in response_text:
-                email_line = [line for line in response_text.split('\n') if '**Email:**' in line]
-                if email_line:
-                    email = email_line[0].replace('**Email:**', '').strip()
-            
-            documents.append({
-                "id": metadata.get('id'),
-                "name": name,
-                "sector": sector,
-                "email": email,
-                "instruction": metadata.get('instruction'),
-                "response": metadata.get('response'),
-                "content_preview": doc[:400] + "..." if len(doc) > 400 else doc,
-                "score": None if dist is None else float(dist)
-            })
+        if mode not in VectorDatabase.SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {VectorDatabase.SEARCH_MODES}")
+        
+        filters = vector_database.build_filters(sector=sector, skill=skill)
+        results = await run_blocking(
+            vector_database.search, query, n_results=top_k, filter_dict=filters, mode=mode, dedupe=dedupe
+        )
+        documents = format_search_results(results)
+        if dedupe:
+            for document, count in zip(documents, results['duplicate_counts'][0]):
+                document["duplicates_collapsed"] = count
 
         return {
             "query": query,
@@ -299,39 +550,104 @@ async def search_documents(query: str, top_k: int = 5):
             "count": len(documents)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/search/batch", tags=["Search"])
+async def search_documents_batch(request: BatchSearchRequest):
+    """Run several searches with a single embedding pass
+    
+    Each query is then searched like /api/search, with the same mode,
+    filters, shard routing and near-duplicate collapsing.
+    """
+    try:
+        if not vector_database:
+            raise HTTPException(status_code=500, detail="Vector database not initialized")
+        
+        filters = vector_database.build_filters(sector=request.sector, skill=request.skill)
+        results = await run_blocking(
+            vector_database.search_many, request.queries, n_results=request.top_k, filters=filters,
+            mode=request.mode or "vector", dedupe=bool(request.dedupe)
+        )
+
+        searches = []
+        for i, query in enumerate(request.queries):
+            documents = format_search_results(results, i)
+            if request.dedupe:
+                for document, count in zip(documents, results['duplicate_counts'][i]):
+                    document["duplicates_collapsed"] = count
+            searches.append({
+                "query": query,
+                "results": documents,
+                "count": len(documents)
+            })
+
+        return {
+            "searches": searches,
+            "count": len(searches)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error running batch search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/build-db", tags=["Admin"])
 async def build_database(req: BuildRequest):
     """Build or update the vector database from the JSON files.
 
     This endpoint allows the frontend or admin to trigger a non-interactive build.
+    Only new or changed records are re-embedded, so re-running it is cheap.
+    With `prune`, stored documents missing from the data file are deleted.
+    With `reset`, the data is built into a new collection version that replaces
+    the live one only once complete, so searches never see a partial index.
+    The build runs on the blocking executor, so searches keep being served meanwhile.
     """
     try:
         if not vector_database:
             raise HTTPException(status_code=500, detail="Vector database not initialized")
+        if req.prune and req.max_items:
+            raise HTTPException(status_code=400, detail="prune cannot be combined with max_items")
 
-        if req.reset:
-            vector_database.reset_database()
-
-        # Use CV data loading function if it's the CV dataset
-        if req.filename == "Dataset_CV.json":
+        # Use CV data loading function if it's the CV dataset (.json or .jsonl);
+        # loaders stream records so memory stays flat for large files
+        if req.filename.startswith("Dataset_CV"):
             data = load_cv_data(req.filename, "../scrapers/data/raw")
         else:
             data = load_qa_data(req.filename, "../scrapers/data/raw")
-            
-        if not data:
-            raise HTTPException(status_code=404, detail="No data found to load")
 
         if req.max_items:
-            data = data[:req.max_items]
+            data = islice(data, req.max_items)
 
-        vector_database.add_documents(data, batch_size=100)
+        # Peek at the first record so an empty or missing file is reported as
+        # such, rather than as a rebuild that failed validation
+        first = await run_blocking(next, data, None)
+        if first is None:
+            raise HTTPException(status_code=404, detail="No data found to load")
+        data = chain([first], data)
 
-        return {"status": "ok", "added": len(data)}
+        options = {"batch_size": 100, "workers": req.workers or 1, "duplicates": req.duplicates or "tag"}
+        if req.reset:
+            try:
+                summary = await run_blocking(vector_database.rebuild, data, **options)
+            except ValueError as e:
+                # Validation failed; the previous version is still live
+                raise HTTPException(status_code=422, detail=f"Rebuild rejected: {e}")
+        else:
+            # Unchanged records are skipped. Pruning is opt-in: the collection may
+            # hold several data files (CVs and legal Q&A), and pruning removes
+            # everything that is not in this one
+            summary = await run_blocking(
+                vector_database.add_documents, data, prune=bool(req.prune), **options
+            )
+
+        return {"status": "ok", **summary}
 
     except HTTPException:
         raise
@@ -340,6 +656,71 @@ async def build_database(req: BuildRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/collection/versions", tags=["Admin"])
+async def collection_versions():
+    """Live collection version and the versions retained for rollback."""
+    if not vector_database:
+        raise HTTPException(status_code=500, detail="Vector database not initialized")
+    return vector_database.list_versions()
+
+
+@app.post("/api/collection/rollback", tags=["Admin"])
+async def rollback_collection():
+    """Switch back to the previous collection version."""
+    try:
+        if not vector_database:
+            raise HTTPException(status_code=500, detail="Vector database not initialized")
+
+        return {"status": "ok", **await run_blocking(vector_database.rollback)}
+
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rolling back collection: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/snapshot/export", tags=["Admin"])
+async def export_snapshot(req: SnapshotRequest):
+    """Write the current collection to a snapshot under SNAPSHOT_DIR."""
+    try:
+        if not vector_database:
+            raise HTTPException(status_code=500, detail="Vector database not initialized")
+
+        # The dump is synchronous file I/O and hashing; keep it off the event loop
+        manifest = await run_blocking(vector_database.export_snapshot, str(SNAPSHOT_DIR / req.name))
+        return {"status": "ok", "path": str(SNAPSHOT_DIR / req.name), "manifest": manifest}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting snapshot: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/snapshot/import", tags=["Admin"])
+async def import_snapshot(req: SnapshotRequest):
+    """Replace the collection with a snapshot from SNAPSHOT_DIR (no re-embedding)."""
+    try:
+        if not vector_database:
+            raise HTTPException(status_code=500, detail="Vector database not initialized")
+
+        manifest = await run_blocking(
+            vector_database.import_snapshot, str(SNAPSHOT_DIR / req.name), force=req.force
+        )
+        return {"status": "ok", "documents": manifest["count"], "manifest": manifest}
+
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing snapshot: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/doc/{doc_id}", tags=["Documents"])
 async def get_document(doc_id: str):
     """Fetch a document by its numeric id or 'qa_<id>' format."""
@@ -353,16 +734,16 @@ async def get_document(doc_id: str):
         else:
             lookup_id = f"qa_{doc_id}"
 
-        result = vector_database.collection.get(ids=[lookup_id])
+        result = await run_blocking(vector_database.get_documents, [lookup_id])
 
         if not result or not result.get('ids'):
             raise HTTPException(status_code=404, detail="Document not found")
 
-        # Chroma returns lists per field
+        # Backends return one list entry per requested ID
         return {
             "id": result['ids'][0],
-            "document": result.get('documents', [[]])[0][0] if result.get('documents') else None,
-            "metadata": result.get('metadatas', [[]])[0][0] if result.get('metadatas') else None
+            "document": result['documents'][0] if result.get('documents') else None,
+            "metadata": result['metadatas'][0] if result.get('metadatas') else None
         }
 
     except HTTPException:
@@ -0,0 +1,276 @@
+"""
+Near-duplicate detection for CV documents with MinHash and LSH banding.
+
+Each document is reduced to word shingles and a MinHash signature whose
+agreement rate estimates the Jaccard similarity of two documents' shingle
+sets. Signatures are split into bands; documents sharing any band bucket are
+candidate duplicates and are confirmed against the similarity threshold.
+Re-uploads and template clones of the same CV end up in one cluster, named
+after the first document seen.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Mersenne prime for the universal hash family; 32-bit shingle hashes keep
+# a * x + b inside uint64
+PRIME = (1 << 31) - 1
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """Hashes of the word `size`-grams of a text (the whole text if shorter)"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little") % PRIME
+        for gram in grams
+    }
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash/LSH index mapping documents to duplicate clusters
+
+    Args:
+        path: .npz file the signatures and clusters are persisted to
+        threshold: Estimated Jaccard similarity at or above which two
+            documents are duplicates
+        num_perm: Signature length
+        bands: Number of LSH bands (num_perm must be divisible by it)
+        shingle_size: Words per shingle
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 5,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.path = Path(path)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.RLock()
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._clusters: Dict[str, str] = {}
+        # Members per cluster, so the cluster count is known without a scan
+        self._cluster_sizes: Dict[str, int] = {}
+        self._aliases: Dict[str, str] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+        self._dirty = False
+
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Load signatures and clusters from disk if they exist"""
+        if not self.path.exists():
+            return
+
+        try:
+            data = np.load(self.path, allow_pickle=False)
+            ids, signatures, clusters = data["ids"], data["signatures"], data["clusters"]
+            alias_ids, alias_targets = data["alias_ids"], data["alias_targets"]
+        except Exception as e:
+            logger.warning(f"Could not load near-duplicate index from {self.path}, starting empty: {e}")
+            return
+
+        if signatures.shape[1:] != (self.num_perm,):
+            logger.warning(f"Near-duplicate index at {self.path} uses different settings; starting empty")
+            return
+
+        with self._lock:
+            self.clear()
+            for doc_id, signature, cluster in zip(ids.tolist(), signatures, clusters.tolist()):
+                self._insert(doc_id, signature, cluster)
+            self._aliases = dict(zip(alias_ids.tolist(), alias_targets.tolist()))
+            self._dirty = False
+
+        logger.info(f"Loaded near-duplicate index with {len(self._signatures)} documents from {self.path}")
+
+    def save(self):
+        """Write the index to disk atomically if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            ids = list(self._signatures)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp.npz")
+            np.savez(
+                tmp_path,
+                ids=np.array(ids, dtype=str),
+                signatures=np.array([self._signatures[doc_id] for doc_id in ids], dtype=np.uint32).reshape(-1, self.num_perm),
+                clusters=np.array([self._clusters[doc_id] for doc_id in ids], dtype=str),
+                alias_ids=np.array(list(self._aliases), dtype=str),
+                alias_targets=np.array(list(self._aliases.values()), dtype=str)
+            )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    # ------------------------------------------------------------------
+    # Signatures and lookup
+    # ------------------------------------------------------------------
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text"""
+        hashes = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        if len(hashes) == 0:
+            return np.full(self.num_perm, PRIME, dtype=np.uint32)
+        permuted = (hashes[:, None] * self._a + self._b) % PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def find(self, signature: np.ndarray, exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """Most similar indexed document at or above the threshold
+
+        Returns:
+            (doc_id, estimated Jaccard similarity) or None
+        """
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates |= self._buckets[band].get(key, set())
+            candidates.discard(exclude)
+
+            best = None
+            for doc_id in candidates:
+                similarity = float(np.mean(self._signatures[doc_id] == signature))
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (doc_id, similarity)
+            return best
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def _insert(self, doc_id: str, signature: np.ndarray, cluster: str):
+        self._signatures[doc_id] = signature
+        self._clusters[doc_id] = cluster
+        self._cluster_sizes[cluster] = self._cluster_sizes.get(cluster, 0) + 1
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(doc_id)
+
+    def assign(self, doc_id: str, text: str) -> Tuple[str, Optional[str]]:
+        """Index a document and return its cluster
+
+        Returns:
+            (cluster_id, duplicate_of) where duplicate_of is the matched
+            document, or None if the document starts a new cluster
+        """
+        signature = self.signature(text)
+        with self._lock:
+            self.remove(doc_id)
+            match = self.find(signature, exclude=doc_id)
+            cluster = self._clusters[match[0]] if match else doc_id
+            self._insert(doc_id, signature, cluster)
+            self._dirty = True
+            return cluster, (match[0] if match else None)
+
+    def check(self, doc_id: str, text: str) -> Optional[str]:
+        """Document an unindexed text duplicates, without indexing it"""
+        match = self.find(self.signature(text), exclude=doc_id)
+        return match[0] if match else None
+
+    def add_alias(self, doc_id: str, canonical_id: str):
+        """Record that a skipped duplicate was merged into a stored document"""
+        with self._lock:
+            self._aliases[doc_id] = canonical_id
+            self._dirty = True
+
+    def remove(self, doc_id: str):
+        """Remove a document (and any alias with its ID)"""
+        with self._lock:
+            if self._aliases.pop(doc_id, None) is not None:
+                self._dirty = True
+            signature = self._signatures.pop(doc_id, None)
+            if signature is None:
+                return
+            cluster = self._clusters.pop(doc_id)
+            if self._cluster_sizes[cluster] == 1:
+                del self._cluster_sizes[cluster]
+            else:
+                self._cluster_sizes[cluster] -= 1
+            for band, key in enumerate(self._band_keys(signature)):
+                bucket = self._buckets[band].get(key)
+                if bucket is not None:
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del self._buckets[band][key]
+            self._dirty = True
+
+    def clear(self):
+        """Remove all documents and aliases"""
+        with self._lock:
+            self._signatures = {}
+            self._clusters = {}
+            self._cluster_sizes = {}
+            self._aliases = {}
+            self._buckets = [{} for _ in range(self.bands)]
+            self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Clusters
+    # ------------------------------------------------------------------
+
+    def cluster_of(self, doc_id: str) -> str:
+        """Cluster ID of a document (its own ID if unknown)"""
+        return self._clusters.get(doc_id, doc_id)
+
+    def merged_into(self, doc_id: str) -> Optional[str]:
+        """Stored document a merged duplicate ID resolves to"""
+        return self._aliases.get(doc_id)
+
+    def aliases(self) -> Dict[str, str]:
+        """All merged duplicate IDs and the stored documents they resolve to"""
+        with self._lock:
+            return dict(self._aliases)
+
+    def get_stats(self) -> Dict:
+        """Indexed documents, clusters and merged aliases"""
+        with self._lock:
+            n_clusters = len(self._cluster_sizes)
+            return {
+                "documents": len(self._signatures),
+                "clusters": n_clusters,
+                "duplicates": len(self._signatures) - n_clusters,
+                "merged_aliases": len(self._aliases),
+                "threshold": self.threshold
+            }
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._signatures
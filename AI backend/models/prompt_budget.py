@@ -0,0 +1,73 @@
+"""
+Token counting for prompt budgeting.
+
+Uses a Hugging Face tokenizer matching the generation model when one is
+configured and `transformers` is installed; otherwise falls back to a
+conservative characters-per-token estimate so budgets err on the short side.
+"""
+
+import logging
+import math
+import os
+from typing import Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# English prose averages ~4 characters per token for BPE tokenizers; CV text with
+# names, emails and abbreviations tokenizes denser, so estimate on the safe side.
+DEFAULT_CHARS_PER_TOKEN = 3.0
+
+
+class TokenCounter:
+    """Counts and truncates text in model tokens"""
+
+    def __init__(self, tokenizer_name: Optional[str] = None, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN):
+        self.chars_per_token = chars_per_token
+        self.tokenizer = None
+        self.tokenizer_name = tokenizer_name or os.getenv("PROMPT_TOKENIZER") or None
+
+        if self.tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                logger.info(f"Counting prompt tokens with {self.tokenizer_name} tokenizer")
+            except Exception as e:
+                logger.warning(
+                    f"Could not load tokenizer '{self.tokenizer_name}' ({e}); "
+                    f"estimating {chars_per_token} characters per token"
+                )
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text"""
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text: str, max_tokens: int, suffix: str = "...") -> str:
+        """Cut text to at most max_tokens tokens, including the suffix"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+
+        keep = max_tokens - self.count(suffix)
+        if keep <= 0:
+            return ""
+
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)[:keep]
+            return self.tokenizer.decode(ids).rstrip() + suffix
+
+        cut = text[:int(keep * self.chars_per_token)]
+        # Prefer ending on a word boundary
+        space = cut.rfind(" ")
+        if space > len(cut) // 2:
+            cut = cut[:space]
+        return cut.rstrip() + suffix
@@ -0,0 +1,174 @@
+"""
+Exact-match cache of LLM responses keyed by prompt content.
+
+Responses are keyed by a SHA-256 hash of (model, generation options, prompt),
+so a response is only ever reused for a byte-identical request. Recently used
+responses are kept in memory; every response is also written to a SQLite
+database so the cache survives restarts and is shared by processes using the
+same file.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from cache_utils import LRUCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PromptCache:
+    """Two-tier (memory LRU + SQLite) cache of generated responses
+
+    Args:
+        path: SQLite file for the persistent tier (None keeps the cache in memory only)
+        max_entries: Responses kept in memory
+        max_disk_entries: Responses kept on disk; the least recently used are pruned
+    """
+
+    # Prune the disk tier every this many writes rather than on each one
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 256, max_disk_entries: int = 10_000):
+        self.path = Path(path) if path else None
+        self.max_disk_entries = max_disk_entries
+        self.memory = LRUCache(max_size=max_entries)
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+        if self.path is not None:
+            self._open()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _open(self):
+        """Open (or create) the SQLite tier; the cache stays memory-only if that fails"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._conn = conn
+            logger.info(f"Loaded prompt cache with {self._disk_count()} responses from {self.path}")
+        except sqlite3.Error as e:
+            logger.warning(f"Prompt cache at {self.path} is unavailable, keeping responses in memory only: {e}")
+            self._conn = None
+
+    def _disk_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _prune(self):
+        """Delete the least recently used responses beyond max_disk_entries"""
+        deleted = self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        ).rowcount
+        self.disk_evictions += max(0, deleted)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def key(model: str, options: Dict, prompt: str) -> str:
+        """Content address of a generation request"""
+        payload = json.dumps([model, options, prompt], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a key, from memory or disk"""
+        response = self.memory.get(key)
+        if response is not None:
+            return response
+
+        if self._conn is not None:
+            with self._lock:
+                try:
+                    row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                except sqlite3.Error as e:
+                    logger.warning(f"Prompt cache read failed: {e}")
+                    row = None
+            if row is not None:
+                self.disk_hits += 1
+                self.memory.put(key, row[0])
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: str, model: str = ""):
+        """Store a response in memory and on disk"""
+        self.memory.put(key, response)
+        if self._conn is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, model, response, now, now)
+                )
+                self._writes += 1
+                if self._writes % self.PRUNE_INTERVAL == 0:
+                    self._prune()
+            except sqlite3.Error as e:
+                logger.warning(f"Prompt cache write failed: {e}")
+
+    def clear(self):
+        """Remove all responses from memory and disk"""
+        self.memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        """Close the SQLite connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_stats(self) -> Dict:
+        """Entries per tier and hit/miss counters"""
+        memory_hits = self.memory.hits
+        lookups = memory_hits + self.disk_hits + self.misses
+        disk_entries = None
+        if self._conn is not None:
+            with self._lock:
+                disk_entries = self._disk_count()
+        return {
+            "memory_entries": len(self.memory),
+            "max_memory_entries": self.memory.max_size,
+            "disk_entries": disk_entries,
+            "max_disk_entries": self.max_disk_entries if self._conn is not None else None,
+            "memory_hits": memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "disk_evictions": self.disk_evictions
+        }
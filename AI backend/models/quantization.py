@@ -0,0 +1,210 @@
+"""
+Compact storage formats for embedding vectors.
+
+float32  4 bytes/dim, exact
+float16  2 bytes/dim
+int8     1 byte/dim + one float32 scale per vector (symmetric scalar quantization)
+
+Run this module to compare memory footprint and recall@k of each format
+against float32 exact search, either on a saved NumPy index or on random data:
+
+    python quantization.py --index ../data/vectordb/numpy_cv_qa --k 10
+"""
+
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+STORAGE_MODES = ("float32", "float16", "int8")
+
+
+def quantize(vectors: np.ndarray, storage: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode float32 vectors in the given storage format
+
+    Returns:
+        (codes, scales) - scales is all ones except for int8 storage
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.ones(len(vectors), dtype=np.float32)
+
+    if storage == "float32":
+        return vectors, scales
+    if storage == "float16":
+        return vectors.astype(np.float16), scales
+    if storage == "int8":
+        max_abs = np.abs(vectors).max(axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+        scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unknown storage mode '{storage}', expected one of {STORAGE_MODES}")
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Decode stored vectors back to float32"""
+    vectors = np.asarray(codes, dtype=np.float32)
+    if codes.dtype == np.int8:
+        vectors = vectors * scales[:, None]
+    return vectors
+
+
+def squared_l2(
+    queries: np.ndarray,
+    codes: np.ndarray,
+    scales: np.ndarray,
+    sq_norms: np.ndarray,
+    chunk_size: int = 65536
+) -> np.ndarray:
+    """Squared L2 distances between queries and stored vectors
+
+    Rows are decoded chunk by chunk so compact formats never have to be
+    expanded to a full float32 matrix in memory.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    n_rows = len(codes)
+    distances = np.empty((len(queries), n_rows), dtype=np.float32)
+    query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+
+    for start in range(0, n_rows, chunk_size):
+        end = min(start + chunk_size, n_rows)
+        dots = queries @ np.asarray(codes[start:end], dtype=np.float32).T
+        if codes.dtype == np.int8:
+            dots *= scales[start:end]
+        distances[:, start:end] = query_norms + sq_norms[start:end] - 2.0 * dots
+
+    return distances
+
+
+def footprint_bytes(n_vectors: int, dimension: int, storage: str, keep_full: bool = False) -> int:
+    """Bytes needed to store n vectors in a format (plus norms and scales)"""
+    bytes_per_dim = {"float32": 4, "float16": 2, "int8": 1}[storage]
+    total = n_vectors * dimension * bytes_per_dim + n_vectors * 4  # codes + squared norms
+    if storage == "int8":
+        total += n_vectors * 4  # per-vector scale
+    if keep_full and storage != "float32":
+        total += n_vectors * dimension * 4  # full-precision copy for re-scoring (disk, memory-mapped)
+    return total
+
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    rows = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, rows, axis=1).argsort(axis=1)
+    return np.take_along_axis(rows, order, axis=1)
+
+
+def evaluate_storage_modes(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    rescore_factor: int = 4,
+    modes: Optional[List[str]] = None,
+    project_to: int = 1_000_000
+) -> List[Dict]:
+    """Measure footprint, recall@k and query time of each storage mode
+
+    Recall is measured against float32 exact search, with and without exact
+    re-scoring of the top k * rescore_factor candidates.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+    exact_norms = np.einsum("ij,ij->i", vectors, vectors)
+    truth = _top_k(squared_l2(queries, vectors, np.ones(len(vectors), np.float32), exact_norms), k)
+
+    def recall(found: np.ndarray) -> float:
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+        return hits / truth.size
+
+    report = []
+    for storage in modes or STORAGE_MODES:
+        codes, scales = quantize(vectors, storage)
+        decoded = dequantize(codes, scales)
+        sq_norms = np.einsum("ij,ij->i", decoded, decoded)
+
+        started = time.perf_counter()
+        approx = squared_l2(queries, codes, scales, sq_norms)
+        found = _top_k(approx, k)
+        query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        n_candidates = min(k * rescore_factor, len(vectors))
+        candidates = _top_k(approx, n_candidates)
+        rescored = []
+        for query, rows in zip(queries, candidates):
+            exact = ((vectors[rows] - query) ** 2).sum(axis=1)
+            rescored.append(rows[np.argsort(exact)[:k]])
+
+        report.append({
+            "storage": storage,
+            "bytes": footprint_bytes(len(vectors), vectors.shape[1], storage),
+            "projected_mb": round(footprint_bytes(project_to, vectors.shape[1], storage) / 2**20, 1),
+            "recall_at_k": round(recall(found), 4),
+            "recall_at_k_rescored": round(recall(np.array(rescored)), 4),
+            "query_ms": round(query_ms, 3)
+        })
+
+    return report
+
+
+def load_index_vectors(directory: str) -> Tuple[np.ndarray, bool]:
+    """Float32 vectors of a saved NumPy index
+
+    Returns:
+        (vectors, exact) - exact is False when only compact codes were stored,
+        in which case they are decoded with their per-vector scales
+    """
+    from pathlib import Path
+
+    directory = Path(directory)
+    full_path = directory / "full.npy"
+    if full_path.exists():
+        return np.asarray(np.load(full_path, mmap_mode="r"), dtype=np.float32), True
+
+    codes = np.load(directory / "vectors.npy", mmap_mode="r")
+    if codes.dtype == np.float32:
+        return np.asarray(codes), True
+
+    scales_path = directory / "scales.npy"
+    if codes.dtype == np.int8 and not scales_path.exists():
+        raise FileNotFoundError(f"{scales_path} is missing; int8 codes cannot be decoded without their scales")
+    scales = np.load(scales_path) if scales_path.exists() else np.ones(len(codes), dtype=np.float32)
+    return dequantize(codes, scales), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector storage formats")
+    parser.add_argument("--index", help="NumPy index directory containing vectors.npy (default: random data)")
+    parser.add_argument("--n", type=int, default=20000, help="Number of random vectors if no index is given")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of random vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Number of held-out query vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.index:
+        vectors, exact = load_index_vectors(args.index)
+        if not exact:
+            print(
+                "Warning: the index has no full-precision copy (full.npy); recall is measured "
+                "against its decoded compact vectors, not the original float32 embeddings"
+            )
+    else:
+        vectors = rng.standard_normal((args.n, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors) // 2), replace=False)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+    corpus = np.delete(vectors, picks, axis=0)
+
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'storage':<8} {'MB':>8} {'MB@1M':>8} {'recall':>8} {'rescored':>9} {'ms/query':>9}")
+    for row in evaluate_storage_modes(corpus, queries, k=args.k, rescore_factor=args.rescore_factor):
+        print(
+            f"{row['storage']:<8} {row['bytes'] / 2**20:>8.1f} {row['projected_mb']:>8.1f} "
+            f"{row['recall_at_k']:>8.4f} {row['recall_at_k_rescored']:>9.4f} {row['query_ms']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
 import requests
+import asyncio
 import json
 import logging
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 import uuid
 
+import httpx
+
+from cache_utils import AsyncSingleFlight, SemanticCache, SingleFlight
+from conversation_store import ConversationStore, MemoryConversationStore
+from prompt_budget import TokenCounter
+from prompt_cache import PromptCache
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -16,17 +28,65 @@ class RAGPipeline:
         ollama_model: str = "qwen2.5:7b",
         ollama_base_url: str = "http://localhost:11434",
         temperature: float = 0.1,  # Reduced for faster, more deterministic responses
-        relevance_threshold: float = 0.25 # Lower threshold to use RAG less often
+        relevance_threshold: float = 0.25, # Lower threshold to use RAG less often
+        search_mode: str = "vector",  # "vector", "keyword" or "hybrid" retrieval
+        num_ctx: int = 1024,  # Ollama context window; prompts are packed to fit it
+        max_tokens: int = 250,  # Tokens reserved for the generated answer
+        tokenizer_name: Optional[str] = None,  # HF tokenizer for exact counts (default: estimate)
+        token_counter: Optional[TokenCounter] = None,  # Pre-built counter (overrides tokenizer_name)
+        executor: Optional[Executor] = None,  # Runs retrieval for the async methods (shared with the API)
+        executor_workers: int = 4,  # Size of the executor created when none is given
+        max_connections: int = 50,  # Pooled keep-alive connections to Ollama for the async methods
+        response_cache_size: int = 512,  # Answers kept for paraphrased repeat questions (0 disables)
+        response_cache_threshold: float = 0.92,  # Query embedding cosine similarity needed for a cache hit
+        response_cache_ttl: Optional[float] = 3600,  # Seconds a cached answer stays valid
+        prompt_cache: Optional[PromptCache] = None,  # Exact (model, options, prompt) -> response cache
+        cache_nondeterministic: bool = False,  # Use prompt_cache even when temperature > 0
+        conversation_store: Optional[ConversationStore] = None  # Conversation histories (default: in-memory LRU)
     ):
         self.vector_db = vector_database
         self.ollama_model = ollama_model
         self.ollama_base_url = ollama_base_url
         self.temperature = temperature
         self.relevance_threshold = relevance_threshold
-        self.conversations = {}  # Store conversation history
+        self.search_mode = search_mode
+        self.num_ctx = num_ctx
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter or TokenCounter(tokenizer_name)
+        # Store conversation history (last 10 messages, i.e. 5 exchanges, per conversation)
+        self.conversations = conversation_store or MemoryConversationStore(max_messages=10)
+        
+        # Embedding and index queries block, so the async methods run them on a
+        # bounded pool: a burst of chats queues for CPU instead of oversubscribing
+        # it, and the event loop stays free for health checks and searches
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="rag")
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Paraphrases of a question that retrieve the same documents get the
+        # same answer without another generation
+        self.response_cache = SemanticCache(
+            max_size=response_cache_size,
+            threshold=response_cache_threshold,
+            ttl_seconds=response_cache_ttl
+        ) if response_cache_size > 0 else None
+        
+        # Byte-identical prompts (canned queries with no history) reuse the
+        # previous generation; sampled output is only reused when opted in
+        self.prompt_cache = prompt_cache
+        self.cache_nondeterministic = cache_nondeterministic
+        
+        # Identical first questions asked concurrently share one retrieval and
+        # generation; each caller still gets its own conversation
+        self.query_flights = SingleFlight()
+        self.aquery_flights = AsyncSingleFlight()
         
         logger.info(f"RAG Pipeline initialized with model: {ollama_model}")
         logger.info(f"Relevance threshold: {relevance_threshold}")
+        logger.info(f"Retrieval mode: {search_mode}")
+        logger.info(f"Context window: {num_ctx} tokens ({max_tokens} reserved for the answer)")
         logger.info("Domain: CV and Resume analysis")
     
     def check_ollama(self) -> bool:
@@ -42,31 +102,110 @@ class RAGPipeline:
             logger.error(f"Error checking Ollama: {e}")
             return False
     
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared async HTTP client; connections to Ollama are kept alive and reused
+        
+        Pooled connections belong to the event loop that opened them, so a
+        caller on a different loop (e.g. successive asyncio.run calls) gets a
+        fresh client.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._close_stale_client()
+            self._client_loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.ollama_base_url,
+                # Generation may take a while, but each read (or streamed line)
+                # must arrive within 30s, like the blocking client
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+        return self._client
+    
+    def _close_stale_client(self):
+        """Close the client opened on another event loop, on that loop
+        
+        Its connections can only be closed by the loop that opened them. Once
+        that loop is closed this is no longer possible, and the client is left
+        to garbage collection (call aclose() before closing a loop to avoid it).
+        """
+        client, loop = self._client, self._client_loop
+        self._client = None
+        if client is None or client.is_closed or loop is None:
+            return
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        elif not loop.is_closed():
+            # This thread is running the new loop, so the old one runs elsewhere
+            closer = threading.Thread(target=loop.run_until_complete, args=(client.aclose(),))
+            closer.start()
+            closer.join()
+        else:
+            logger.debug("Dropping HTTP client of a closed event loop")
+    
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Run a blocking call on the pipeline's executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+    
+    async def acheck_ollama(self) -> bool:
+        """Async version of check_ollama
+        
+        Uses its own connection: a health probe must not wait for a free slot
+        in a pool that in-flight generations may have exhausted.
+        """
+        try:
+            async with httpx.AsyncClient(base_url=self.ollama_base_url, timeout=5.0) as client:
+                response = await client.get("/api/tags")
+            if response.status_code == 200:
+                models = response.json().get('models', [])
+                model_names = [m['name'] for m in models]
+                return any(self.ollama_model in name for name in model_names)
+            return False
+        except Exception as e:
+            logger.error(f"Error checking Ollama: {e}")
+            return False
+    
+    async def aclose(self):
+        """Close the async HTTP client and the executor the pipeline created"""
+        if self._client is not None and self._client_loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+        if self.prompt_cache is not None:
+            self.prompt_cache.close()
+        self.conversations.close()
+    
     def retrieve_context(self, query: str, top_k: int = 3) -> Dict:
         """Retrieve relevant documents from vector database"""
         logger.info(f"Retrieving top {top_k} documents for query")
         
-        results = self.vector_db.search(query, n_results=top_k)
+        results = self.vector_db.search(query, n_results=top_k, mode=self.search_mode)
         
         return {
+            'ids': results['ids'][0],
             'documents': results['documents'][0],
             'metadatas': results['metadatas'][0],
             'distances': results.get('distances', [[]])[0]
         }
     
-    def build_prompt(
-        self,
-        query: str,
-        context_docs: List[str],
-        context_metadata: List[Dict],
-        conversation_history: List[Dict] = None,
-        use_rag: bool = True
-    ) -> str:
-        """Build prompt for LLM with or without retrieved context"""
-        
-        if use_rag:
-            # RAG mode: Use database context
-            system_prompt = """You are an AI career assistant specializing in CV and resume analysis, recruitment, and career guidance. 
+    TIMEOUT_MESSAGE = "I apologize, but the response is taking too long. Please try a shorter question."
+    ERROR_MESSAGE = "I apologize, but I encountered an error. Please try again."
+    
+    # Template overhead Ollama adds around the prompt, plus slack for tokenizer
+    # boundary effects when pieces are counted separately
+    PROMPT_SAFETY_TOKENS = 32
+    # Share of the post-instructions budget that conversation history may use
+    HISTORY_SHARE = 0.25
+    MAX_HISTORY_MESSAGES = 3
+    
+    RAG_SYSTEM_PROMPT = """You are an AI career assistant specializing in CV and resume analysis, recruitment, and career guidance. 
 Your role is to provide accurate, helpful, and well-informed responses based on the provided CV/resume data.
 
 Guidelines:
@@ -79,26 +218,8 @@ Guidelines:
 
 Context from CV/Resume Database:
 """
-            
-            # Add context documents with sources (now Q&A pairs)
-            for i, (doc, metadata) in enumerate(zip(context_docs, context_metadata), 1):
-                source_info = f"[Reference {i}]"
-                
-                # Extract CV/resume information from metadata
-                name = metadata.get('Name', 'Unknown Candidate')
-                sector = metadata.get('Sector', 'Unknown Sector')
-                email = metadata.get('Email', 'No email')
-                cv_id = metadata.get('id', str(i))
-                
-                system_prompt += f"\n{source_info} (ID: {cv_id}):\n"
-                system_prompt += f"Candidate: {name}\n"
-                system_prompt += f"Sector: {sector}\n"
-                if email and email != 'No email':
-                    system_prompt += f"Email: {email}\n"
-                system_prompt += f"Profile: {doc}\n"
-        else:
-            # Pure LLM mode: No database context, use general knowledge
-            system_prompt = """You are an AI career assistant with expertise in CV/resume analysis, recruitment, and career guidance.
+    
+    LLM_SYSTEM_PROMPT = """You are an AI career assistant with expertise in CV/resume analysis, recruitment, and career guidance.
 
 Guidelines:
 1. Answer questions clearly, comprehensively, and in a conversational manner
@@ -110,59 +231,328 @@ Guidelines:
 
 Note: This response is based on general career knowledge. For specific candidate information from our database, please try rephrasing your query with more specific keywords.
 """
+    
+    def prompt_budget(self, max_tokens: Optional[int] = None) -> int:
+        """Tokens available for the prompt once the answer is reserved"""
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        return max(0, self.num_ctx - max_tokens - self.PROMPT_SAFETY_TOKENS)
+    
+    @staticmethod
+    def _reference_header(index: int, metadata: Dict) -> str:
+        """Reference line and candidate fields that precede a context document"""
+        # Extract CV/resume information from metadata
+        name = metadata.get('Name', 'Unknown Candidate')
+        sector = metadata.get('Sector', 'Unknown Sector')
+        email = metadata.get('Email', 'No email')
+        cv_id = metadata.get('id', str(index))
+        
+        header = f"\n[Reference {index}] (ID: {cv_id}):\n"
+        header += f"Candidate: {name}\n"
+        header += f"Sector: {sector}\n"
+        if email and email != 'No email':
+            header += f"Email: {email}\n"
+        return header + "Profile: "
+    
+    def pack_prompt(
+        self,
+        query: str,
+        context_docs: List[str],
+        context_metadata: List[Dict],
+        conversation_history: List[Dict] = None,
+        use_rag: bool = True,
+        max_tokens: Optional[int] = None
+    ) -> Tuple[str, Dict]:
+        """Build a prompt that fits the context window
+        
+        The budget (num_ctx minus the tokens reserved for the answer) goes to
+        the system prompt and current query first, then up to HISTORY_SHARE of
+        the rest to the most recent history messages, and the remainder to the
+        retrieved documents in relevance order. Each document gets an even
+        share of what is left when it is reached, so long profiles are
+        truncated instead of crowding out the ones after them.
+        
+        Args:
+            query: Current user query
+            context_docs: Retrieved documents, most relevant first
+            context_metadata: Metadata of each retrieved document
+            conversation_history: Previous messages, oldest first
+            use_rag: Include retrieved documents (otherwise general-knowledge prompt)
+            max_tokens: Tokens reserved for the answer (default: self.max_tokens)
+            
+        Returns:
+            (prompt, usage) where usage reports the budget and tokens used per section
+        """
+        counter = self.token_counter
+        budget = self.prompt_budget(max_tokens)
+        
+        system_prompt = self.RAG_SYSTEM_PROMPT if use_rag else self.LLM_SYSTEM_PROMPT
+        conversation_header = "\n\nConversation:\n"
+        
+        # Fixed parts: instructions, section header and the current query. A query
+        # longer than half the budget, or than the instructions leave room for,
+        # is cut so that the prompt still fits and something else can too.
+        system_tokens = counter.count(system_prompt) + counter.count(conversation_header)
+        query_room = min(budget // 2, budget - system_tokens - counter.count("User: \nAssistant: "))
+        query = counter.truncate(query, query_room)
+        query_text = f"User: {query}\nAssistant: "
+        used = {
+            'system': system_tokens,
+            'query': counter.count(query_text),
+            'history': 0,
+            'documents': 0
+        }
+        remaining = budget - used['system'] - used['query']
+        
+        # Conversation history, newest messages first
+        history_lines = []
+        history_budget = int(max(0, remaining) * self.HISTORY_SHARE)
+        for msg in reversed((conversation_history or [])[-self.MAX_HISTORY_MESSAGES:]):
+            prefix = f"{msg['role'].capitalize()}: "
+            room = history_budget - used['history'] - counter.count(prefix) - 1
+            if room <= 0:
+                break
+            line = f"{prefix}{counter.truncate(msg['content'], room)}\n"
+            history_lines.insert(0, line)
+            used['history'] += counter.count(line)
+        remaining -= used['history']
         
-        # Add conversation history if available
-        prompt = system_prompt + "\n\nConversation:\n"
+        # Retrieved documents, most relevant first
+        doc_blocks = []
+        n_truncated = 0
+        if use_rag:
+            docs = list(zip(context_docs, context_metadata))
+            for i, (doc, metadata) in enumerate(docs, 1):
+                header = self._reference_header(i, metadata)
+                share = remaining // (len(docs) - i + 1) - counter.count(header) - 1
+                if share <= 0:
+                    break
+                body = counter.truncate(doc, share)
+                n_truncated += body != doc
+                block = f"{header}{body}\n"
+                doc_blocks.append(block)
+                cost = counter.count(block)
+                used['documents'] += cost
+                remaining -= cost
         
-        if conversation_history:
-            for msg in conversation_history[-3:]:  # Last 3 exchanges
-                role = msg['role'].capitalize()
-                prompt += f"{role}: {msg['content']}\n"
+        prompt = system_prompt + "".join(doc_blocks) + conversation_header + "".join(history_lines) + query_text
         
-        # Add current query
-        prompt += f"User: {query}\nAssistant: "
+        # Pieces were counted separately; drop trailing context if the whole is over
+        prompt_tokens = counter.count(prompt)
+        while prompt_tokens > budget and (doc_blocks or history_lines):
+            if doc_blocks:
+                doc_blocks.pop()
+            else:
+                history_lines.pop(0)
+            prompt = system_prompt + "".join(doc_blocks) + conversation_header + "".join(history_lines) + query_text
+            prompt_tokens = counter.count(prompt)
         
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'budget': budget,
+            'num_ctx': self.num_ctx,
+            'sections': used,
+            'documents_included': len(doc_blocks),
+            'documents_truncated': n_truncated,
+            'documents_dropped': len(context_docs) - len(doc_blocks) if use_rag else 0,
+            'history_messages': len(history_lines),
+            'exact_count': counter.exact
+        }
+        return prompt, usage
+    
+    def build_prompt(
+        self,
+        query: str,
+        context_docs: List[str],
+        context_metadata: List[Dict],
+        conversation_history: List[Dict] = None,
+        use_rag: bool = True
+    ) -> str:
+        """Build prompt for LLM with or without retrieved context"""
+        prompt, _ = self.pack_prompt(query, context_docs, context_metadata, conversation_history, use_rag)
         return prompt
     
-    def generate_response(self, prompt: str, max_tokens: int = 300) -> str:
+    def _generate_payload(self, prompt: str, max_tokens: Optional[int] = None, stream: bool = False) -> Dict:
+        """Request body for Ollama's /api/generate"""
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        return {
+            "model": self.ollama_model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": self.temperature,
+                "num_predict": max_tokens,  # Reduced for faster responses
+                "num_ctx": self.num_ctx,  # Prompts are packed to fit this window
+                "top_k": 10,  # Further reduced sampling
+                "top_p": 0.7,  # Even faster sampling
+                "repeat_penalty": 1.05,  # Minimal repeat penalty
+                "mirostat": 2,  # Enable mirostat for faster, more consistent responses
+                "mirostat_tau": 3.0,  # Target entropy
+                "mirostat_eta": 0.1  # Learning rate
+            }
+        }
+    
+    @property
+    def prompt_cache_active(self) -> bool:
+        """Whether generations may be served from the prompt cache
+        
+        With temperature 0 Ollama decodes greedily, so a prompt always yields
+        the same answer; at higher temperatures reusing one sample is only
+        done when explicitly allowed.
+        """
+        return self.prompt_cache is not None and (self.temperature <= 0 or self.cache_nondeterministic)
+    
+    @property
+    def response_cache_active(self) -> bool:
+        """Whether answers may be reused for similar questions
+        
+        Similarity is measured between query embeddings, so keyword retrieval,
+        which never calls the embedding model, does not use the response cache.
+        """
+        return self.response_cache is not None and self.search_mode != "keyword"
+    
+    def _prompt_cache_key(self, payload: Dict) -> Optional[str]:
+        """Prompt cache key of a generation request, or None if it may not be cached"""
+        if not self.prompt_cache_active:
+            return None
+        return PromptCache.key(payload['model'], payload['options'], payload['prompt'])
+    
+    def _cached_generation(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        response = self.prompt_cache.get(key)
+        if response is not None:
+            logger.info("Serving response for an identical prompt from the prompt cache")
+        return response
+    
+    def _remember_generation(self, key: Optional[str], response: str):
+        if key is not None and response:
+            self.prompt_cache.put(key, response, model=self.ollama_model)
+    
+    async def _acached_generation(self, key: Optional[str]) -> Optional[str]:
+        """_cached_generation on the executor; the prompt cache is SQLite"""
+        if key is None:
+            return None
+        return await self.run_blocking(self._cached_generation, key)
+    
+    async def _aremember_generation(self, key: Optional[str], response: str):
+        if key is not None and response:
+            await self.run_blocking(self._remember_generation, key, response)
+    
+    def generate_response(self, prompt: str, max_tokens: Optional[int] = None) -> str:
         """Generate response using Ollama"""
         try:
             url = f"{self.ollama_base_url}/api/generate"
-            
-            payload = {
-                "model": self.ollama_model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": self.temperature,
-                    "num_predict": max_tokens,  # Reduced for faster responses
-                    "num_ctx": 1024,  # Further reduced context window
-                    "top_k": 10,  # Further reduced sampling
-                    "top_p": 0.7,  # Even faster sampling
-                    "repeat_penalty": 1.05,  # Minimal repeat penalty
-                    "mirostat": 2,  # Enable mirostat for faster, more consistent responses
-                    "mirostat_tau": 3.0,  # Target entropy
-                    "mirostat_eta": 0.1  # Learning rate
-                }
-            }
+            payload = self._generate_payload(prompt, max_tokens)
+            cache_key = self._prompt_cache_key(payload)
+            cached = self._cached_generation(cache_key)
+            if cached is not None:
+                return cached
             
             logger.info("Generating response from Ollama...")
             response = requests.post(url, json=payload, timeout=30)  # Reduced timeout
             response.raise_for_status()
             
             result = response.json()
-            return result.get('response', '').strip()
+            answer = result.get('response', '').strip()
+            self._remember_generation(cache_key, answer)
+            return answer
             
         except requests.exceptions.Timeout:
             logger.error("Ollama request timed out")
-            return "I apologize, but the response is taking too long. Please try a shorter question."
+            return self.TIMEOUT_MESSAGE
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return self.ERROR_MESSAGE
+    
+    def stream_response(self, prompt: str, max_tokens: Optional[int] = None) -> Iterator[str]:
+        """Yield response fragments from Ollama as they are generated
+        
+        Ollama streams one JSON object per line. The timeout applies to the
+        connection and to the gap between lines, not to the whole generation.
+        Errors are raised to the caller. A prompt cache hit is yielded as a
+        single fragment; a stream is only cached once it has completed.
+        """
+        url = f"{self.ollama_base_url}/api/generate"
+        payload = self._generate_payload(prompt, max_tokens, stream=True)
+        cache_key = self._prompt_cache_key(payload)
+        cached = self._cached_generation(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        logger.info("Streaming response from Ollama...")
+        fragments = []
+        with requests.post(url, json=payload, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            # chunk_size=None hands over each chunk as it arrives instead of
+            # waiting for a full read buffer
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                if chunk.get('response'):
+                    fragments.append(chunk['response'])
+                    yield chunk['response']
+                if chunk.get('done'):
+                    self._remember_generation(cache_key, "".join(fragments).strip())
+                    break
+    
+    async def agenerate_response(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Async version of generate_response using the pooled client"""
+        try:
+            payload = self._generate_payload(prompt, max_tokens)
+            cache_key = self._prompt_cache_key(payload)
+            cached = await self._acached_generation(cache_key)
+            if cached is not None:
+                return cached
+            
+            logger.info("Generating response from Ollama...")
+            response = await self.client.post("/api/generate", json=payload)
+            response.raise_for_status()
+            
+            result = response.json()
+            answer = result.get('response', '').strip()
+            await self._aremember_generation(cache_key, answer)
+            return answer
+            
+        except httpx.TimeoutException:
+            logger.error("Ollama request timed out")
+            return self.TIMEOUT_MESSAGE
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return f"I apologize, but I encountered an error. Please try again."
+            return self.ERROR_MESSAGE
+    
+    async def astream_response(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Async version of stream_response using the pooled client"""
+        payload = self._generate_payload(prompt, max_tokens, stream=True)
+        cache_key = self._prompt_cache_key(payload)
+        cached = await self._acached_generation(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        logger.info("Streaming response from Ollama...")
+        fragments = []
+        async with self.client.stream("POST", "/api/generate", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                if chunk.get('response'):
+                    fragments.append(chunk['response'])
+                    yield chunk['response']
+                if chunk.get('done'):
+                    await self._aremember_generation(cache_key, "".join(fragments).strip())
+                    break
     
     def get_conversation_history(self, conversation_id: str) -> List[Dict]:
         """Get conversation history for a given ID"""
-        return self.conversations.get(conversation_id, [])
+        return self.conversations.get(conversation_id)
     
     def update_conversation_history(
         self,
@@ -170,27 +560,20 @@ Note: This response is based on general career knowledge. For specific candidate
         user_query: str,
         assistant_response: str
     ):
-        """Update conversation history"""
-        if conversation_id not in self.conversations:
-            self.conversations[conversation_id] = []
-        
-        self.conversations[conversation_id].extend([
+        """Update conversation history (the store keeps only the most recent messages)"""
+        self.conversations.append(conversation_id, [
             {"role": "user", "content": user_query},
             {"role": "assistant", "content": assistant_response}
         ])
-        
-        # Keep only last 10 messages (5 exchanges)
-        if len(self.conversations[conversation_id]) > 10:
-            self.conversations[conversation_id] = self.conversations[conversation_id][-10:]
     
-    def query(
+    def prepare_query(
         self,
         query: str,
         top_k: int = 5,
         conversation_id: Optional[str] = None
     ) -> Dict:
         """
-        Main query method - orchestrates the entire RAG pipeline
+        Retrieve context and build the prompt for a query, without generating
         
         Args:
             query: User query
@@ -198,12 +581,18 @@ Note: This response is based on general career knowledge. For specific candidate
             conversation_id: Optional conversation ID for context
             
         Returns:
-            Dictionary with response, sources, conversation_id, and mode (rag/llm)
+            Dictionary with prompt, prompt_usage, context, conversation_id,
+            use_rag, similarity_score and, on a response cache hit, the
+            cached answer under 'cached_response'
         """
         # Generate conversation ID if not provided
         if not conversation_id:
             conversation_id = str(uuid.uuid4())
         
+        # Read before retrieval, so an answer is never cached under a newer
+        # index version than the documents it was generated from
+        index_version = getattr(self.vector_db, 'index_version', None)
+        
         # Step 1: Retrieve relevant context
         context = self.retrieve_context(query, top_k=top_k)
         
@@ -226,9 +615,18 @@ Note: This response is based on general career knowledge. For specific candidate
         # Step 3: Get conversation history
         history = self.get_conversation_history(conversation_id)
         
-        # Step 4: Build prompt (with or without RAG)
+        # Answers depend on earlier turns, so only first questions are cached
+        cache_key = None
+        cached_response = None
+        if self.response_cache_active and not history:
+            cache_key = (self.vector_db.embed_query(query), context['ids'], index_version)
+            cached_response = self.response_cache.get(*cache_key)
+            if cached_response is not None:
+                logger.info("Serving cached answer for a similar question")
+        
+        # Step 4: Build prompt (with or without RAG) within the context budget
         if use_rag:
-            prompt = self.build_prompt(
+            prompt, prompt_usage = self.pack_prompt(
                 query=query,
                 context_docs=context['documents'],
                 context_metadata=context['metadatas'],
@@ -236,28 +634,292 @@ Note: This response is based on general career knowledge. For specific candidate
                 use_rag=True
             )
         else:
-            prompt = self.build_prompt(
+            prompt, prompt_usage = self.pack_prompt(
                 query=query,
                 context_docs=[],
                 context_metadata=[],
                 conversation_history=history,
                 use_rag=False
             )
+        logger.info(
+            f"Prompt uses {prompt_usage['prompt_tokens']}/{prompt_usage['budget']} tokens "
+            f"({prompt_usage['documents_included']} docs, {prompt_usage['documents_truncated']} truncated)"
+        )
         
-        # Step 5: Generate response with optimized token limit
-        response = self.generate_response(prompt, max_tokens=250)
-        
-        # Step 6: Update conversation history
-        self.update_conversation_history(conversation_id, query, response)
-        
-        # Return complete result
         return {
-            'response': response,
+            'prompt': prompt,
+            'prompt_usage': prompt_usage,
             'documents': context['documents'] if use_rag else [],
             'metadatas': context['metadatas'] if use_rag else [],
             'conversation_id': conversation_id,
             'mode': 'rag' if use_rag else 'llm',
-            'similarity_score': avg_similarity
+            'similarity_score': avg_similarity,
+            'cache_key': cache_key,
+            'cached_response': cached_response
+        }
+    
+    def _cache_response(self, prepared: Dict, response: str):
+        """Remember a generated answer for similar questions (never error replies)"""
+        if prepared['cache_key'] is None or not response:
+            return
+        if response in (self.TIMEOUT_MESSAGE, self.ERROR_MESSAGE):
+            return
+        embedding, doc_ids, index_version = prepared['cache_key']
+        self.response_cache.put(embedding, doc_ids, response, version=index_version)
+    
+    def _fragments(self, prepared: Dict) -> Iterator[str]:
+        """Streamed answer: the cached response in one piece, or Ollama's tokens"""
+        if prepared['cached_response'] is not None:
+            yield prepared['cached_response']
+        else:
+            yield from self.stream_response(prepared['prompt'])
+    
+    async def _afragments(self, prepared: Dict) -> AsyncIterator[str]:
+        """Async version of _fragments"""
+        if prepared['cached_response'] is not None:
+            yield prepared['cached_response']
+        else:
+            async for fragment in self.astream_response(prepared['prompt']):
+                yield fragment
+    
+    def _query_result(self, prepared: Dict, response: str) -> Dict:
+        """Result dictionary returned by query and aquery"""
+        return {
+            'response': response,
+            'documents': prepared['documents'],
+            'metadatas': prepared['metadatas'],
+            'conversation_id': prepared['conversation_id'],
+            'mode': prepared['mode'],
+            'similarity_score': prepared['similarity_score'],
+            'prompt_tokens': prepared['prompt_usage']['prompt_tokens'],
+            'prompt_usage': prepared['prompt_usage'],
+            'cached': prepared['cached_response'] is not None
+        }
+    
+    def _answer(self, query: str, top_k: int, conversation_id: str) -> Tuple[Dict, str]:
+        """Prepare a query and generate (or reuse a cached) response"""
+        prepared = self.prepare_query(query, top_k=top_k, conversation_id=conversation_id)
+        
+        # Step 5: Generate response with optimized token limit (unless a
+        # similar question was already answered from the same documents)
+        response = prepared['cached_response']
+        if response is None:
+            response = self.generate_response(prepared['prompt'])
+            self._cache_response(prepared, response)
+        
+        return prepared, response
+    
+    async def _aanswer(self, query: str, top_k: int, conversation_id: str) -> Tuple[Dict, str]:
+        """Async version of _answer"""
+        prepared = await self.run_blocking(self.prepare_query, query, top_k=top_k, conversation_id=conversation_id)
+        
+        response = prepared['cached_response']
+        if response is None:
+            response = await self.agenerate_response(prepared['prompt'])
+            self._cache_response(prepared, response)
+        
+        return prepared, response
+    
+    def _flight_key(self, query: str, top_k: int) -> Tuple:
+        """Key under which identical first questions are coalesced"""
+        return query, top_k, getattr(self.vector_db, 'index_version', None)
+    
+    def _finish_query(self, query: str, conversation_id: str, prepared: Dict, response: str) -> Dict:
+        """Record the exchange in the caller's conversation and build its result"""
+        # Step 6: Update conversation history
+        self.update_conversation_history(conversation_id, query, response)
+        
+        result = self._query_result(prepared, response)
+        result['conversation_id'] = conversation_id
+        return result
+    
+    def query(
+        self,
+        query: str,
+        top_k: int = 5,
+        conversation_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Main query method - orchestrates the entire RAG pipeline
+        
+        Concurrent calls asking the same question without conversation history
+        are coalesced: the first one retrieves and generates, the others wait
+        for its answer.
+        
+        Args:
+            query: User query
+            top_k: Number of documents to retrieve
+            conversation_id: Optional conversation ID for context
+            
+        Returns:
+            Dictionary with response, sources, conversation_id, and mode (rag/llm)
+        """
+        if not conversation_id:
+            conversation_id = str(uuid.uuid4())
+        
+        if self.get_conversation_history(conversation_id):
+            prepared, response = self._answer(query, top_k, conversation_id)
+        else:
+            prepared, response = self.query_flights.do(
+                self._flight_key(query, top_k),
+                lambda: self._answer(query, top_k, conversation_id)
+            )
+        
+        return self._finish_query(query, conversation_id, prepared, response)
+    
+    def query_stream(
+        self,
+        query: str,
+        top_k: int = 5,
+        conversation_id: Optional[str] = None
+    ) -> Iterator[Tuple[str, Dict]]:
+        """
+        Streaming variant of query
+        
+        Yields ('sources', ...) as soon as retrieval and prompt packing are
+        done, then one ('token', {'text': ...}) per generated fragment, and
+        finally ('done', ...) with the full response and timings. Conversation
+        history is only updated once generation has completed; a stream that
+        fails or is abandoned by the client leaves it unchanged.
+        
+        Args:
+            query: User query
+            top_k: Number of documents to retrieve
+            conversation_id: Optional conversation ID for context
+            
+        Yields:
+            (event, data) tuples; event is 'sources', 'token', 'error' or 'done'
+        """
+        started = time.perf_counter()
+        prepared = self.prepare_query(query, top_k=top_k, conversation_id=conversation_id)
+        
+        yield 'sources', {
+            'documents': prepared['documents'],
+            'metadatas': prepared['metadatas'],
+            'conversation_id': prepared['conversation_id'],
+            'mode': prepared['mode'],
+            'similarity_score': prepared['similarity_score'],
+            'prompt_tokens': prepared['prompt_usage']['prompt_tokens'],
+            'cached': prepared['cached_response'] is not None
+        }
+        
+        fragments = []
+        first_token_seconds = None
+        try:
+            for fragment in self._fragments(prepared):
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - started
+                    logger.info(f"First token after {first_token_seconds:.3f}s")
+                fragments.append(fragment)
+                yield 'token', {'text': fragment}
+        except requests.exceptions.Timeout:
+            logger.error("Ollama stream timed out")
+            yield 'error', {'message': self.TIMEOUT_MESSAGE}
+            return
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            yield 'error', {'message': self.ERROR_MESSAGE}
+            return
+        
+        response = "".join(fragments).strip()
+        if prepared['cached_response'] is None:
+            self._cache_response(prepared, response)
+        self.update_conversation_history(prepared['conversation_id'], query, response)
+        
+        yield 'done', {
+            'response': response,
+            'conversation_id': prepared['conversation_id'],
+            'time_to_first_token': None if first_token_seconds is None else round(first_token_seconds, 3),
+            'total_seconds': round(time.perf_counter() - started, 3),
+            'cached': prepared['cached_response'] is not None
+        }
+
+    async def aquery(
+        self,
+        query: str,
+        top_k: int = 5,
+        conversation_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Async version of query
+        
+        Retrieval, prompt packing and conversation/prompt cache access run on
+        the executor and generation awaits the pooled HTTP client, so the
+        event loop is never blocked. Identical
+        first questions are coalesced as in query.
+        
+        Args:
+            query: User query
+            top_k: Number of documents to retrieve
+            conversation_id: Optional conversation ID for context
+            
+        Returns:
+            Same dictionary as query
+        """
+        if not conversation_id:
+            conversation_id = str(uuid.uuid4())
+        
+        # The conversation store may be SQLite with a busy timeout, so its
+        # reads and writes run on the executor as well
+        if await self.run_blocking(self.get_conversation_history, conversation_id):
+            prepared, response = await self._aanswer(query, top_k, conversation_id)
+        else:
+            prepared, response = await self.aquery_flights.do(
+                self._flight_key(query, top_k),
+                lambda: self._aanswer(query, top_k, conversation_id)
+            )
+        
+        return await self.run_blocking(self._finish_query, query, conversation_id, prepared, response)
+    
+    async def aquery_stream(
+        self,
+        query: str,
+        top_k: int = 5,
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Async version of query_stream; yields the same (event, data) tuples"""
+        started = time.perf_counter()
+        prepared = await self.run_blocking(self.prepare_query, query, top_k=top_k, conversation_id=conversation_id)
+        
+        yield 'sources', {
+            'documents': prepared['documents'],
+            'metadatas': prepared['metadatas'],
+            'conversation_id': prepared['conversation_id'],
+            'mode': prepared['mode'],
+            'similarity_score': prepared['similarity_score'],
+            'prompt_tokens': prepared['prompt_usage']['prompt_tokens'],
+            'cached': prepared['cached_response'] is not None
+        }
+        
+        fragments = []
+        first_token_seconds = None
+        try:
+            async for fragment in self._afragments(prepared):
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - started
+                    logger.info(f"First token after {first_token_seconds:.3f}s")
+                fragments.append(fragment)
+                yield 'token', {'text': fragment}
+        except httpx.TimeoutException:
+            logger.error("Ollama stream timed out")
+            yield 'error', {'message': self.TIMEOUT_MESSAGE}
+            return
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            yield 'error', {'message': self.ERROR_MESSAGE}
+            return
+        
+        response = "".join(fragments).strip()
+        if prepared['cached_response'] is None:
+            self._cache_response(prepared, response)
+        await self.run_blocking(self.update_conversation_history, prepared['conversation_id'], query, response)
+        
+        yield 'done', {
+            'response': response,
+            'conversation_id': prepared['conversation_id'],
+            'time_to_first_token': None if first_token_seconds is None else round(first_token_seconds, 3),
+            'total_seconds': round(time.perf_counter() - started, 3),
+            'cached': prepared['cached_response'] is not None
         }
 
 def test_rag_pipeline():
@@ -272,7 +934,7 @@ def test_rag_pipeline():
     )
     
     # Check if DB has data
-    db_count = vector_db.collection.count()
+    db_count = vector_db.count()
     print(f"Vector DB contains {db_count} CV/resume records")
     
     if db_count == 0:
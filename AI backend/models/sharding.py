@@ -0,0 +1,542 @@
+"""
+Sector-sharded vector index with query-time routing.
+
+ShardedBackend keeps one child index (a Chroma collection or NumPy index)
+per candidate Sector and implements the regular IndexBackend interface, so
+VectorDatabase can use it in place of a single collection. Writes go to the
+shard of each record's `sector_key`; reads without routing fan out to all
+shards and merge by distance.
+
+ShardRouter picks the shards a query should search, in this order:
+
+    filter    the `where` clause pins a sector_key
+    keyword   query terms match words from sector names (or configured keywords)
+    centroid  the query embedding is clearly closest to one shard's centroid
+    fanout    the router is unsure; search several/all shards and merge
+
+Routing decisions, per-shard query counts and (optionally) sampled recall
+against a full fan-out are reported by ShardedBackend.shard_report().
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bm25_index import tokenize
+from index_backends import IndexBackend, create_backend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UNKNOWN_SHARD = "unknown"
+
+# Chroma rejects collection names longer than this
+MAX_COLLECTION_NAME = 63
+
+# Words too common across sector names to say anything about a query's sector
+GENERIC_SECTOR_WORDS = {
+    "engineer", "engineering", "manager", "management", "developer", "development",
+    "analyst", "specialist", "executive", "officer", "senior", "junior", "lead",
+    "associate", "consultant", "assistant", "and", "of"
+}
+
+
+def shard_key(metadata: Optional[Dict]) -> str:
+    """Shard a record belongs to, from its normalized sector"""
+    return (metadata or {}).get("sector_key") or UNKNOWN_SHARD
+
+
+def sector_from_where(where: Optional[Dict]) -> Optional[str]:
+    """sector_key pinned by an equality condition in a `where` clause, if any"""
+    if not where:
+        return None
+    for key, condition in where.items():
+        if key == "sector_key":
+            if isinstance(condition, dict):
+                return condition.get("$eq")
+            return condition
+        if key == "$and":
+            for clause in condition:
+                sector = sector_from_where(clause)
+                if sector is not None:
+                    return sector
+    return None
+
+
+class ShardRouter:
+    """Chooses the shards to search for a query and keeps routing metrics"""
+
+    def __init__(
+        self,
+        margin: float = 0.05,
+        min_similarity: float = 0.2,
+        fanout: Optional[int] = None,
+        audit_rate: float = 0.0,
+        keywords: Optional[Dict[str, List[str]]] = None
+    ):
+        """
+        Args:
+            margin: Minimum similarity gap between the best and second-best
+                centroid for a confident single-shard route
+            min_similarity: Minimum cosine similarity to the best centroid
+            fanout: Number of closest shards searched when unsure (None = all)
+            audit_rate: Fraction of routed queries re-run against all shards
+                to measure routing recall
+            keywords: Extra routing keywords per sector_key
+        """
+        self.margin = margin
+        self.min_similarity = min_similarity
+        self.fanout = fanout
+        self.audit_rate = audit_rate
+        self.keywords = {key: set(tokenize(" ".join(words))) for key, words in (keywords or {}).items()}
+
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.decisions: Counter = Counter()
+        self.shard_hits: Counter = Counter()
+        self.shards_searched = 0
+        self.audits = 0
+        self.audit_recall_total = 0.0
+
+    def shard_keywords(self, key: str, name: str) -> set:
+        """Routing terms for a shard: words of its sector name plus configured keywords"""
+        terms = {term for term in tokenize(name) if term not in GENERIC_SECTOR_WORDS}
+        return terms | self.keywords.get(key, set())
+
+    def route(
+        self,
+        query: str,
+        query_embedding: Optional[np.ndarray],
+        shards: Dict[str, Dict],
+        where: Optional[Dict] = None
+    ) -> Tuple[List[str], str]:
+        """Pick shards for a query
+
+        Args:
+            query: Query text
+            query_embedding: Query vector (needed for centroid routing)
+            shards: sector_key -> shard info with 'name' and 'centroid'
+            where: Metadata filter of the query
+
+        Returns:
+            (shard keys, reason) where reason is filter/keyword/centroid/fanout
+        """
+        keys = sorted(shards)
+
+        pinned = sector_from_where(where)
+        if pinned is not None:
+            return self._record([pinned] if pinned in shards else [], "filter")
+
+        if len(keys) <= 1:
+            return self._record(keys, "fanout")
+
+        terms = set(tokenize(query))
+        matches = {key: len(terms & self.shard_keywords(key, info["name"])) for key, info in shards.items()}
+        best_match = max(matches.values())
+        if best_match > 0:
+            return self._record(sorted(key for key, n in matches.items() if n == best_match), "keyword")
+
+        ranked = keys
+        candidates = [key for key in keys if shards[key].get("centroid") is not None]
+        if query_embedding is not None and candidates:
+            centroids = np.asarray([shards[key]["centroid"] for key in candidates], dtype=np.float32)
+            query_vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+            query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+            similarities = centroids @ query_vector
+            order = np.argsort(-similarities)
+            ranked = [candidates[i] for i in order] + [key for key in keys if key not in candidates]
+
+            best = similarities[order[0]]
+            second = similarities[order[1]] if len(order) > 1 else -1.0
+            if best >= self.min_similarity and best - second >= self.margin:
+                return self._record([candidates[order[0]]], "centroid")
+
+        return self._record(ranked[:self.fanout] if self.fanout else ranked, "fanout")
+
+    def _record(self, keys: List[str], reason: str) -> Tuple[List[str], str]:
+        with self._lock:
+            self.queries += 1
+            self.decisions[reason] += 1
+            self.shards_searched += len(keys)
+            self.shard_hits.update(keys)
+        return keys, reason
+
+    def record_audit(self, recall: float):
+        with self._lock:
+            self.audits += 1
+            self.audit_recall_total += recall
+
+    def report(self) -> Dict:
+        """Routing decision counts, per-shard hits and audited recall"""
+        with self._lock:
+            routed = self.queries - self.decisions["fanout"]
+            return {
+                "queries": self.queries,
+                "decisions": dict(self.decisions),
+                "routed_rate": round(routed / self.queries, 4) if self.queries else 0.0,
+                "avg_shards_per_query": round(self.shards_searched / self.queries, 2) if self.queries else 0.0,
+                "shard_hits": dict(self.shard_hits),
+                "audits": self.audits,
+                "audit_recall": round(self.audit_recall_total / self.audits, 4) if self.audits else None
+            }
+
+
+class ShardedBackend(IndexBackend):
+    """One child index per sector behind the IndexBackend interface"""
+
+    def __init__(
+        self,
+        persist_directory: str,
+        collection_name: str,
+        backend: str = "chroma",
+        router: Optional[ShardRouter] = None,
+        centroid_sample: int = 2000,
+        query_workers: int = 4,
+        **options
+    ):
+        super().__init__(persist_directory, collection_name)
+        self.child_backend = backend
+        self.child_options = options
+        self.router = router or ShardRouter()
+        self.centroid_sample = centroid_sample
+        self.query_workers = query_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.map_path = self.persist_directory / f"shards_{collection_name}.json"
+
+        self._lock = threading.RLock()
+        self._shards: Dict[str, IndexBackend] = {}
+        self._info: Dict[str, Dict] = {}
+        self._owner: Dict[str, str] = {}
+        self._stale_centroids = set()
+
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Shard bookkeeping
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        if not self.map_path.exists():
+            return
+
+        with open(self.map_path, "r", encoding="utf-8") as f:
+            shards = json.load(f).get("shards", {})
+
+        for key, info in shards.items():
+            self._info[key] = info
+            self._shards[key] = create_backend(
+                self.child_backend, str(self.persist_directory), info["collection"], **self.child_options
+            )
+            for doc_id in self._shards[key].get(include=[])["ids"]:
+                self._owner[doc_id] = key
+
+        logger.info(f"Loaded {len(self._shards)} shards of '{self.collection_name}' with {len(self._owner)} documents")
+
+    def _save(self):
+        self.map_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.map_path.with_suffix(self.map_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"collection": self.collection_name, "shards": self._info}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.map_path)
+
+    def _collection_for(self, key: str) -> str:
+        slug = re.sub(r"[^a-z0-9]+", "-", key.lower()).strip("-")[:48] or UNKNOWN_SHARD
+
+        # Versioned parent names leave less room; keep room for a "-NN" suffix
+        budget = MAX_COLLECTION_NAME - len(self.collection_name) - len("__") - len("-99")
+        if len(slug) > budget:
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+            slug = f"{slug[:max(budget - len(digest) - 1, 0)].strip('-')}-{digest}".lstrip("-")
+
+        name = f"{self.collection_name}__{slug}"
+        taken = {info["collection"] for info in self._info.values()}
+        suffix = 2
+        while name in taken:
+            name = f"{self.collection_name}__{slug}-{suffix}"
+            suffix += 1
+        return name
+
+    def _shard(self, key: str, name: Optional[str] = None) -> IndexBackend:
+        if key not in self._shards:
+            collection = self._collection_for(key)
+            logger.info(f"Creating shard '{collection}' for sector '{name or key}'")
+            self._info[key] = {"name": name or key, "collection": collection, "centroid": None}
+            self._shards[key] = create_backend(
+                self.child_backend, str(self.persist_directory), collection, **self.child_options
+            )
+        return self._shards[key]
+
+    def _refresh_centroids(self):
+        """Recompute centroids of shards written to since they were last computed"""
+        with self._lock:
+            for key in list(self._stale_centroids):
+                shard = self._shards.get(key)
+                if shard is None or shard.count() == 0:
+                    if key in self._info:
+                        self._info[key]["centroid"] = None
+                    continue
+                sample = np.asarray(
+                    shard.get(limit=self.centroid_sample, include=["embeddings"])["embeddings"],
+                    dtype=np.float32
+                )
+                sample /= np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+                centroid = sample.mean(axis=0)
+                self._info[key]["centroid"] = (centroid / (np.linalg.norm(centroid) or 1.0)).tolist()
+            self._stale_centroids.clear()
+
+    # ------------------------------------------------------------------
+    # IndexBackend interface
+    # ------------------------------------------------------------------
+
+    def _write(self, method: str, ids, embeddings, documents, metadatas):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        with self._lock:
+            groups: Dict[str, List[int]] = {}
+            for i, metadata in enumerate(metadatas):
+                groups.setdefault(shard_key(metadata), []).append(i)
+
+            # Records whose sector changed move to their new shard
+            moved: Dict[str, List[str]] = {}
+            for key, rows in groups.items():
+                for i in rows:
+                    owner = self._owner.get(ids[i])
+                    if owner is not None and owner != key:
+                        moved.setdefault(owner, []).append(ids[i])
+            for owner, moved_ids in moved.items():
+                self._shards[owner].delete(ids=moved_ids)
+                self._stale_centroids.add(owner)
+
+            for key, rows in groups.items():
+                shard = self._shard(key, (metadatas[rows[0]] or {}).get("Sector"))
+                getattr(shard, method)(
+                    ids=[ids[i] for i in rows],
+                    embeddings=embeddings[rows],
+                    documents=[documents[i] for i in rows],
+                    metadatas=[metadatas[i] for i in rows]
+                )
+                for i in rows:
+                    self._owner[ids[i]] = key
+                self._stale_centroids.add(key)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self._write("add", ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._write("upsert", ids, embeddings, documents, metadatas)
+
+    def delete(self, ids):
+        with self._lock:
+            groups: Dict[str, List[str]] = {}
+            for doc_id in ids:
+                owner = self._owner.pop(doc_id, None)
+                if owner is not None:
+                    groups.setdefault(owner, []).append(doc_id)
+            for key, shard_ids in groups.items():
+                self._shards[key].delete(ids=shard_ids)
+                self._stale_centroids.add(key)
+
+    @staticmethod
+    def _merge_get(results: List[Dict], include: List[str]) -> Dict:
+        merged = {"ids": []}
+        for field in ("documents", "metadatas", "embeddings"):
+            merged[field] = [] if field in include else None
+        for result in results:
+            merged["ids"].extend(result["ids"])
+            for field in ("documents", "metadatas", "embeddings"):
+                if field in include and result.get(field) is not None:
+                    merged[field].extend(list(result[field]))
+        return merged
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        include = ["documents", "metadatas"] if include is None else include
+
+        with self._lock:
+            if ids is not None:
+                groups: Dict[str, List[str]] = {}
+                for doc_id in ids:
+                    if doc_id in self._owner:
+                        groups.setdefault(self._owner[doc_id], []).append(doc_id)
+                results = [self._shards[key].get(ids=shard_ids, where=where, include=include)
+                           for key, shard_ids in groups.items()]
+                merged = self._merge_get(results, include)
+                start = offset or 0
+                end = start + limit if limit is not None else None
+                return {field: (values[start:end] if values is not None else None) for field, values in merged.items()}
+
+            pinned = sector_from_where(where)
+            keys = [pinned] if pinned is not None else sorted(self._shards)
+            keys = [key for key in keys if key in self._shards]
+
+            # Page through the shards in a fixed order
+            skip = offset or 0
+            remaining = limit
+            results = []
+            for key in keys:
+                if remaining is not None and remaining <= 0:
+                    break
+                shard = self._shards[key]
+                if where is None:
+                    size = shard.count()
+                    if skip >= size:
+                        skip -= size
+                        continue
+                    result = shard.get(limit=remaining, offset=skip, include=include)
+                    skip = 0
+                else:
+                    result = shard.get(where=where, include=include)
+                    n = len(result["ids"])
+                    if skip >= n:
+                        skip -= n
+                        continue
+                    end = skip + remaining if remaining is not None else None
+                    result = {field: (list(values)[skip:end] if values is not None else None)
+                              for field, values in result.items() if field in ("ids", *include)}
+                    skip = 0
+                results.append(result)
+                if remaining is not None:
+                    remaining -= len(result["ids"])
+
+            return self._merge_get(results, include)
+
+    def query(self, query_embeddings, n_results=5, where=None, include=None, shards=None):
+        """Query the given shards (default: all, or the one pinned by `where`) and merge by distance"""
+        include = ["documents", "metadatas", "distances"] if include is None else include
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        fields = ("ids", "documents", "metadatas", "embeddings", "distances")
+
+        # Decide which shards to search under the lock, query them outside it
+        with self._lock:
+            if shards is None:
+                pinned = sector_from_where(where)
+                shards = [pinned] if pinned is not None else sorted(self._shards)
+            targets = [self._shards[key] for key in shards if key in self._shards]
+
+        child_include = sorted(set(include) | {"distances"})
+
+        def query_shard(shard):
+            size = shard.count()
+            if size == 0:
+                return None
+            return shard.query(
+                query_embeddings=queries,
+                n_results=min(n_results, size),
+                where=where,
+                include=child_include
+            )
+
+        if len(targets) > 1 and self.query_workers > 1:
+            per_shard = list(self._query_executor().map(query_shard, targets))
+        else:
+            per_shard = [query_shard(shard) for shard in targets]
+        per_shard = [result for result in per_shard if result is not None]
+
+        batched = {field: [] for field in fields}
+        for q in range(len(queries)):
+            candidates = []
+            for result in per_shard:
+                for j, distance in enumerate(result["distances"][q]):
+                    candidates.append((float(distance), result, j))
+            candidates.sort(key=lambda candidate: candidate[0])
+            top = candidates[:n_results]
+
+            batched["ids"].append([result["ids"][q][j] for _, result, j in top])
+            batched["distances"].append([distance for distance, _, _ in top])
+            for field in ("documents", "metadatas", "embeddings"):
+                if field in include:
+                    batched[field].append([result[field][q][j] for _, result, j in top])
+
+        for field in ("documents", "metadatas", "embeddings", "distances"):
+            if field not in include:
+                batched[field] = None
+        return batched
+
+    def _query_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.query_workers, thread_name_prefix="shard-query")
+            return self._executor
+
+    def routed_query(self, query: str, query_embeddings, n_results=5, where=None, include=None) -> Dict:
+        """Route a single query to the relevant shards, then search only those
+
+        With the router's audit_rate, a sample of routed queries is also run
+        against all shards to measure how many of the true top results the
+        routed search found.
+        """
+        if len(self._info) > 1:
+            self._refresh_centroids()
+        query_embedding = np.asarray(query_embeddings, dtype=np.float32)[0]
+
+        with self._lock:
+            shard_info = {key: dict(info) for key, info in self._info.items()}
+        keys, reason = self.router.route(query, query_embedding, shard_info, where)
+        results = self.query(query_embeddings, n_results=n_results, where=where, include=include, shards=keys)
+
+        if reason in ("keyword", "centroid") and self.router.audit_rate and random.random() < self.router.audit_rate:
+            full_ids = self.query(query_embeddings, n_results=n_results, where=where, include=[])["ids"][0]
+            if full_ids:
+                found = len(set(full_ids) & set(results["ids"][0]))
+                self.router.record_audit(found / len(full_ids))
+
+        return results
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(shard.count() for shard in self._shards.values())
+
+    def reset(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.reset()
+                shard.flush()
+            self._shards, self._info, self._owner = {}, {}, {}
+            self._stale_centroids.clear()
+            self._save()
+
+    def drop(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.drop()
+            self._shards, self._info, self._owner = {}, {}, {}
+            self.map_path.unlink(missing_ok=True)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def flush(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.flush()
+            self._refresh_centroids()
+            self._save()
+
+    def memory_footprint(self) -> Dict:
+        """Bytes used by each shard (NumPy child backends only)"""
+        with self._lock:
+            footprint = {
+                self._info[key]["collection"]: shard.memory_footprint()["total"]
+                for key, shard in self._shards.items()
+                if hasattr(shard, "memory_footprint")
+            }
+        footprint["total"] = sum(footprint.values())
+        return footprint
+
+    def shard_report(self) -> Dict:
+        """Shard sizes and routing metrics"""
+        with self._lock:
+            shards = {
+                key: {"sector": info["name"], "collection": info["collection"], "documents": self._shards[key].count()}
+                for key, info in sorted(self._info.items())
+            }
+        return {"shards": shards, "routing": self.router.report()}
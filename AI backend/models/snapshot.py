@@ -0,0 +1,233 @@
+"""
+Versioned snapshots of a vector database collection.
+
+A snapshot is a directory containing:
+
+    vectors.npy    float32 embedding matrix, one row per document
+    records.json   IDs, documents and metadata stored column by column, plus
+                   the IDs of merged near-duplicates and their stored copies
+    manifest.json  format version, embedding model, dimension, row count and
+                   SHA-256 checksums of the files above
+
+Importing a snapshot loads the stored vectors directly, so a new node can
+serve queries without re-embedding the corpus. Run this module to export or
+import from the command line:
+
+    python snapshot.py export ../data/snapshots/cv_qa-2024-06-01
+    python snapshot.py import ../data/snapshots/cv_qa-2024-06-01
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "jobconnect-vector-snapshot"
+SNAPSHOT_VERSION = 1
+
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.json"
+MANIFEST_FILE = "manifest.json"
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt or incompatible"""
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def to_columns(metadatas: List[Dict]) -> Dict[str, List]:
+    """Turn a list of metadata dicts into one value list per key (None where missing)"""
+    keys = sorted({key for metadata in metadatas for key in (metadata or {})})
+    return {key: [(metadata or {}).get(key) for metadata in metadatas] for key in keys}
+
+
+def from_columns(columns: Dict[str, List], n_rows: int) -> List[Dict]:
+    """Inverse of to_columns; missing (None) values are left out"""
+    metadatas = [{} for _ in range(n_rows)]
+    for key, values in columns.items():
+        for metadata, value in zip(metadatas, values):
+            if value is not None:
+                metadata[key] = value
+    return metadatas
+
+
+def write_snapshot(
+    path: str,
+    pages: Iterator[Dict],
+    n_rows: int,
+    dimension: int,
+    info: Dict,
+    aliases: Optional[Dict[str, str]] = None
+) -> Dict:
+    """Write a snapshot from pages of backend records
+
+    Vectors are written straight into a memory-mapped .npy file page by page;
+    IDs, documents and metadata are collected and stored as columns.
+
+    Args:
+        path: Snapshot directory (created; existing snapshot files are replaced)
+        pages: Dicts with 'ids', 'documents', 'metadatas' and 'embeddings'
+        n_rows: Total number of records the pages contain
+        dimension: Embedding dimension
+        info: Extra manifest fields (collection name, embedding model, ...)
+        aliases: Merged duplicate ID -> stored document ID
+
+    Returns:
+        The written manifest
+    """
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Write into temporary names and rename at the end, so an interrupted
+    # export never leaves a valid-looking snapshot behind
+    (directory / MANIFEST_FILE).unlink(missing_ok=True)
+    vectors_tmp = directory / (VECTORS_FILE + ".tmp")
+    vectors = np.lib.format.open_memmap(vectors_tmp, mode="w+", dtype=np.float32, shape=(n_rows, dimension))
+
+    ids, documents, metadatas = [], [], []
+    row = 0
+    for page in pages:
+        page_vectors = np.asarray(page["embeddings"], dtype=np.float32).reshape(-1, dimension)
+        if row + len(page_vectors) > n_rows:
+            raise SnapshotError("Collection grew while the snapshot was being written")
+        vectors[row:row + len(page_vectors)] = page_vectors
+        row += len(page_vectors)
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+
+    if row != n_rows:
+        raise SnapshotError(f"Expected {n_rows} records but read {row}; collection changed during export")
+    vectors.flush()
+    del vectors
+    os.replace(vectors_tmp, directory / VECTORS_FILE)
+
+    records_tmp = directory / (RECORDS_FILE + ".tmp")
+    with open(records_tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "ids": ids,
+            "documents": documents,
+            "metadata": to_columns(metadatas),
+            "aliases": aliases or {}
+        }, f, ensure_ascii=False)
+    os.replace(records_tmp, directory / RECORDS_FILE)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "format_version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "count": n_rows,
+        "dimension": dimension,
+        "dtype": "float32",
+        **info,
+        "files": {
+            name: {"sha256": file_sha256(directory / name), "bytes": (directory / name).stat().st_size}
+            for name in (VECTORS_FILE, RECORDS_FILE)
+        }
+    }
+    with open(directory / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def read_manifest(path: str) -> Dict:
+    """Load and validate a snapshot manifest"""
+    manifest_path = Path(path) / MANIFEST_FILE
+    if not manifest_path.exists():
+        raise SnapshotError(f"No snapshot manifest found at {manifest_path}")
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"{path} is not a vector database snapshot")
+    if manifest.get("format_version", 0) > SNAPSHOT_VERSION:
+        raise SnapshotError(
+            f"Snapshot format version {manifest['format_version']} is newer than supported ({SNAPSHOT_VERSION})"
+        )
+    return manifest
+
+
+def read_snapshot(
+    path: str,
+    verify: bool = True
+) -> Tuple[Dict, np.ndarray, List[str], List[str], List[Dict], Dict[str, str]]:
+    """Load a snapshot
+
+    Args:
+        path: Snapshot directory
+        verify: Check file checksums against the manifest
+
+    Returns:
+        (manifest, vectors, ids, documents, metadatas, aliases); vectors are
+        memory-mapped, aliases map merged duplicate IDs to stored documents
+    """
+    directory = Path(path)
+    manifest = read_manifest(path)
+
+    if verify:
+        for name, expected in manifest["files"].items():
+            if file_sha256(directory / name) != expected["sha256"]:
+                raise SnapshotError(f"Checksum mismatch for {name}; snapshot is corrupt")
+
+    vectors = np.load(directory / VECTORS_FILE, mmap_mode="r")
+    with open(directory / RECORDS_FILE, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    ids = records["ids"]
+    if vectors.shape != (manifest["count"], manifest["dimension"]) or len(ids) != manifest["count"]:
+        raise SnapshotError("Snapshot contents do not match the manifest")
+
+    metadatas = from_columns(records["metadata"], len(ids))
+    return manifest, vectors, ids, records["documents"], metadatas, records.get("aliases", {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import vector database snapshots")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot directory")
+    parser.add_argument("--db", default="../data/vectordb", help="Vector database directory")
+    parser.add_argument("--collection", default="cv_qa")
+    parser.add_argument("--backend", default=os.getenv("VECTOR_DB_BACKEND", "chroma"))
+    parser.add_argument("--embedding-model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--embedding-backend", default=os.getenv("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--force", action="store_true", help="Import even if the embedding model or backend differs")
+    args = parser.parse_args()
+
+    from vector_database import VectorDatabase
+
+    db = VectorDatabase(
+        persist_directory=args.db,
+        embedding_model=args.embedding_model,
+        collection_name=args.collection,
+        backend=args.backend,
+        embedding_backend=args.embedding_backend
+    )
+
+    if args.action == "export":
+        manifest = db.export_snapshot(args.path)
+    else:
+        manifest = db.import_snapshot(args.path, force=args.force)
+
+    print(f"{args.action}ed {manifest['count']} documents ({manifest['dimension']} dims) at {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Unit tests for the in-process caches and request coalescing helpers.
+"""
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from cache_utils import AsyncSingleFlight, LRUCache, SemanticCache, SingleFlight
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_lru_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=4, ttl_seconds=10)
+    cache.put("a", 1)
+
+    now[0] += 5
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_semantic_cache_matches_similar_embeddings_with_same_documents():
+    cache = SemanticCache(threshold=0.9)
+    cache.put([1.0, 0.0], ["doc_1", "doc_2"], "answer", version=1)
+
+    assert cache.get([0.99, 0.05], ["doc_2", "doc_1"], version=1) == "answer"
+    assert cache.get([0.99, 0.05], ["doc_3"], version=1) is None
+    assert cache.get([0.0, 1.0], ["doc_1", "doc_2"], version=1) is None
+    assert cache.get_stats()["doc_mismatches"] == 1
+
+
+def test_semantic_cache_drops_entries_when_index_version_changes():
+    cache = SemanticCache(threshold=0.9)
+    cache.put(np.array([1.0, 0.0]), ["doc_1"], "answer", version=1)
+
+    assert cache.get([1.0, 0.0], ["doc_1"], version=2) is None
+    # A value computed against the old version is not stored
+    cache.put([1.0, 0.0], ["doc_1"], "stale", version=1)
+    assert len(cache) == 0
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"value": 42}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("key", work))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while flights.coalesced < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 4
+    assert flights.in_flight() == 0
+
+
+def test_single_flight_shares_exceptions_and_forgets_failed_calls():
+    flights = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flights.do("key", fail)
+    assert flights.do("key", lambda: "ok") == "ok"
+
+
+def test_async_single_flight_coalesces_coroutines():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["done"] * 5
+    assert len(calls) == 1
+    assert flights.get_stats()["coalesced"] == 4
@@ -0,0 +1,52 @@
+"""
+Unit tests for the incrementally maintained collection statistics.
+"""
+
+from collection_stats import CollectionStats, length_bucket
+
+
+def metadata(sector, source="CV Dataset", instruction_length=50, response_length=300):
+    return {
+        "Sector": sector,
+        "source": source,
+        "instruction_length": instruction_length,
+        "response_length": response_length
+    }
+
+
+def test_length_buckets():
+    assert length_bucket(0) == "0-99"
+    assert length_bucket(100) == "100-249"
+    assert length_bucket(10000) == "10000+"
+
+
+def test_add_replace_and_remove_keep_counts_exact(tmp_path):
+    stats = CollectionStats(str(tmp_path / "stats.json"))
+    first, second = metadata("Finance"), metadata("Data Science", response_length=1200)
+    stats.add(first)
+    stats.add(second)
+
+    moved = metadata("Web Development", response_length=1200)
+    stats.add(moved, previous=second)
+    stats.remove(first)
+
+    report = stats.to_dict()
+    assert report["total_documents"] == 1
+    assert report["sectors"] == {"Web Development": 1}
+    assert report["avg_response_length"] == 1200
+    assert report["length_histograms"]["response_length"]["1000-1999"] == 1
+    assert sum(report["length_histograms"]["response_length"].values()) == 1
+
+
+def test_stats_persist_and_rebuild_keeps_build_info(tmp_path):
+    stats = CollectionStats(str(tmp_path / "stats.json"))
+    stats.add(metadata("Finance"))
+    stats.record_build({"processed": 1, "added": 1, "timings": {}})
+    stats.save()
+
+    reloaded = CollectionStats(str(tmp_path / "stats.json"))
+    assert reloaded.to_dict() == stats.to_dict()
+
+    reloaded.rebuild([metadata("Finance"), metadata("Finance", source="legal")])
+    assert reloaded.to_dict()["sources"] == {"CV Dataset": 1, "legal": 1}
+    assert reloaded.last_build == {"processed": 1, "added": 1}
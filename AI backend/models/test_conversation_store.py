@@ -0,0 +1,84 @@
+"""
+Unit tests for the in-memory and SQLite conversation stores.
+"""
+
+import time
+
+import pytest
+
+from conversation_store import SqliteConversationStore, create_conversation_store
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path, monkeypatch):
+    # Prune on every append so eviction is visible immediately
+    monkeypatch.setattr(SqliteConversationStore, "PRUNE_INTERVAL", 1)
+    stores = []
+
+    def make(**options):
+        store = create_conversation_store(request.param, path=str(tmp_path / "conversations.sqlite3"), **options)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def exchange(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": f"re: {text}"}]
+
+
+def test_only_the_last_messages_are_kept(make_store):
+    store = make_store(max_messages=3)
+    store.append("c1", exchange("first"))
+    store.append("c1", exchange("second"))
+
+    assert [message["content"] for message in store.get("c1")] == ["re: first", "second", "re: second"]
+
+
+def test_least_recently_updated_conversation_is_evicted(make_store, clock):
+    store = make_store(max_conversations=2)
+    for conversation_id in ("a", "b"):
+        store.append(conversation_id, exchange(conversation_id))
+        clock[0] += 1
+    store.append("a", exchange("again"))
+    clock[0] += 1
+    store.append("c", exchange("c"))
+
+    assert store.get("b") == []
+    assert store.get("a") and store.get("c")
+    assert store.get_stats()["evictions"] == 1
+
+
+def test_idle_conversations_expire(make_store, clock):
+    store = make_store(ttl_seconds=60)
+    store.append("old", exchange("old"))
+    clock[0] += 30
+    store.append("recent", exchange("recent"))
+    clock[0] += 45
+
+    assert store.get("old") == []
+    assert store.get("recent")
+    assert store.active_count() == 1
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "conversations.sqlite3")
+    first, second = SqliteConversationStore(path), SqliteConversationStore(path)
+    try:
+        first.append("c1", exchange("from worker 1"))
+        second.append("c1", exchange("from worker 2"))
+
+        assert len(first.get("c1")) == 4
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,52 @@
+"""
+Unit tests for the persistent embedding cache.
+"""
+
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+
+def vectors(n, dimension=4):
+    return np.arange(n * dimension, dtype=np.float32).reshape(n, dimension)
+
+
+def test_round_trip_and_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_entries=10)
+    cache.put_many(["alpha", "beta"], vectors(2))
+    cache.flush()
+
+    assert np.array_equal(cache.get_many(["alpha"])[0], vectors(2)[0])
+    assert cache.get_many(["gamma"]) == [None]
+
+    del cache
+    reopened = EmbeddingCache(str(tmp_path), "model", max_entries=10)
+    assert np.array_equal(reopened.get_many(["beta"])[0], vectors(2)[1])
+
+
+def test_row_with_a_different_stored_key_is_a_miss(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_entries=10)
+    cache.put_many(["alpha"], vectors(1))
+
+    # Simulate another writer having reused the row for a different text
+    row = cache._rows[cache.key("alpha")]
+    cache._keys[row] = np.frombuffer(cache.key("other"), dtype=np.uint8)
+
+    assert cache.get_many(["alpha"]) == [None]
+    assert cache.get_stats()["misses"] == 1
+
+
+@pytest.mark.skipif(embedding_cache.fcntl is None, reason="needs fcntl advisory locks")
+def test_second_instance_is_read_only(tmp_path):
+    writer = EmbeddingCache(str(tmp_path), "model", max_entries=10)
+    writer.put_many(["alpha"], vectors(1))
+    writer.flush()
+
+    reader = EmbeddingCache(str(tmp_path), "model", max_entries=10)
+    reader.put_many(["beta"], vectors(1))
+
+    assert reader.read_only and not writer.read_only
+    assert np.array_equal(reader.get_many(["alpha"])[0], vectors(1)[0])
+    assert reader.get_many(["beta"]) == [None]
@@ -0,0 +1,69 @@
+"""
+Unit tests for encoder helpers and the process-sharded EncoderPool.
+
+Worker processes are replaced by threads and the model by the fake encoder
+from conftest.py, so no model is downloaded or spawned.
+"""
+
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import encoders
+from encoders import EncoderPool, cache_model_key
+from vector_database import cv_to_qa
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """ProcessPoolExecutor stand-in that runs the worker initializer in threads"""
+
+    started = 0
+
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        ThreadPool.started += 1
+
+
+@pytest.fixture
+def thread_pool(monkeypatch, encoder):
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", ThreadPool)
+    monkeypatch.setattr(encoders, "load_encoder", lambda *args, **kwargs: encoder)
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        monkeypatch.setenv(variable, "1")
+
+
+def test_cache_model_key_separates_quantized_vectors():
+    assert cache_model_key("model", "torch") == cache_model_key("model", "onnx") == "model"
+    assert cache_model_key("model", "onnx-int8") == "model@onnx-int8"
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_pool_encodes_shards_in_input_order(thread_pool, encoder, workers):
+    texts = [f"candidate {i} knows python and sql" * (i % 3 + 1) for i in range(7)]
+
+    with EncoderPool("model", workers=workers, threads_per_worker=1) as pool:
+        encoded = pool.encode(texts)
+
+    assert pool.backend == "torch"
+    assert np.allclose(encoded, encoder.encode(texts))
+
+
+def test_add_documents_with_workers_matches_in_process_encoding(thread_pool, make_db):
+    records = [
+        cv_to_qa(i, {"Name": f"Dev {i}", "Sector": "Data Science", "Skills": "Python", "Experience": f"project {i}"})
+        for i in range(5)
+    ]
+    serial = make_db()
+    serial.add_documents(records, queue_size=0)
+    parallel = make_db(name="parallel")
+    pools = ThreadPool.started
+    summary = parallel.add_documents(records, queue_size=0, workers=2)
+
+    assert ThreadPool.started == pools + 1
+    assert summary["timings"]["encoder_workers"] == 2
+    assert np.allclose(
+        parallel.backend.get(include=["embeddings"])["embeddings"],
+        serial.backend.get(include=["embeddings"])["embeddings"]
+    )
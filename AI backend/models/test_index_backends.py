@@ -0,0 +1,81 @@
+"""
+Unit tests for the NumPy index backend.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from index_backends import NumpyBackend
+from quantization import load_index_vectors
+
+
+def make_backend(tmp_path, n=20, dimension=8, **options):
+    backend = NumpyBackend(str(tmp_path), "test", **options)
+    rng = np.random.default_rng(0)
+    backend.add(
+        ids=[f"doc_{i}" for i in range(n)],
+        embeddings=rng.normal(size=(n, dimension)).astype(np.float32),
+        documents=[f"document {i}" for i in range(n)],
+        metadatas=[{"parity": "even" if i % 2 == 0 else "odd"} for i in range(n)]
+    )
+    return backend
+
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "int8"])
+def test_query_finds_exact_vector_and_applies_filter(tmp_path, storage):
+    backend = make_backend(tmp_path, storage=storage)
+    target = backend.get(ids=["doc_4"], include=["embeddings"])["embeddings"][0]
+
+    results = backend.query([target], n_results=3, where={"parity": "even"})
+
+    assert results["ids"][0][0] == "doc_4"
+    assert all(metadata["parity"] == "even" for metadata in results["metadatas"][0])
+
+
+def test_snapshot_is_unaffected_by_later_writes(tmp_path):
+    backend = make_backend(tmp_path)
+    with backend._lock:
+        view = backend._view()
+    vectors_before = np.array(view.arrays["vectors"][:view.size])
+    ids_before = list(view.ids[:view.size])
+
+    backend.upsert(ids=["doc_0"], embeddings=np.ones((1, 8)), documents=["changed"], metadatas=[{}])
+    backend.delete(ids=["doc_1", "doc_2"])
+
+    assert np.array_equal(view.arrays["vectors"][:view.size], vectors_before)
+    assert list(view.ids[:view.size]) == ids_before
+    assert backend.count() == 18
+    assert backend.get(ids=["doc_0"])["documents"] == ["changed"]
+
+
+def test_concurrent_queries_match_serial_results(tmp_path):
+    backend = make_backend(tmp_path, n=200)
+    queries = np.random.default_rng(1).normal(size=(16, 8)).astype(np.float32)
+
+    serial = [backend.query([query], n_results=5, include=[])["ids"][0] for query in queries]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        parallel = list(executor.map(lambda q: backend.query([q], n_results=5, include=[])["ids"][0], queries))
+
+    assert parallel == serial
+
+
+def test_flush_and_reload(tmp_path):
+    backend = make_backend(tmp_path, storage="int8")
+    backend.flush()
+
+    reloaded = NumpyBackend(str(tmp_path), "test", storage="int8")
+    assert reloaded.count() == 20
+    assert reloaded.get(ids=["doc_3"])["documents"] == ["document 3"]
+
+
+def test_quantization_report_decodes_int8_index_with_scales(tmp_path):
+    backend = make_backend(tmp_path, storage="int8", rescore=False)
+    backend.flush()
+    original = backend.get(include=["embeddings"])["embeddings"]
+
+    vectors, exact = load_index_vectors(backend.directory)
+
+    assert not exact
+    assert np.allclose(vectors, np.asarray(original), atol=1e-6)
@@ -0,0 +1,171 @@
+"""
+Unit tests for the FastAPI endpoints.
+
+The app is exercised without its startup event: each test installs a small
+NumPy-backed database from the `make_db` fixture (conftest.py).
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from rag_pipeline import RAGPipeline
+from vector_database import cv_to_qa
+
+
+@pytest.fixture
+def client(monkeypatch, make_db):
+    db = make_db()
+    monkeypatch.setattr(main, "vector_database", db)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("reset", [False, True])
+def test_build_db_reports_a_missing_data_file_as_not_found(client, reset):
+    response = client.post("/api/build-db", json={"filename": "no_such_file.json", "reset": reset})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No data found to load"
+    assert main.vector_database.list_versions()["history"] == []
+
+
+def test_format_search_results_returns_skills_as_a_list():
+    results = {
+        "documents": [["cv text", "legal answer"]],
+        "metadatas": [[{"id": 1, "skills": "python, machine learning"}, {"id": 2}]],
+        "distances": [[0.1, 0.4]]
+    }
+
+    documents = main.format_search_results(results)
+
+    assert documents[0]["skills"] == ["python", "machine learning"]
+    assert documents[1]["skills"] == []
+
+
+def test_search_endpoint_returns_skills_as_a_list(client):
+    main.vector_database.add_documents([
+        cv_to_qa(0, {"Name": "Asha", "Sector": "Data Science", "Skills": "Python, SQL"}),
+    ], queue_size=0)
+
+    response = client.post("/api/search", params={"query": "python", "skill": "sql"})
+
+    assert response.status_code == 200
+    assert [result["skills"] for result in response.json()["results"]] == [["python", "sql"]]
+
+
+def assert_off_event_loop(fn):
+    def wrapper(*args, **kwargs):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def test_health_and_document_lookups_run_off_the_event_loop(client, monkeypatch):
+    db = main.vector_database
+    db.add_documents([cv_to_qa(0, {"Name": "Asha", "Sector": "Data Science", "Skills": "Python"})], queue_size=0)
+    monkeypatch.setattr(db, "count", assert_off_event_loop(db.count))
+    monkeypatch.setattr(db, "get_documents", assert_off_event_loop(db.get_documents))
+
+    health = client.get("/api/health")
+    document = client.get("/api/doc/1")
+
+    assert health.status_code == 200 and health.json()["vector_database_count"] == 1
+    assert document.status_code == 200 and document.json()["id"] == "qa_1"
+    assert client.get("/api/doc/42").status_code == 404
+
+
+def test_batch_search_keeps_http_errors_and_applies_the_mode(client, monkeypatch):
+    main.vector_database.add_documents([
+        cv_to_qa(0, {"Name": "Asha", "Sector": "Data Science", "Skills": "Python", "Experience": "pandas models"}),
+        cv_to_qa(1, {"Name": "Kabir", "Sector": "Finance", "Skills": "Excel", "Experience": "budgets audits"}),
+    ], queue_size=0)
+
+    response = client.post("/api/search/batch", json={"queries": ["budgets", "pandas"], "top_k": 1, "mode": "keyword"})
+    assert response.status_code == 200
+    assert [search["results"][0]["id"] for search in response.json()["searches"]] == ["2", "1"]
+
+    monkeypatch.setattr(main, "vector_database", None)
+    response = client.post("/api/search/batch", json={"queries": ["budgets"]})
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Vector database not initialized"
+
+
+def test_startup_reports_phase_timings_and_warms_up(monkeypatch, tmp_path, encoder):
+    for name, value in {
+        "VECTOR_DB_PATH": str(tmp_path / "vectordb"),
+        "VECTOR_DB_BACKEND": "numpy",
+        "EMBEDDING_CACHE_SIZE": "0",
+        "PROMPT_CACHE_SIZE": "0",
+        "CONVERSATION_STORE": "memory",
+        "STARTUP_WARMUP": "true"
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("VECTOR_DB_SNAPSHOT", raising=False)
+    # The startup event replaces these globals; restore them afterwards
+    for name in ("vector_database", "rag_pipeline", "blocking_executor"):
+        monkeypatch.setattr(main, name, None)
+    monkeypatch.setattr(main, "startup_report", {"phases": {}})
+
+    with TestClient(main.app) as client:
+        report = client.get("/api/startup").json()
+
+    assert {"vector_database", "tokenizer", "rag_pipeline", "warmup"} <= set(report["phases"])
+    assert set(report["warmup"]) == {"encoder_wait", "encode", "query"}
+    assert "encoder" in report["vector_database"] and report["total_seconds"] >= 0
+    assert encoder.calls == 1  # Only the warm-up encode
+
+
+def sse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def streaming_pipeline(client, monkeypatch):
+    main.vector_database.add_documents([
+        cv_to_qa(0, {"Name": "Asha", "Sector": "Data Science", "Skills": "Python", "Experience": "python pandas"}),
+    ], queue_size=0)
+    # Always answer from the retrieved documents
+    pipeline = RAGPipeline(vector_database=main.vector_database, relevance_threshold=float("-inf"))
+    pipeline.fragments = ["Asha ", "knows ", "python."]
+
+    async def astream_response(prompt, max_tokens=None):
+        for fragment in pipeline.fragments:
+            if isinstance(fragment, Exception):
+                raise fragment
+            yield fragment
+
+    pipeline.astream_response = astream_response
+    monkeypatch.setattr(main, "rag_pipeline", pipeline)
+    return pipeline
+
+
+def test_chat_stream_sends_sources_then_tokens_then_done(client, streaming_pipeline):
+    response = client.post("/api/chat/stream", json={"query": "who knows python?", "conversation_id": "c1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == ["sources", "token", "token", "token", "done"]
+    assert events[0][1]["sources"][0]["title"] == "Asha"
+    assert "".join(data["text"] for event, data in events if event == "token") == "Asha knows python."
+    assert events[-1][1]["response"] == "Asha knows python." and events[-1][1]["conversation_id"] == "c1"
+    assert len(streaming_pipeline.get_conversation_history("c1")) == 2
+
+
+def test_chat_stream_failure_sends_error_and_keeps_history(client, streaming_pipeline):
+    streaming_pipeline.fragments = ["Asha ", RuntimeError("connection reset")]
+
+    response = client.post("/api/chat/stream", json={"query": "who knows python?", "conversation_id": "c2"})
+
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == ["sources", "token", "error"]
+    assert events[-1][1]["message"] == RAGPipeline.ERROR_MESSAGE
+    assert streaming_pipeline.get_conversation_history("c2") == []
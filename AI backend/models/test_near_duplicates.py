@@ -0,0 +1,42 @@
+"""
+Unit tests for the MinHash/LSH near-duplicate index.
+"""
+
+from near_duplicates import NearDuplicateIndex
+
+CV_TEXT = (
+    "Asha is a data scientist with five years of experience building machine learning "
+    "models in python, deploying them on cloud platforms and mentoring junior analysts"
+)
+
+
+def test_reuploads_join_the_first_documents_cluster(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "minhash.npz"))
+
+    assert index.assign("qa_1", CV_TEXT) == ("qa_1", None)
+    assert index.assign("qa_2", CV_TEXT + " references available") == ("qa_1", "qa_1")
+    assert index.assign("qa_3", "Kabir is an accountant who prepares budgets and audits ledgers") == ("qa_3", None)
+
+    stats = index.get_stats()
+    assert (stats["documents"], stats["clusters"], stats["duplicates"]) == (3, 2, 1)
+
+
+def test_cluster_count_follows_removals_reassignments_and_reloads(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "minhash.npz"))
+    index.assign("qa_1", CV_TEXT)
+    index.assign("qa_2", CV_TEXT)
+    index.assign("qa_3", "Kabir is an accountant who prepares budgets and audits ledgers")
+
+    index.remove("qa_1")
+    assert index.get_stats()["clusters"] == 2  # qa_2 keeps the cluster it joined
+    index.assign("qa_2", "Meera builds web applications with django and react")
+    assert index.get_stats()["clusters"] == 2
+    index.remove("qa_missing")
+    assert index.get_stats()["clusters"] == 2
+
+    index.save()
+    reloaded = NearDuplicateIndex(str(tmp_path / "minhash.npz"))
+    assert reloaded.get_stats() == index.get_stats()
+
+    index.clear()
+    assert index.get_stats()["clusters"] == 0
@@ -0,0 +1,86 @@
+"""
+Unit tests for the exact prompt cache and its temperature gate in RAGPipeline.
+"""
+
+import pytest
+
+import rag_pipeline
+from prompt_cache import PromptCache
+from rag_pipeline import RAGPipeline
+
+
+def test_responses_survive_a_restart_through_sqlite(tmp_path):
+    cache = PromptCache(path=str(tmp_path / "prompts.sqlite3"), max_entries=2)
+    key = PromptCache.key("qwen", {"temperature": 0}, "prompt")
+    cache.put(key, "answer", model="qwen")
+    cache.close()
+
+    reopened = PromptCache(path=str(tmp_path / "prompts.sqlite3"), max_entries=2)
+    assert reopened.get(key) == "answer"
+    assert reopened.get_stats()["disk_hits"] == 1
+
+
+def test_key_depends_on_model_options_and_prompt():
+    key = PromptCache.key("qwen", {"temperature": 0}, "prompt")
+
+    assert key == PromptCache.key("qwen", {"temperature": 0}, "prompt")
+    assert key != PromptCache.key("llama", {"temperature": 0}, "prompt")
+    assert key != PromptCache.key("qwen", {"temperature": 0.7}, "prompt")
+    assert key != PromptCache.key("qwen", {"temperature": 0}, "prompt ")
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"response": self.text}
+
+
+@pytest.fixture
+def ollama_calls(monkeypatch):
+    calls = []
+
+    def post(url, json=None, timeout=None):
+        calls.append(json)
+        return FakeResponse(f"generation {len(calls)}")
+
+    monkeypatch.setattr(rag_pipeline.requests, "post", post)
+    return calls
+
+
+@pytest.mark.parametrize("temperature, nondeterministic, generations", [
+    (0.0, False, 1),  # Greedy decoding: an identical prompt gives the same answer
+    (0.7, False, 2),  # Sampled answers are not reused by default
+    (0.7, True, 1),   # ...unless explicitly allowed
+])
+def test_prompt_cache_is_only_used_when_output_is_deterministic_or_allowed(
+    ollama_calls, temperature, nondeterministic, generations
+):
+    pipeline = RAGPipeline(
+        vector_database=None,
+        temperature=temperature,
+        prompt_cache=PromptCache(),
+        cache_nondeterministic=nondeterministic,
+        response_cache_size=0
+    )
+
+    answers = [pipeline.generate_response("same prompt") for _ in range(2)]
+
+    assert len(ollama_calls) == generations
+    assert pipeline.prompt_cache_active == (generations == 1)
+    assert answers[0] == "generation 1"
+
+
+def test_error_replies_are_not_cached(monkeypatch):
+    def post(url, json=None, timeout=None):
+        raise ConnectionError("ollama is down")
+
+    monkeypatch.setattr(rag_pipeline.requests, "post", post)
+    pipeline = RAGPipeline(vector_database=None, temperature=0, prompt_cache=PromptCache(), response_cache_size=0)
+
+    assert pipeline.generate_response("prompt") == RAGPipeline.ERROR_MESSAGE
+    assert len(pipeline.prompt_cache.memory) == 0
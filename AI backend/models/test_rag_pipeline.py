@@ -0,0 +1,184 @@
+"""
+Unit tests for RAGPipeline with generation stubbed out.
+
+Retrieval runs against a NumPy-backed database from the `make_db` fixture
+(conftest.py), so neither Ollama nor an embedding model is needed.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rag_pipeline import RAGPipeline
+from vector_database import cv_to_qa
+
+RECORDS = [
+    cv_to_qa(0, {"Name": "Asha", "Sector": "Data Science", "Skills": "Python, SQL", "Experience": "python pandas models"}),
+    cv_to_qa(1, {"Name": "Kabir", "Sector": "Finance", "Skills": "Excel", "Experience": "budgets audits ledgers"}),
+]
+
+
+@pytest.fixture
+def make_pipeline(make_db):
+    def make(**options):
+        db = make_db()
+        db.add_documents(RECORDS, queue_size=0)
+        pipeline = RAGPipeline(vector_database=db, relevance_threshold=0.0, **options)
+        pipeline.generations = []
+
+        def generate_response(prompt, max_tokens=None):
+            pipeline.generations.append(prompt)
+            return f"answer {len(pipeline.generations)}"
+
+        pipeline.generate_response = generate_response
+        return pipeline
+    return make
+
+
+def test_vector_mode_reuses_answers_for_repeated_questions(make_pipeline):
+    pipeline = make_pipeline()
+
+    first = pipeline.query("who knows python pandas?", top_k=1)
+    second = pipeline.query("who knows  python pandas?", top_k=1)
+
+    assert second["cached"] and second["response"] == first["response"]
+    assert len(pipeline.generations) == 1
+
+
+def test_keyword_mode_never_calls_the_embedding_model(make_pipeline, encoder):
+    pipeline = make_pipeline(search_mode="keyword")
+    calls = encoder.calls
+
+    pipeline.query("who knows python pandas?", top_k=1)
+    pipeline.query("who knows python pandas?", top_k=1)
+
+    assert encoder.calls == calls
+    assert not pipeline.response_cache_active
+    assert len(pipeline.response_cache) == 0
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_identical_first_questions_share_one_generation(make_pipeline):
+    pipeline = make_pipeline(response_cache_size=0)
+    generate = pipeline.generate_response
+    release = threading.Event()
+
+    def blocking_generate(prompt, max_tokens=None):
+        release.wait(5)
+        return generate(prompt, max_tokens)
+
+    pipeline.generate_response = blocking_generate
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(pipeline.query, "who knows python?", 1) for _ in range(4)]
+        wait_for(lambda: pipeline.query_flights.coalesced == 3)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(pipeline.generations) == 1
+    assert {result["response"] for result in results} == {"answer 1"}
+    # Each caller still gets its own conversation
+    conversation_ids = {result["conversation_id"] for result in results}
+    assert len(conversation_ids) == 4
+    assert all(len(pipeline.get_conversation_history(cid)) == 2 for cid in conversation_ids)
+
+
+def test_identical_first_questions_share_one_async_generation(make_pipeline):
+    pipeline = make_pipeline(response_cache_size=0)
+
+    async def agenerate_response(prompt, max_tokens=None):
+        # Hold the first generation until the other callers are waiting on it
+        while pipeline.aquery_flights.coalesced < 3:
+            await asyncio.sleep(0.01)
+        pipeline.generations.append(prompt)
+        return "async answer"
+
+    pipeline.agenerate_response = agenerate_response
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(*(pipeline.aquery("who knows python?", top_k=1) for _ in range(4))), 5
+        )
+
+    results = asyncio.run(main())
+
+    assert len(pipeline.generations) == 1
+    assert [result["response"] for result in results] == ["async answer"] * 4
+    assert len({result["conversation_id"] for result in results}) == 4
+    assert pipeline.aquery_flights.get_stats()["executions"] == 1
+
+
+def test_client_of_a_previous_event_loop_is_closed_when_replaced(make_pipeline):
+    pipeline = make_pipeline()
+
+    async def current_client():
+        return pipeline.client
+
+    # Old loop still running in another thread
+    running = asyncio.new_event_loop()
+    thread = threading.Thread(target=running.run_forever)
+    thread.start()
+    old = asyncio.run_coroutine_threadsafe(current_client(), running).result(5)
+    new = asyncio.run(current_client())
+    wait_for(lambda: old.is_closed)
+    running.call_soon_threadsafe(running.stop)
+    thread.join(5)
+    running.close()
+    assert old.is_closed and new is not old
+
+    # Old loop stopped but not closed
+    stopped = asyncio.new_event_loop()
+    old = stopped.run_until_complete(current_client())
+    asyncio.run(current_client())
+    stopped.close()
+    assert old.is_closed
+
+
+def packing_pipeline(num_ctx=1024, max_tokens=250):
+    return RAGPipeline(vector_database=None, num_ctx=num_ctx, max_tokens=max_tokens, response_cache_size=0)
+
+
+def test_pack_prompt_truncates_documents_to_fit_the_budget():
+    pipeline = packing_pipeline()
+    docs = [f"candidate {i} " + "python sql " * 400 for i in range(3)]
+    metadatas = [{"Name": f"Dev {i}", "Sector": "Data Science", "id": str(i)} for i in range(3)]
+
+    prompt, usage = pipeline.pack_prompt("who knows python?", docs, metadatas)
+
+    assert usage["prompt_tokens"] <= usage["budget"] == 1024 - 250 - pipeline.PROMPT_SAFETY_TOKENS
+    # Long profiles are cut so that every document still gets a share
+    assert usage["documents_included"] == 3 and usage["documents_truncated"] == 3
+    assert all(f"candidate {i}" in prompt for i in range(3))
+    assert prompt.endswith("User: who knows python?\nAssistant: ")
+
+
+def test_pack_prompt_keeps_short_context_whole_and_limits_history():
+    pipeline = packing_pipeline()
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "detail " * 200}
+        for i in range(6)
+    ]
+
+    prompt, usage = pipeline.pack_prompt("and sql?", ["short profile"], [{"Name": "Asha"}], history)
+
+    assert usage["documents_truncated"] == 0 and "short profile" in prompt
+    assert usage["history_messages"] <= pipeline.MAX_HISTORY_MESSAGES
+    assert "message 5" in prompt and "message 0" not in prompt
+    remaining = usage["budget"] - usage["sections"]["system"] - usage["sections"]["query"]
+    assert usage["sections"]["history"] <= remaining * pipeline.HISTORY_SHARE
+
+
+def test_pack_prompt_cuts_an_over_long_query():
+    pipeline = packing_pipeline(num_ctx=600, max_tokens=100)
+
+    prompt, usage = pipeline.pack_prompt("python " * 1000, ["profile"], [{"Name": "Asha"}])
+
+    assert usage["prompt_tokens"] <= usage["budget"]
+    assert usage["sections"]["query"] <= usage["budget"] // 2 + 10
@@ -0,0 +1,54 @@
+"""
+Unit tests for the sector-sharded backend on NumPy child indexes.
+"""
+
+import numpy as np
+
+from sharding import MAX_COLLECTION_NAME, ShardedBackend
+
+
+def add_records(backend, sectors, per_sector=5, dimension=8):
+    rng = np.random.default_rng(0)
+    ids, metadatas = [], []
+    for sector in sectors:
+        for i in range(per_sector):
+            ids.append(f"{sector}_{i}")
+            metadatas.append({"Sector": sector, "sector_key": sector.lower()})
+    backend.add(
+        ids=ids,
+        embeddings=rng.normal(size=(len(ids), dimension)).astype(np.float32),
+        documents=[f"document {doc_id}" for doc_id in ids],
+        metadatas=metadatas
+    )
+
+
+def test_fanout_query_merges_all_shards_by_distance(tmp_path):
+    backend = ShardedBackend(str(tmp_path), "cv_qa", backend="numpy")
+    add_records(backend, ["Finance", "Data Science", "Web Development"])
+    target = backend.get(ids=["Finance_3"], include=["embeddings"])["embeddings"][0]
+
+    results = backend.query([target], n_results=4)
+
+    assert results["ids"][0][0] == "Finance_3"
+    assert results["distances"][0] == sorted(results["distances"][0])
+    assert len(results["ids"][0]) == 4
+
+
+def test_filtered_query_only_searches_pinned_shard(tmp_path):
+    backend = ShardedBackend(str(tmp_path), "cv_qa", backend="numpy")
+    add_records(backend, ["Finance", "Data Science"])
+
+    results = backend.query(np.zeros((1, 8)), n_results=10, where={"sector_key": "finance"})
+
+    assert sorted(results["ids"][0]) == [f"Finance_{i}" for i in range(5)]
+
+
+def test_shard_collection_names_fit_chroma_limit(tmp_path):
+    parent = "cv_qa__20261016120000-2"
+    backend = ShardedBackend(str(tmp_path), parent, backend="numpy")
+    sector = "Senior Enterprise Software Architecture and Cloud Infrastructure Lead"
+    add_records(backend, [sector, sector + " II"], per_sector=1)
+
+    names = [info["collection"] for info in backend._info.values()]
+    assert len(set(names)) == 2
+    assert all(len(name) <= MAX_COLLECTION_NAME and name.startswith(parent + "__") for name in names)
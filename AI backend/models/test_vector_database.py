@@ -0,0 +1,387 @@
+"""
+Unit tests for VectorDatabase on the NumPy backend.
+
+The `make_db` fixture (conftest.py) replaces the embedding model with a
+deterministic bag-of-words hasher, so these tests need neither
+sentence-transformers, Chroma nor Ollama.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import vector_database
+from vector_database import VectorDatabase
+
+
+def cv(idx, name, sector, skills, extra=""):
+    return vector_database.cv_to_qa(idx, {
+        "Name": name,
+        "Sector": sector,
+        "Skills": skills,
+        "Experience": f"{name} works in {sector}. {extra}"
+    })
+
+
+CVS = [
+    cv(0, "Asha", "Data Science", "Python, SQL, Machine Learning", "python pandas models"),
+    cv(1, "Ravi", "Data Science", "R, Statistics", "regression python notebooks"),
+    cv(2, "Meera", "Web Development", "JavaScript, Python", "python django react"),
+    cv(3, "Kabir", "Finance", "Excel, Accounting", "budgets audits ledgers"),
+]
+
+
+def ids_of(results):
+    return results["ids"][0]
+
+
+def test_skill_filter_matches_only_documents_with_that_skill(make_db):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+
+    results = db.search("python developer", n_results=10, filter_dict=db.build_filters(skill="Python"))
+
+    assert set(ids_of(results)) == {"qa_1", "qa_3"}
+
+
+def test_skill_filter_is_identical_on_chroma_and_numpy(make_db):
+    pytest.importorskip("chromadb")
+    filters = VectorDatabase.build_filters(sector="data science", skill="python")
+
+    found = {}
+    for backend in ("numpy", "chroma"):
+        db = make_db(backend)
+        db.add_documents(CVS, queue_size=0)
+        found[backend] = ids_of(db.search("python", n_results=10, filter_dict=filters))
+
+    assert found["numpy"] == found["chroma"] == ["qa_1"]
+
+
+def test_snapshot_round_trip_keeps_vectors_and_merge_aliases(make_db, tmp_path, encoder):
+    source = make_db()
+    duplicate = dict(CVS[0], id=99)
+    source.add_documents(CVS + [duplicate], queue_size=0, duplicates="merge")
+    assert source.duplicate_index.merged_into("qa_99") == "qa_1"
+    source.export_snapshot(str(tmp_path / "snapshot"))
+
+    target = VectorDatabase(
+        persist_directory=str(tmp_path / "target" / "vectordb"),
+        collection_name="cv_qa",
+        backend="numpy",
+        embedding_cache_size=0
+    )
+    calls = encoder.calls
+    target.import_snapshot(str(tmp_path / "snapshot"))
+
+    assert encoder.calls == calls  # Nothing was re-embedded
+    assert target.count() == len(CVS)
+    assert target.get_documents(["qa_99"])["ids"] == ["qa_1"]
+    assert ids_of(target.search("python pandas", n_results=2)) == ids_of(source.search("python pandas", n_results=2))
+
+
+def test_snapshot_import_rejects_a_different_encoder(make_db, tmp_path):
+    source = make_db()
+    source.add_documents(CVS, queue_size=0)
+    source.export_snapshot(str(tmp_path / "snapshot"))
+
+    target = VectorDatabase(
+        persist_directory=str(tmp_path / "target" / "vectordb"),
+        collection_name="cv_qa",
+        backend="numpy",
+        embedding_backend="onnx-int8",
+        embedding_cache_size=0
+    )
+    with pytest.raises(vector_database.SnapshotError):
+        target.import_snapshot(str(tmp_path / "snapshot"))
+    assert target.count() == 0
+
+    target.import_snapshot(str(tmp_path / "snapshot"), force=True)
+    assert target.count() == len(CVS)
+
+
+def test_switching_encoder_backend_re_embeds_everything(make_db):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+    assert db.add_documents(CVS, queue_size=0)["unchanged"] == len(CVS)
+
+    switched = make_db(embedding_backend="onnx-int8")
+    summary = switched.add_documents(CVS, queue_size=0)
+
+    assert summary["updated"] == len(CVS) and summary["unchanged"] == 0
+
+
+def test_encoder_fallback_to_torch_keys_vectors_as_torch(make_db, encoder, monkeypatch, tmp_path):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+
+    # The int8 ONNX encoder cannot be loaded, so loading falls back to torch
+    monkeypatch.setattr(vector_database, "resolve_encoder", lambda *args, **kwargs: (encoder, "torch"))
+    fallback = make_db(embedding_backend="onnx-int8", embedding_cache_size=16)
+
+    assert fallback.embedding_backend == "torch"
+    assert fallback.encoder_key == db.encoder_key
+    assert fallback.encoder_key != vector_database.cache_model_key(fallback.embedding_model_name, "onnx-int8")
+    assert fallback.embedding_cache.model_name == fallback.encoder_key
+    # Stored torch vectors are still current, so nothing is re-embedded
+    assert fallback.add_documents(CVS, queue_size=0)["unchanged"] == len(CVS)
+    assert fallback.get_stats()["embedding_backend"] == "torch"
+    assert fallback.export_snapshot(str(tmp_path / "snapshot"))["embedding_backend"] == "torch"
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1 << 16])
+def test_iter_json_records_streams_arrays_across_chunk_boundaries(tmp_path, chunk_size):
+    records = [{"id": i, "text": "x" * (i * 5), "nested": {"items": list(range(i))}} for i in range(30)]
+    path = tmp_path / "records.json"
+    path.write_text(" \n[\n" + ",\n  ".join(json.dumps(record) for record in records) + "\n]\n", encoding="utf-8")
+
+    assert list(vector_database.iter_json_records(path, chunk_size=chunk_size)) == records
+
+
+def test_iter_json_records_rejects_truncated_arrays(tmp_path):
+    path = tmp_path / "records.json"
+    path.write_text('[{"id": 1}, {"id": 2', encoding="utf-8")
+
+    with pytest.raises(json.JSONDecodeError):
+        list(vector_database.iter_json_records(path, chunk_size=4))
+
+
+def test_incremental_sync_only_embeds_new_and_changed_records(make_db, encoder):
+    db = make_db()
+    first = db.add_documents(CVS, queue_size=0)
+    assert (first["added"], first["updated"], first["unchanged"]) == (4, 0, 0)
+
+    calls = encoder.calls
+    again = db.add_documents(CVS, queue_size=0)
+    assert (again["added"], again["updated"], again["unchanged"]) == (0, 0, 4)
+    assert encoder.calls == calls
+
+    changed = [dict(CVS[0], Response=CVS[0]["Response"] + " Also knows Spark."), *CVS[1:]]
+    summary = db.add_documents(changed, queue_size=0)
+    assert (summary["added"], summary["updated"], summary["unchanged"]) == (0, 1, 3)
+    assert "Spark" in db.get_documents(["qa_1"])["documents"][0]
+
+
+def test_prune_deletes_only_when_requested(make_db):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+
+    db.add_documents(CVS[:2], queue_size=0)
+    assert db.count() == 4
+
+    summary = db.add_documents(CVS[:2], queue_size=0, prune=True)
+    assert summary["deleted"] == 2
+    assert db.count() == 2
+    assert len(db.lexical_index) == 2 and len(db.stats) == 2
+
+
+def test_prune_is_skipped_for_an_empty_source(make_db):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+
+    summary = db.add_documents([], queue_size=0, prune=True)
+
+    assert summary["deleted"] == 0 and db.count() == 4
+
+
+def test_repeated_queries_reuse_the_cached_embedding(make_db, encoder):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+
+    calls = encoder.calls
+    db.search("python  developer", n_results=2)
+    db.search(" python developer ", n_results=2)
+    db.search_many(["python developer", "finance", "finance"], n_results=2)
+
+    # One encode for the first query and one batch for the only new query
+    assert encoder.calls == calls + 2
+    assert db.query_cache.get_stats()["entries"] == 2
+
+
+@pytest.mark.parametrize("mode", ["keyword", "hybrid"])
+def test_filtered_lexical_search_ranks_within_the_filter(make_db, mode):
+    # Many strong "python" matches outside the filtered sector, one weak one inside
+    records = [cv(i, f"Dev {i}", "Web Development", "Python", "python " * 5) for i in range(30)]
+    records.append(cv(30, "Kabir", "Finance", "Excel", "automates reports with python"))
+    db = make_db()
+    db.add_documents(records, queue_size=0)
+
+    results = db.search("python", n_results=3, mode=mode, filter_dict=db.build_filters(sector="Finance"))
+
+    assert ids_of(results) == ["qa_31"]
+
+
+def test_rebuild_swaps_in_a_new_version_and_rollback_restores_it(make_db):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+    original = db.active_collection
+
+    summary = db.rebuild(CVS[:3], queue_size=0)
+    assert summary["previous_collection"] == original
+    assert db.active_collection != original
+    assert db.count() == 3
+    assert db.list_versions()["history"] == [original]
+
+    db.rollback()
+    assert db.active_collection == original
+    assert db.count() == 4
+
+
+def test_failed_rebuild_keeps_the_live_version(make_db):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+    original = db.active_collection
+
+    with pytest.raises(ValueError):
+        db.rebuild(CVS, min_documents=10, queue_size=0)
+
+    assert db.active_collection == original
+    assert db.count() == 4
+
+
+def test_identical_concurrent_searches_share_one_execution(make_db, monkeypatch):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+    backend_query = db.backend.query
+    release = threading.Event()
+    executions = []
+
+    def blocking_query(*args, **kwargs):
+        executions.append(1)
+        release.wait(5)
+        return backend_query(*args, **kwargs)
+
+    monkeypatch.setattr(db.backend, "query", blocking_query)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(db.search, "python", n_results=2) for _ in range(8)]
+        # Hold the first execution until the other seven are waiting on it
+        deadline = time.monotonic() + 5
+        while db.search_flights.coalesced < 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [ids_of(future.result()) for future in futures]
+
+    assert len(executions) == 1
+    assert results == [results[0]] * 8
+    stats = db.search_flights.get_stats()
+    assert (stats["executions"], stats["coalesced"]) == (1, 7)
+
+
+def test_dedupe_collapses_tagged_near_duplicates(make_db):
+    db = make_db()
+    duplicate = dict(CVS[0], id=99)
+    summary = db.add_documents(CVS + [duplicate], queue_size=0)
+    assert summary["duplicates"] == 1 and db.count() == 5
+
+    plain = ids_of(db.search("python pandas models", n_results=3))
+    collapsed = db.search("python pandas models", n_results=3, dedupe=True)
+
+    assert {"qa_1", "qa_99"} <= set(plain)
+    kept = [doc_id for doc_id in ids_of(collapsed) if doc_id in ("qa_1", "qa_99")]
+    assert len(kept) == 1
+    assert collapsed["duplicate_counts"][0][ids_of(collapsed).index(kept[0])] == 1
+
+
+@pytest.mark.parametrize("mode", ["vector", "keyword", "hybrid"])
+@pytest.mark.parametrize("shard_by", [None, "sector"])
+def test_search_many_matches_single_searches(make_db, encoder, mode, shard_by):
+    db = make_db(shard_by=shard_by)
+    db.add_documents(CVS, queue_size=0)
+    queries = ["python pandas", "budgets audits", "django react"]
+    filters = db.build_filters(skill="Python") if mode != "keyword" else None
+
+    calls = encoder.calls
+    batch = db.search_many(queries, n_results=2, filters=filters, mode=mode)
+
+    assert encoder.calls == calls + (mode != "keyword")
+    for i, query in enumerate(queries):
+        single = db.search(query, n_results=2, filter_dict=filters, mode=mode)
+        assert batch["ids"][i] == ids_of(single)
+        assert batch["documents"][i] == single["documents"][0]
+
+
+def test_pipelined_ingest_matches_inline_writes(make_db, tmp_path):
+    records = [cv(i, f"Dev {i}", "Web Development", "Python", f"project {i} uses python") for i in range(7)]
+    inline = make_db()
+    inline.add_documents(records, batch_size=2, queue_size=0)
+    pipelined = VectorDatabase(
+        persist_directory=str(tmp_path / "pipelined" / "vectordb"),
+        collection_name="cv_qa",
+        backend="numpy",
+        embedding_cache_size=0
+    )
+
+    summary = pipelined.add_documents(records, batch_size=2, queue_size=1)
+
+    assert summary["added"] == 7 and summary["timings"]["write_seconds"] is not None
+    assert pipelined.count() == inline.count() == 7
+    assert ids_of(pipelined.search("project 3", n_results=3)) == ids_of(inline.search("project 3", n_results=3))
+
+
+def test_write_errors_in_the_writer_thread_reach_the_caller(make_db, monkeypatch):
+    db = make_db()
+    write_batch = db._write_batch
+    written = []
+
+    def failing_write(changed, embeddings, previous):
+        if written:
+            raise OSError("disk full")
+        write_batch(changed, embeddings, previous)
+        written.append(len(changed))
+
+    monkeypatch.setattr(db, "_write_batch", failing_write)
+    records = [cv(i, f"Dev {i}", "Web Development", "Python", f"project {i}") for i in range(10)]
+
+    with pytest.raises(OSError, match="disk full"):
+        db.add_documents(records, batch_size=2, queue_size=1)
+    assert written == [2]
+
+
+def test_batch_writer_stops_accepting_batches_after_a_failure():
+    def fail(*item):
+        raise ValueError("bad batch")
+
+    writer = vector_database._BatchWriter(fail, queue_size=1)
+    writer.start()
+    writer.submit("first")
+    deadline = time.monotonic() + 5
+    while writer.error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with pytest.raises(ValueError):
+        writer.submit("second")
+    with pytest.raises(ValueError):
+        writer.close()
+    assert not writer.is_alive()
+
+
+def test_incremental_stats_match_a_full_recount(make_db):
+    db = make_db()
+    db.add_documents(CVS, queue_size=0)
+    changed = [dict(CVS[0], Sector="Finance"), CVS[1]]
+    db.add_documents(changed, queue_size=0, prune=True)
+
+    incremental = db.get_stats()
+    db._rebuild_stats()
+
+    assert incremental["total_documents"] == 2
+    assert incremental["sectors"] == {"Finance": 1, "Data Science": 1}
+    assert db.get_stats()["sectors"] == incremental["sectors"]
+    assert db.get_stats()["length_histograms"] == incremental["length_histograms"]
+
+
+def test_init_timings_and_warm_up_leave_the_caches_untouched(make_db, encoder):
+    db = make_db(embedding_cache_size=16)
+    db.add_documents(CVS, queue_size=0)
+    assert {"encoder", "backend", "lexical_index", "total"} <= set(db.init_timings)
+
+    calls = encoder.calls
+    cached = db.embedding_cache.get_stats()["entries"]
+    timings = db.warm_up()
+
+    assert set(timings) == {"encoder_wait", "encode", "query"}
+    assert encoder.calls == calls + 1
+    assert db.query_cache.get_stats()["entries"] == 0
+    assert db.embedding_cache.get_stats()["entries"] == cached
@@ -1,130 +1,779 @@
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 import json
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional
 import logging
-from tqdm import tqdm
+from itertools import islice
+import numpy as np
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from cache_utils import LRUCache, SingleFlight
+from collection_stats import CollectionStats
+from embedding_cache import EmbeddingCache, normalize_text
+from encoders import EncoderPool, cache_model_key, resolve_encoder
+from index_backends import create_backend
+from near_duplicates import NearDuplicateIndex
+from sharding import ShardRouter, ShardedBackend
+from snapshot import SnapshotError, read_snapshot, write_snapshot
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class _BatchWriter(threading.Thread):
+    """Background thread that writes embedded batches while the next one is encoded
+    
+    Batches are handed over through a bounded queue, so the encoder blocks
+    (backpressure) when writes fall behind by more than `queue_size` batches.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, write_fn, queue_size: int = 2):
+        super().__init__(name="vector-db-writer", daemon=True)
+        self.write_fn = write_fn
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.write_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.batches_written = 0
+    
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            if self.error is not None:
+                continue  # Drain remaining batches after a failure
+            try:
+                started = time.perf_counter()
+                self.write_fn(*item)
+                self.write_seconds += time.perf_counter() - started
+                self.batches_written += 1
+            except Exception as e:
+                self.error = e
+    
+    def submit(self, *item):
+        """Queue a batch for writing, blocking while the queue is full"""
+        started = time.perf_counter()
+        while True:
+            if self.error is not None:
+                raise self.error
+            try:
+                self.queue.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self.wait_seconds += time.perf_counter() - started
+    
+    def close(self):
+        """Wait for queued batches to be written and re-raise any write error"""
+        self.queue.put(self._STOP)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+class _CollectionState:
+    """Index backend and sidecar indexes of one physical collection"""
+    
+    def __init__(self, name: str, backend, lexical_index: BM25Index, duplicate_index: NearDuplicateIndex, stats: CollectionStats):
+        self.name = name
+        self.backend = backend
+        self.lexical_index = lexical_index
+        self.duplicate_index = duplicate_index
+        self.stats = stats
+    
+    def sidecar_paths(self) -> List[Path]:
+        return [self.lexical_index.path, self.duplicate_index.path, self.stats.path]
+
 class VectorDatabase:
-    """Manage ChromaDB vector database for legal Q&A documents"""
+    """Manage the vector database for legal Q&A and CV documents
+    
+    Storage and nearest-neighbour search are delegated to a pluggable index
+    backend (ChromaDB by default, or an in-process NumPy exact-search index).
+    """
+    
+    SEARCH_MODES = ("vector", "keyword", "hybrid")
+    DUPLICATE_POLICIES = ("off", "tag", "skip", "merge")
+    # Extra candidates fetched per requested result when collapsing duplicates
+    DEDUPE_OVERFETCH = 3
     
     def __init__(
         self, 
         persist_directory: str = "data/vectordb",
         embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
-        collection_name: str = "legal_qa"
+        collection_name: str = "legal_qa",
+        embedding_cache_size: int = 100_000,
+        query_cache_size: int = 1024,
+        backend: str = "chroma",
+        backend_options: Optional[Dict] = None,
+        embedding_backend: str = "torch",
+        shard_by: Optional[str] = None,
+        router_options: Optional[Dict] = None,
+        duplicate_threshold: float = 0.85,
+        retain_versions: int = 1
     ):
         self.persist_directory = Path(persist_directory)
         self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self.init_timings: Dict[str, float] = {}
+        started = time.perf_counter()
         
-        # Initialize embedding model
-        logger.info(f"Loading embedding model: {embedding_model}")
-        self.embedding_model = SentenceTransformer(embedding_model)
-        
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=str(self.persist_directory),
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
+        # Load the embedding model (torch, ONNX or int8 ONNX) in the background;
+        # it is the slowest step and independent of opening the index. The
+        # first encode waits for it if it is not ready yet.
+        logger.info(f"Loading embedding model: {embedding_model} ({embedding_backend})")
+        self.embedding_model_name = embedding_model
+        self.requested_embedding_backend = embedding_backend
+        self._encoder_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder-loader")
+        self._encoder_future = self._encoder_loader.submit(
+            self._timed, 'encoder', self._load_encoder,
+            embedding_model, embedding_backend, embedding_cache_size
         )
+        self._encoder_loader.shutdown(wait=False)
         
-        # Get or create collection
+        # In-process LRU of normalized query -> embedding for repeated searches
+        self.query_cache = LRUCache(max_size=query_cache_size)
+        # Concurrent identical searches share one execution
+        self.search_flights = SingleFlight()
+        
+        # Initialize index backend. `collection_name` is the logical name; the
+        # physical collection it points to changes with each blue/green rebuild.
         self.collection_name = collection_name
-        self.collection = self._get_or_create_collection()
+        self.backend_name = backend
+        self.backend_options = backend_options or {}
+        self.shard_by = shard_by
+        self.router_options = router_options or {}
+        self.duplicate_threshold = duplicate_threshold
+        self.retain_versions = max(1, retain_versions)
+        if shard_by not in (None, "sector"):
+            raise ValueError(f"Unknown shard_by '{shard_by}', expected 'sector' or None")
+        
+        self.pointer_path = self.persist_directory / f"{collection_name}.pointer.json"
+        self._state_lock = threading.RLock()
+        self._local = threading.local()
+        # Advanced whenever the served content changes, so caches of search
+        # results and answers can tell they are stale
+        self.index_version = 0
+        self._state = None
+        self._state = self._open_collection(self._read_pointer().get('active', collection_name))
         
+        self.init_timings['total'] = round(time.perf_counter() - started, 3)
         logger.info(f"Vector database initialized at {self.persist_directory}")
     
-    def _get_or_create_collection(self):
-        """Get existing collection or create new one"""
+    def _open_collection(self, name: str) -> _CollectionState:
+        """Open a physical collection with its lexical, duplicate and stats sidecars"""
+        if self.shard_by == "sector":
+            # One child index per Sector; queries are routed to the relevant shards
+            backend = self._timed(
+                'backend', ShardedBackend,
+                str(self.persist_directory), name,
+                backend=self.backend_name,
+                router=ShardRouter(**self.router_options),
+                **self.backend_options
+            )
+        else:
+            backend = self._timed(
+                'backend', create_backend,
+                self.backend_name, str(self.persist_directory), name, **self.backend_options
+            )
+        
+        state = _CollectionState(
+            name=name,
+            backend=backend,
+            # Lexical index kept in sync with the collection for keyword/hybrid search
+            lexical_index=self._timed('lexical_index', BM25Index, self.persist_directory / f"bm25_{name}.json"),
+            # MinHash/LSH signatures grouping near-identical CVs into clusters
+            duplicate_index=self._timed(
+                'duplicate_index', NearDuplicateIndex,
+                self.persist_directory / f"minhash_{name}.npz",
+                threshold=self.duplicate_threshold
+            ),
+            # Corpus statistics maintained on every write, so get_stats() is O(1)
+            stats=self._timed('stats', CollectionStats, self.persist_directory / f"stats_{name}.json")
+        )
+        
+        with self._using(state):
+            count = backend.count()
+            if len(state.lexical_index) != count:
+                self._timed('lexical_index_rebuild', self._rebuild_lexical_index)
+            if len(state.duplicate_index) != count:
+                self._timed('duplicate_index_rebuild', self._rebuild_duplicate_index)
+            if len(state.stats) != count:
+                self._timed('stats_rebuild', self._rebuild_stats)
+        
+        return state
+    
+    @contextmanager
+    def _using(self, state: _CollectionState):
+        """Point this thread's reads and writes at `state` instead of the live collection"""
+        previous = getattr(self._local, 'state', None)
+        self._local.state = state
+        try:
+            yield state
+        finally:
+            self._local.state = previous
+    
+    @property
+    def _current(self) -> _CollectionState:
+        return getattr(self._local, 'state', None) or self._state
+    
+    def _index_changed(self):
+        """Advance index_version after a write to the live collection"""
+        if self._current is self._state:
+            with self._state_lock:
+                self.index_version += 1
+    
+    @property
+    def active_collection(self) -> str:
+        """Physical name of the collection being served"""
+        return self._current.name
+    
+    @property
+    def backend(self):
+        return self._current.backend
+    
+    @property
+    def lexical_index(self) -> BM25Index:
+        return self._current.lexical_index
+    
+    @property
+    def duplicate_index(self) -> NearDuplicateIndex:
+        return self._current.duplicate_index
+    
+    @property
+    def stats(self) -> CollectionStats:
+        return self._current.stats
+    
+    def _timed(self, phase: str, fn, *args, **kwargs):
+        """Call fn and record how long it took under init_timings[phase]"""
+        phase_started = time.perf_counter()
         try:
-            collection = self.client.get_collection(name=self.collection_name)
-            count = collection.count()
-            logger.info(f"Loaded existing collection '{self.collection_name}' with {count} documents")
-            return collection
-        except Exception:
-            logger.info(f"Creating new collection '{self.collection_name}'")
-            return self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "Indian Law Q&A Dataset - Instruction-Response pairs"}
+            return fn(*args, **kwargs)
+        finally:
+            self.init_timings[phase] = round(time.perf_counter() - phase_started, 3)
+    
+    def _load_encoder(self, model_name: str, backend: str, embedding_cache_size: int) -> tuple:
+        """Load the encoder, then open the embedding cache for the backend it resolved to
+        
+        Returns:
+            (encoder, backend in use after any fallback to torch, embedding cache or None)
+        """
+        encoder, resolved = resolve_encoder(
+            model_name, backend, cache_dir=str(self.persist_directory.parent / "encoders")
+        )
+        if resolved != backend:
+            logger.warning(f"Requested {backend} encoder is not available; vectors come from {resolved}")
+        
+        # Persistent embedding cache, shared by all collections next to the DB directory
+        cache = None
+        if embedding_cache_size > 0:
+            cache = self._timed(
+                'embedding_cache', EmbeddingCache,
+                cache_dir=str(self.persist_directory.parent / "embedding_cache"),
+                model_name=cache_model_key(model_name, resolved),
+                max_entries=embedding_cache_size
+            )
+        return encoder, resolved, cache
+    
+    @property
+    def embedding_model(self):
+        """The loaded encoder; blocks until background loading has finished"""
+        return self._encoder_future.result()[0]
+    
+    @property
+    def embedding_backend(self) -> str:
+        """Backend the encoder actually uses, which is torch if ONNX loading fell back"""
+        return self._encoder_future.result()[1]
+    
+    @property
+    def encoder_key(self) -> str:
+        """Identifies the vectors this encoder produces
+        
+        Part of every content hash and the embedding cache namespace, so
+        switching to an encoder with different vectors re-embeds.
+        """
+        return cache_model_key(self.embedding_model_name, self.embedding_backend)
+    
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        """Embedding cache namespaced by encoder_key, or None if disabled"""
+        return self._encoder_future.result()[2]
+    
+    def warm_up(self) -> Dict[str, float]:
+        """Run a dummy encode and query so the first real request is not the slow one
+        
+        Bypasses the embedding and query caches so they are not polluted.
+        
+        Returns:
+            Seconds spent waiting for the encoder, encoding and querying
+        """
+        timings = {}
+        
+        phase_started = time.perf_counter()
+        encoder = self.embedding_model
+        timings['encoder_wait'] = round(time.perf_counter() - phase_started, 3)
+        
+        phase_started = time.perf_counter()
+        embedding = encoder.encode(["warm up query"], convert_to_numpy=True, show_progress_bar=False)
+        timings['encode'] = round(time.perf_counter() - phase_started, 3)
+        
+        phase_started = time.perf_counter()
+        if self.backend.count() > 0:
+            self.backend.query(query_embeddings=np.asarray(embedding, dtype=np.float32), n_results=1)
+        self.lexical_index.search("warm up query", n_results=1)
+        timings['query'] = round(time.perf_counter() - phase_started, 3)
+        
+        logger.info(f"Warm-up complete: {timings}")
+        return timings
+    
+    def count(self) -> int:
+        """Number of documents in the index"""
+        return self.backend.count()
+    
+    def get_documents(self, ids: List[str]) -> Dict:
+        """Fetch stored documents and metadata by ID
+        
+        IDs of duplicates that were merged at ingest resolve to the stored document.
+        """
+        ids = [self.duplicate_index.merged_into(doc_id) or doc_id for doc_id in ids]
+        return self.backend.get(ids=ids, include=['documents', 'metadatas'])
+    
+    def _rebuild_lexical_index(self, page_size: int = 1000):
+        """Rebuild the BM25 index from the documents stored in the collection"""
+        logger.info(f"Rebuilding BM25 index for '{self.active_collection}'...")
+        self.lexical_index.clear()
+        
+        total = self.backend.count()
+        for offset in range(0, total, page_size):
+            page = self.backend.get(limit=page_size, offset=offset, include=['documents'])
+            self.lexical_index.add_many(page['ids'], page['documents'])
+        
+        self.lexical_index.save()
+        logger.info(f"BM25 index rebuilt with {len(self.lexical_index)} documents")
+    
+    def _rebuild_duplicate_index(self, page_size: int = 1000):
+        """Re-sign all stored documents and recompute duplicate clusters"""
+        logger.info(f"Rebuilding near-duplicate index for '{self.active_collection}'...")
+        self.duplicate_index.clear()
+        
+        total = self.backend.count()
+        for offset in range(0, total, page_size):
+            page = self.backend.get(limit=page_size, offset=offset, include=['documents'])
+            for doc_id, document in zip(page['ids'], page['documents']):
+                self.duplicate_index.assign(doc_id, document)
+        
+        self.duplicate_index.save()
+        stats = self.duplicate_index.get_stats()
+        logger.info(f"Near-duplicate index rebuilt: {stats['documents']} documents in {stats['clusters']} clusters")
+    
+    def _rebuild_stats(self, page_size: int = 1000):
+        """Recompute collection statistics from the stored metadata"""
+        logger.info(f"Rebuilding collection stats for '{self.active_collection}'...")
+        
+        def metadatas():
+            total = self.backend.count()
+            for offset in range(0, total, page_size):
+                page = self.backend.get(limit=page_size, offset=offset, include=['metadatas'])
+                yield from page['metadatas'] or []
+        
+        self.stats.rebuild(metadatas())
+        self.stats.save()
+        logger.info(f"Collection stats rebuilt for {len(self.stats)} documents")
+    
+    def _encode(self, texts: List[str], show_progress_bar: bool = False, encoder=None) -> np.ndarray:
+        """Encode texts, reading from and filling the embedding cache
+        
+        `encoder` overrides the in-process model, e.g. with an EncoderPool.
+        """
+        encoder = encoder or self.embedding_model
+        
+        if self.embedding_cache is None:
+            return encoder.encode(
+                texts,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True
             )
+        
+        cached = self.embedding_cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = encoder.encode(
+                missing_texts,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True
+            )
+            self.embedding_cache.put_many(missing_texts, encoded)
+            for i, embedding in zip(missing, encoded):
+                cached[i] = embedding
+        
+        return np.vstack(cached)
+    
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed search queries, using the in-process LRU before the model
+        
+        All queries missing from the LRU are encoded in a single batch.
+        """
+        keys = [normalize_text(query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        if missing:
+            encoded = dict(zip(missing, self._encode(missing).tolist()))
+            for key, embedding in encoded.items():
+                self.query_cache.put(key, embedding)
+            embeddings = [encoded[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        
+        return embeddings
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a single search query"""
+        return self._embed_queries([query])[0]
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embedding of a search query (cached, so cheap right after search())"""
+        return self._embed_query(query)
     
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a list of texts"""
-        embeddings = self.embedding_model.encode(
-            texts,
-            show_progress_bar=True,
-            convert_to_numpy=True
-        )
+        embeddings = self._encode(texts, show_progress_bar=True)
         return embeddings.tolist()
     
-    def add_documents(self, qa_pairs: List[Dict], batch_size: int = 100):
-        """Add Q&A pairs to vector database
+    @staticmethod
+    def _structured_metadata(qa: Dict) -> Dict:
+        """Typed candidate fields stored as filterable metadata
         
-        Args:
-            qa_pairs: List of dicts with 'id', 'Instruction', 'Response' keys
-            batch_size: Number of documents to process in each batch
+        Chroma metadata values cannot be None or empty lists, so missing
+        fields are left out.
         """
-        logger.info(f"Adding {len(qa_pairs)} Q&A pairs to vector database...")
+        metadata = {}
         
-        # Prepare data
-        ids = []
-        documents = []
-        metadatas = []
+        if qa.get('Name'):
+            metadata['Name'] = str(qa['Name'])
         
-        for qa in qa_pairs:
-            # Create unique ID
-            doc_id = f"qa_{qa['id']}"
-            ids.append(doc_id)
-            
-            # Combine Instruction and Response for embedding
-            # This helps the model understand context better
-            combined_text = f"Question: {qa['Instruction']}\n\nAnswer: {qa['Response']}"
-            documents.append(combined_text)
-            
-            # Store metadata separately for retrieval
-            metadata = {
-                'id': str(qa['id']),
-                'instruction': qa['Instruction'][:500],  # Truncate for storage
-                'response': qa['Response'][:500],  # Truncate for storage
-                'instruction_length': str(len(qa['Instruction'])),
-                'response_length': str(len(qa['Response']))
-            }
-            metadatas.append(metadata)
-        
-        # Add to database in batches
-        logger.info(f"Processing in batches of {batch_size}...")
-        
-        for i in tqdm(range(0, len(documents), batch_size), desc="Adding batches"):
-            batch_ids = ids[i:i + batch_size]
-            batch_docs = documents[i:i + batch_size]
-            batch_metadata = metadatas[i:i + batch_size]
+        if qa.get('Sector'):
+            metadata['Sector'] = str(qa['Sector'])
+            metadata['sector_key'] = str(qa['Sector']).strip().lower()
+        
+        if qa.get('Email'):
+            metadata['Email'] = ', '.join(qa['Email']) if isinstance(qa['Email'], list) else str(qa['Email'])
+        
+        # Chroma releases before array metadata reject list values, so skills
+        # are stored as a display string plus one boolean key per skill
+        skills = parse_skills(qa.get('Skills'))
+        if skills:
+            metadata['skills'] = ', '.join(skills)
+            for skill in skills:
+                metadata[skill_key(skill)] = True
+        
+        if qa.get('source'):
+            metadata['source'] = str(qa['source'])
+        
+        return metadata
+    
+    @staticmethod
+    def build_filters(sector: Optional[str] = None, skill: Optional[str] = None) -> Optional[Dict]:
+        """Build a metadata `where` clause for sector and skill filters"""
+        conditions = []
+        
+        if sector:
+            conditions.append({'sector_key': sector.strip().lower()})
+        
+        if skill:
+            conditions.append({skill_key(skill): {'$eq': True}})
+        
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {'$and': conditions}
+    
+    @staticmethod
+    def _content_hash(document: str, metadata: Dict, encoder_key: str) -> str:
+        """Compute a stable hash of a document, its metadata and the encoder that embeds it"""
+        payload = json.dumps(
+            {'document': document, 'metadata': metadata, 'encoder': encoder_key},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _get_stored_metadata(self, ids: List[str]) -> Dict[str, Dict]:
+        """Fetch stored metadata (including content hashes) for the given document IDs"""
+        existing = self.backend.get(ids=ids, include=['metadatas'])
+        return {
+            doc_id: metadata or {}
+            for doc_id, metadata in zip(existing['ids'], existing['metadatas'] or [])
+        }
+    
+    def _prepare_document(self, qa: Dict) -> tuple:
+        """Build the ID, embedding text and metadata stored for one Q&A pair"""
+        # Create unique ID
+        doc_id = f"qa_{qa['id']}"
+        
+        # Combine Instruction and Response for embedding
+        # This helps the model understand context better
+        combined_text = f"Question: {qa['Instruction']}\n\nAnswer: {qa['Response']}"
+        
+        # Store metadata separately for retrieval
+        metadata = {
+            'id': str(qa['id']),
+            'instruction': qa['Instruction'][:500],  # Truncate for storage
+            'response': qa['Response'][:500],  # Truncate for storage
+            'instruction_length': str(len(qa['Instruction'])),
+            'response_length': str(len(qa['Response']))
+        }
+        metadata.update(self._structured_metadata(qa))
+        metadata['content_hash'] = self._content_hash(combined_text, metadata, self.encoder_key)
+        
+        return doc_id, combined_text, metadata
+    
+    def _select_changed(self, batch: List[tuple], summary: Dict) -> tuple:
+        """Keep only records that are new or whose content hash changed
+        
+        Returns:
+            (changed records, stored metadata of the changed records that already exist)
+        """
+        stored = self._get_stored_metadata([doc_id for doc_id, _, _ in batch])
+        
+        changed = []
+        previous = {}
+        for doc_id, document, metadata in batch:
+            if doc_id in stored and stored[doc_id].get('content_hash') == metadata['content_hash']:
+                summary['unchanged'] += 1
+                continue
+            if doc_id in stored:
+                summary['updated'] += 1
+                previous[doc_id] = stored[doc_id]
+            else:
+                summary['added'] += 1
+            changed.append((doc_id, document, metadata))
+        
+        return changed, previous
+    
+    def _resolve_duplicates(self, changed: List[tuple], previous: Dict[str, Dict], policy: str, summary: Dict) -> List[tuple]:
+        """Assign duplicate clusters and apply the duplicate policy to new records
+        
+        Every stored record is tagged with its `dup_cluster`. With "skip" or
+        "merge", new records that duplicate a stored one are dropped before
+        encoding; "merge" also records the dropped ID as an alias of the
+        stored document. Updates of existing records are always kept.
+        """
+        if policy == "off":
+            return changed
+        
+        kept = []
+        for doc_id, document, metadata in changed:
+            if policy in ("skip", "merge") and doc_id not in previous:
+                duplicate_of = self.duplicate_index.check(doc_id, document)
+                if duplicate_of is not None:
+                    summary['added'] -= 1
+                    summary['duplicates'] += 1
+                    if policy == "merge":
+                        self.duplicate_index.add_alias(doc_id, duplicate_of)
+                    continue
             
-            # Generate embeddings for batch
-            batch_embeddings = self.generate_embeddings(batch_docs)
+            cluster, duplicate_of = self.duplicate_index.assign(doc_id, document)
+            metadata['dup_cluster'] = cluster
+            if duplicate_of is not None:
+                summary['duplicates'] += 1
+            kept.append((doc_id, document, metadata))
+        
+        return kept
+    
+    def _write_batch(self, changed: List[tuple], embeddings: np.ndarray, previous: Dict[str, Dict]):
+        """Upsert embedded records into the index backend, lexical index and stats"""
+        ids = [doc_id for doc_id, _, _ in changed]
+        documents = [document for _, document, _ in changed]
+        
+        self.backend.upsert(
+            ids=ids,
+            documents=documents,
+            metadatas=[metadata for _, _, metadata in changed],
+            embeddings=embeddings
+        )
+        self.lexical_index.add_many(ids, documents)
+        for doc_id, _, metadata in changed:
+            self.stats.add(metadata, previous.get(doc_id))
+        self._index_changed()
+    
+    def add_documents(
+        self,
+        qa_pairs: Iterable[Dict],
+        batch_size: int = 100,
+        prune: bool = False,
+        queue_size: int = 2,
+        workers: int = 1,
+        duplicates: str = "tag"
+    ) -> Dict:
+        """Add or update Q&A pairs in the vector database
+        
+        Every document is stored with a hash of its content, so records that
+        are already indexed and unchanged are skipped. Only new or modified
+        records are embedded and upserted. Records are consumed lazily in
+        batches, so any iterable (e.g. a streaming loader) keeps memory flat.
+        
+        Ingestion is pipelined: while batch N is written to the index by a
+        background writer, batch N+1 is already being encoded.
+        
+        Args:
+            qa_pairs: Iterable of dicts with 'id', 'Instruction', 'Response' keys and
+                optional 'Name', 'Sector', 'Email', 'Skills', 'source' fields
+            batch_size: Number of documents to process in each batch
+            prune: If True, delete stored documents whose IDs are not in qa_pairs
+            queue_size: Maximum number of encoded batches waiting to be written;
+                0 writes each batch synchronously
+            workers: Number of encoder processes; above 1, encoding is sharded
+                across a process pool with pinned per-worker thread counts
+            duplicates: Near-duplicate policy for new records: "tag" stores
+                them with a shared `dup_cluster`, "skip" drops them, "merge"
+                drops them and resolves their IDs to the stored copy, "off"
+                disables detection
             
-            # Add to collection
-            self.collection.add(
-                ids=batch_ids,
-                documents=batch_docs,
-                metadatas=batch_metadata,
-                embeddings=batch_embeddings
+        Returns:
+            Dictionary with counts of processed, added, updated, unchanged and
+            deleted documents, near-duplicates found, plus timing/throughput figures
+        """
+        if duplicates not in self.DUPLICATE_POLICIES:
+            raise ValueError(f"Unknown duplicate policy '{duplicates}', expected one of {self.DUPLICATE_POLICIES}")
+        
+        from tqdm import tqdm
+        
+        pool = None
+        if workers > 1:
+            # Give every worker a useful share of each batch
+            batch_size = max(batch_size, workers * 64)
+            # Waits for the background load, which has already done any ONNX
+            # export, and gives the workers the backend it resolved to
+            pool = EncoderPool(
+                self.embedding_model_name,
+                backend=self.embedding_backend,
+                cache_dir=str(self.persist_directory.parent / "encoders"),
+                workers=workers
             )
         
-        logger.info(f"✅ Successfully added {len(documents)} Q&A pairs")
-        logger.info(f"Total documents in collection: {self.collection.count()}")
+        logger.info(f"Syncing Q&A pairs with vector database in batches of {batch_size}...")
+        
+        summary = {'processed': 0, 'added': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'duplicates': 0}
+        seen_ids = set()
+        records = iter(qa_pairs)
+        
+        # The writer thread must write to the collection this call targets
+        # (the shadow one during a rebuild), not whatever is live
+        state = self._current
+        
+        def write_batch(*item):
+            with self._using(state):
+                self._write_batch(*item)
+        
+        writer = _BatchWriter(write_batch, queue_size) if queue_size > 0 else None
+        if writer is not None:
+            writer.start()
+        
+        started = time.perf_counter()
+        encode_seconds = 0.0
+        
+        try:
+            with tqdm(desc="Syncing batches", unit="batch") as progress:
+                while True:
+                    batch = [self._prepare_document(qa) for qa in islice(records, batch_size)]
+                    if not batch:
+                        break
+                    
+                    summary['processed'] += len(batch)
+                    seen_ids.update(doc_id for doc_id, _, _ in batch)
+                    
+                    changed, previous = self._select_changed(batch, summary)
+                    changed = self._resolve_duplicates(changed, previous, duplicates, summary)
+                    if changed:
+                        # Generate embeddings only for new or changed documents, kept as a
+                        # float32 array instead of Python float lists
+                        encode_started = time.perf_counter()
+                        embeddings = self._encode([document for _, document, _ in changed], encoder=pool)
+                        encode_seconds += time.perf_counter() - encode_started
+                        
+                        if writer is not None:
+                            writer.submit(changed, embeddings, previous)
+                        else:
+                            self._write_batch(changed, embeddings, previous)
+                    
+                    progress.update(1)
+        finally:
+            if writer is not None:
+                writer.close()
+            if pool is not None:
+                pool.close()
+        
+        elapsed = time.perf_counter() - started
+        embedded = summary['added'] + summary['updated']
+        summary['timings'] = {
+            'elapsed_seconds': round(elapsed, 3),
+            'encode_seconds': round(encode_seconds, 3),
+            'write_seconds': round(writer.write_seconds, 3) if writer is not None else None,
+            'encoder_blocked_seconds': round(writer.wait_seconds, 3) if writer is not None else None,
+            'embedded_docs_per_second': round(embedded / elapsed, 1) if elapsed > 0 else 0.0,
+            'encoder_workers': workers
+        }
+        
+        # Remove documents that are no longer in the source data
+        if prune and summary['processed'] == 0:
+            logger.warning("No records were read; skipping prune to avoid emptying the index")
+        elif prune:
+            stale_ids = sorted(set(self.backend.get(include=[])['ids']) - seen_ids)
+            for i in range(0, len(stale_ids), batch_size):
+                chunk = stale_ids[i:i + batch_size]
+                for metadata in self.backend.get(ids=chunk, include=['metadatas'])['metadatas'] or []:
+                    self.stats.remove(metadata)
+                self.backend.delete(ids=chunk)
+            for doc_id in stale_ids:
+                self.lexical_index.remove(doc_id)
+                self.duplicate_index.remove(doc_id)
+            summary['deleted'] = len(stale_ids)
+            if stale_ids:
+                self._index_changed()
+        
+        self.stats.record_build(summary)
+        
+        self.backend.flush()
+        self.lexical_index.save()
+        self.duplicate_index.save()
+        self.stats.save()
+        if self.embedding_cache is not None:
+            self.embedding_cache.flush()
+        
+        logger.info(
+            f"✅ Sync complete: {summary['added']} added, {summary['updated']} updated, "
+            f"{summary['unchanged']} unchanged, {summary['deleted']} deleted, "
+            f"{summary['duplicates']} near-duplicates ({duplicates})"
+        )
+        timings = summary['timings']
+        pipeline_timings = (
+            f", {timings['write_seconds']}s writing, encoder blocked {timings['encoder_blocked_seconds']}s"
+            if writer is not None else ", writes inline"
+        )
+        logger.info(
+            f"Throughput: {timings['embedded_docs_per_second']} docs/s embedded "
+            f"({timings['elapsed_seconds']}s total, {timings['encode_seconds']}s encoding{pipeline_timings})"
+        )
+        logger.info(f"Total documents in collection: {self.backend.count()}")
+        
+        return summary
     
     def search(
         self, 
         query: str, 
         n_results: int = 5,
-        filter_dict: Dict = None
+        filter_dict: Dict = None,
+        mode: str = "vector",
+        dedupe: bool = False
     ) -> Dict:
         """Search for similar Q&A pairs based on query
         
@@ -132,12 +781,46 @@ class VectorDatabase:
             query: The search query (can be a question or keywords)
             n_results: Number of top results to return
             filter_dict: Optional metadata filters
+            mode: "vector" (dense similarity), "keyword" (BM25 only, no
+                embedding model call) or "hybrid" (both, fused with
+                reciprocal rank fusion)
+            dedupe: Collapse near-duplicate clusters to their best-ranked
+                document; `duplicate_counts` reports how many were collapsed
             
         Returns:
             Dictionary with search results including documents and metadata
         """
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {self.SEARCH_MODES}")
+        
+        # Requests that arrive while an identical search against the same
+        # collection contents is running wait for it instead of repeating it;
+        # the shared result must not be modified by callers
+        key = (
+            self.active_collection,
+            self.index_version,
+            query,
+            n_results,
+            json.dumps(filter_dict, sort_keys=True, default=str) if filter_dict else None,
+            mode,
+            dedupe
+        )
+        return self.search_flights.do(key, lambda: self._search(query, n_results, filter_dict, mode, dedupe))
+    
+    def _search(self, query: str, n_results: int, filter_dict: Dict, mode: str, dedupe: bool) -> Dict:
+        """Uncoalesced search; see search()"""
+        if dedupe:
+            results = self._search(query, n_results * self.DEDUPE_OVERFETCH, filter_dict, mode, False)
+            return self._collapse_duplicates(results, n_results)
+        
+        if mode == "keyword":
+            return self._keyword_search(query, n_results, filter_dict)
+        
         # Generate query embedding
-        query_embedding = self.embedding_model.encode([query])[0].tolist()
+        query_embedding = self._embed_query(query)
+        
+        if mode == "hybrid":
+            return self._hybrid_search(query, query_embedding, n_results, filter_dict)
         
         # Search parameters
         search_params = {
@@ -149,11 +832,166 @@ class VectorDatabase:
         if filter_dict:
             search_params["where"] = filter_dict
         
-        # Perform search
-        results = self.collection.query(**search_params)
+        # Perform search (sharded indexes only search the shards the query is routed to)
+        if isinstance(self.backend, ShardedBackend):
+            return self.backend.routed_query(query, **search_params)
+        results = self.backend.query(**search_params)
         
         return results
     
+    def _collapse_duplicates(self, results: Dict, n_results: int) -> Dict:
+        """Keep the best-ranked document of each duplicate cluster"""
+        ids = results['ids'][0]
+        metadatas = (results.get('metadatas') or [[{}] * len(ids)])[0]
+        
+        kept = []
+        position = {}
+        counts = []
+        for i, (doc_id, metadata) in enumerate(zip(ids, metadatas)):
+            cluster = (metadata or {}).get('dup_cluster') or self.duplicate_index.cluster_of(doc_id)
+            if cluster in position:
+                counts[position[cluster]] += 1
+                continue
+            if len(kept) < n_results:
+                position[cluster] = len(kept)
+                kept.append(i)
+                counts.append(0)
+        
+        collapsed = {}
+        for field, values in results.items():
+            if isinstance(values, list) and values and isinstance(values[0], list) and len(values[0]) == len(ids):
+                collapsed[field] = [[values[0][i] for i in kept]]
+            else:
+                collapsed[field] = values
+        collapsed['duplicate_counts'] = [counts]
+        return collapsed
+    
+    def _lexical_candidates(self, query: str, n_candidates: int, filter_dict: Dict = None) -> List[tuple]:
+        """Top BM25 matches among the documents that pass the metadata filter
+        
+        The filter is resolved to a set of IDs before scoring, so the top
+        `n_candidates` are taken from the allowed documents rather than cut
+        from the global ranking first.
+        """
+        allowed = None
+        if filter_dict:
+            allowed = set(self.backend.get(where=filter_dict, include=[])['ids'])
+            if not allowed:
+                return []
+        
+        return self.lexical_index.search(query, n_results=n_candidates, allowed_ids=allowed)
+    
+    def _get_ordered(self, ids: List[str], include: List[str]) -> Dict:
+        """Fetch documents by ID, returned in the order of `ids`"""
+        fetched = self.backend.get(ids=ids, include=include)
+        position = {doc_id: i for i, doc_id in enumerate(fetched['ids'])}
+        order = [position[doc_id] for doc_id in ids if doc_id in position]
+        
+        ordered = {'ids': [fetched['ids'][i] for i in order]}
+        for field in include:
+            values = fetched.get(field)
+            ordered[field] = [values[i] for i in order] if values is not None else []
+        return ordered
+    
+    def _keyword_search(self, query: str, n_results: int, filter_dict: Dict = None) -> Dict:
+        """BM25-only search; distances are 1 - score normalized by the best score"""
+        hits = self._lexical_candidates(query, max(n_results * 4, 20), filter_dict)[:n_results]
+        fetched = self._get_ordered([doc_id for doc_id, _ in hits], ['documents', 'metadatas'])
+        
+        scores = dict(hits)
+        best = hits[0][1] if hits else 1.0
+        
+        return {
+            'ids': [fetched['ids']],
+            'documents': [fetched['documents']],
+            'metadatas': [fetched['metadatas']],
+            'distances': [[1 - scores[doc_id] / best for doc_id in fetched['ids']]]
+        }
+    
+    def _hybrid_search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        n_results: int,
+        filter_dict: Dict = None
+    ) -> Dict:
+        """Fuse dense and BM25 rankings with reciprocal rank fusion"""
+        n_candidates = max(n_results * 4, 20)
+        
+        search_params = {
+            "query_embeddings": [query_embedding],
+            "n_results": n_candidates,
+            "include": []
+        }
+        if filter_dict:
+            search_params["where"] = filter_dict
+        if isinstance(self.backend, ShardedBackend):
+            dense_ids = self.backend.routed_query(query, **search_params)['ids'][0]
+        else:
+            dense_ids = self.backend.query(**search_params)['ids'][0]
+        
+        lexical_ids = [doc_id for doc_id, _ in self._lexical_candidates(query, n_candidates, filter_dict)]
+        
+        fused = reciprocal_rank_fusion([dense_ids, lexical_ids])[:n_results]
+        fetched = self._get_ordered(
+            [doc_id for doc_id, _ in fused],
+            ['documents', 'metadatas', 'embeddings']
+        )
+        
+        # Report the true (squared L2) vector distance so relevance checks keep working
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        distances = [
+            float(np.sum((np.asarray(embedding, dtype=np.float32) - query_vector) ** 2))
+            for embedding in fetched['embeddings']
+        ]
+        
+        return {
+            'ids': [fetched['ids']],
+            'documents': [fetched['documents']],
+            'metadatas': [fetched['metadatas']],
+            'distances': [distances]
+        }
+    
+    def search_many(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        filters: Dict = None,
+        mode: str = "vector",
+        dedupe: bool = False
+    ) -> Dict:
+        """Search for several queries, embedding them all with one encode call
+        
+        Each query then runs through search(), so shard routing, coalescing
+        of identical in-flight searches and the search mode apply exactly as
+        for a single search; its embedding comes from the query cache.
+        
+        Args:
+            queries: List of search queries
+            n_results: Number of top results to return per query
+            filters: Optional metadata filters applied to every query
+            mode: "vector", "keyword" or "hybrid", as in search()
+            dedupe: Collapse near-duplicates, as in search()
+            
+        Returns:
+            Dictionary in the same format as search(), with one result list per query
+        """
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {self.SEARCH_MODES}")
+        
+        if mode != "keyword":
+            self._embed_queries(queries)
+        
+        merged: Dict[str, list] = {}
+        for query in queries:
+            results = self.search(query, n_results=n_results, filter_dict=filters, mode=mode, dedupe=dedupe)
+            for field, values in results.items():
+                # Per-query fields are lists holding one list for this query
+                if isinstance(values, list) and values and isinstance(values[0], list):
+                    merged.setdefault(field, []).append(values[0])
+        
+        return merged
+    
     def search_by_instruction(self, instruction: str, n_results: int = 5) -> List[Dict]:
         """Search specifically by instruction/question similarity
         
@@ -180,167 +1018,503 @@ class VectorDatabase:
         return formatted_results
     
     def get_stats(self) -> Dict:
-        """Get database statistics"""
-        count = self.collection.count()
-        
-        # Get sample documents to analyze
-        sample_size = min(100, count)
-        sample = self.collection.get(limit=sample_size)
+        """Get database statistics
         
-        stats = {
-            "total_qa_pairs": count,
+        Corpus figures come from the incrementally maintained stats record,
+        so this does not read any documents.
+        """
+        stats = self.stats.to_dict()
+        stats.update({
+            "categories": list(stats["sectors"]),
+            "document_types": list(stats["sources"]),
             "collection_name": self.collection_name,
-            "embedding_model": "sentence-transformers/all-MiniLM-L6-v2"
+            "active_collection": self.active_collection,
+            "index_version": self.index_version,
+            "backend": self.backend_name,
+            "shard_by": self.shard_by,
+            "embedding_model": self.embedding_model_name,
+            "embedding_backend": self.embedding_backend
+        })
+        
+        stats['query_cache'] = self.query_cache.get_stats()
+        stats['search_coalescing'] = self.search_flights.get_stats()
+        stats['near_duplicates'] = self.duplicate_index.get_stats()
+        if isinstance(self.backend, ShardedBackend):
+            stats['sharding'] = self.backend.shard_report()
+        if hasattr(self.backend, 'memory_footprint'):
+            stats['index_memory_bytes'] = self.backend.memory_footprint()
+        if self.embedding_cache is not None:
+            stats['embedding_cache'] = self.embedding_cache.get_stats()
+        
+        return stats
+    
+    # ------------------------------------------------------------------
+    # Blue/green rebuilds
+    # ------------------------------------------------------------------
+    
+    def _read_pointer(self) -> Dict:
+        """Active physical collection and retained previous versions"""
+        if not self.pointer_path.exists():
+            return {}
+        with open(self.pointer_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_pointer(self, active: str, history: List[str]):
+        """Atomically point the logical collection at a physical one"""
+        tmp_path = self.pointer_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'collection': self.collection_name,
+                'active': active,
+                'history': history,
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            }, f, indent=2)
+        os.replace(tmp_path, self.pointer_path)
+    
+    def _drop_collection(self, name: str, state: Optional[_CollectionState] = None):
+        """Delete a physical collection and its sidecar files"""
+        logger.info(f"Dropping collection '{name}'")
+        if state is not None:
+            backend = state.backend
+        elif self.shard_by == "sector":
+            backend = ShardedBackend(str(self.persist_directory), name, backend=self.backend_name, **self.backend_options)
+        else:
+            backend = create_backend(self.backend_name, str(self.persist_directory), name, **self.backend_options)
+        backend.drop()
+        
+        for path in (f"bm25_{name}.json", f"minhash_{name}.npz", f"stats_{name}.json"):
+            (self.persist_directory / path).unlink(missing_ok=True)
+    
+    def _validate_collection(self, state: _CollectionState, expected_count: int, min_documents: int):
+        """Check a freshly built collection before it is allowed to go live"""
+        count = state.backend.count()
+        if count < min_documents:
+            raise ValueError(f"Build produced {count} documents, expected at least {min_documents}")
+        if count != expected_count:
+            raise ValueError(f"Build produced {count} documents, expected {expected_count}")
+        if len(state.lexical_index) != count or len(state.stats) != count:
+            raise ValueError("Lexical index or stats are out of sync with the built collection")
+        
+        if count:
+            probe = state.backend.get(limit=1, include=['embeddings'])
+            hit = state.backend.query(
+                query_embeddings=np.asarray(probe['embeddings'][:1], dtype=np.float32),
+                n_results=1,
+                include=[]
+            )
+            if not hit['ids'][0]:
+                raise ValueError("Probe query against the built collection returned no results")
+    
+    def _build_and_swap(self, fill, min_documents: int = 1):
+        """Fill a new physical collection and make it live only if it validates
+        
+        `fill` runs with this thread pointed at the shadow collection, so
+        add_documents() and friends write there while other threads keep
+        reading the live collection. It returns (result, expected_count).
+        """
+        version = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        name = f"{self.collection_name}__{version}"
+        taken = {self._state.name, *self._read_pointer().get('history', [])}
+        suffix = 2
+        while name in taken:
+            name = f"{self.collection_name}__{version}-{suffix}"
+            suffix += 1
+        
+        logger.info(f"Building shadow collection '{name}' (live: '{self._state.name}')")
+        shadow = self._open_collection(name)
+        try:
+            with self._using(shadow):
+                result, expected_count = fill()
+                self._validate_collection(shadow, expected_count, min_documents)
+        except Exception as e:
+            logger.error(f"❌ Build of '{name}' failed, keeping '{self._state.name}' live: {e}")
+            self._drop_collection(name, shadow)
+            raise
+        
+        self._activate(shadow)
+        return result
+    
+    def _activate(self, state: _CollectionState):
+        """Swap the live collection, keeping the previous ones for rollback"""
+        with self._state_lock:
+            previous = self._state.name
+            history = [previous] + [
+                name for name in self._read_pointer().get('history', [])
+                if name not in (previous, state.name)
+            ]
+            retained, expired = history[:self.retain_versions], history[self.retain_versions:]
+            self._write_pointer(state.name, retained)
+            self._state = state
+            self.index_version += 1
+        
+        logger.info(f"✅ Collection '{self.collection_name}' now serves '{state.name}' (previous: '{previous}')")
+        for name in expired:
+            self._drop_collection(name)
+    
+    def rebuild(self, qa_pairs: Iterable[Dict], min_documents: int = 1, **add_options) -> Dict:
+        """Rebuild the collection from scratch without taking it offline
+        
+        Documents are added to a new versioned collection (`<name>__<version>`)
+        while searches keep using the live one. When the build finishes and
+        validates, the collection pointer is switched atomically; the old
+        version is retained for rollback().
+        
+        Args:
+            qa_pairs: Records to index, as accepted by add_documents()
+            min_documents: Minimum number of documents the new version must hold
+            **add_options: Passed to add_documents() (batch_size, workers, duplicates, ...)
+            
+        Returns:
+            add_documents() summary plus the new and previous collection names
+        """
+        previous = self._state.name
+        
+        def fill():
+            summary = self.add_documents(qa_pairs, **add_options)
+            return summary, summary['added']
+        
+        summary = self._build_and_swap(fill, min_documents=min_documents)
+        summary['active_collection'] = self.active_collection
+        summary['previous_collection'] = previous
+        return summary
+    
+    def rollback(self) -> Dict:
+        """Switch back to the most recent retained version"""
+        with self._state_lock:
+            history = self._read_pointer().get('history', [])
+            if not history:
+                raise ValueError(f"No previous version of '{self.collection_name}' to roll back to")
+            
+            target = history[0]
+            state = self._open_collection(target)
+            current = self._state.name
+            self._write_pointer(target, [current] + history[1:])
+            self._state = state
+            self.index_version += 1
+        
+        logger.info(f"✅ Rolled '{self.collection_name}' back from '{current}' to '{target}'")
+        return {'active_collection': target, 'previous_collection': current}
+    
+    def list_versions(self) -> Dict:
+        """Live physical collection and retained versions, newest first"""
+        pointer = self._read_pointer()
+        return {
+            'collection': self.collection_name,
+            'active': self._state.name,
+            'history': pointer.get('history', []),
+            'updated_at': pointer.get('updated_at')
         }
+    
+    def export_snapshot(self, path: str, page_size: int = 1000) -> Dict:
+        """Write the collection (vectors, documents, metadata) to a snapshot directory
         
-        # Calculate average lengths if we have samples
-        if sample['metadatas']:
-            instruction_lengths = []
-            response_lengths = []
+        Args:
+            path: Snapshot directory to create
+            page_size: Number of records read from the backend at a time
             
-            for metadata in sample['metadatas']:
-                if 'instruction_length' in metadata:
-                    instruction_lengths.append(int(metadata['instruction_length']))
-                if 'response_length' in metadata:
-                    response_lengths.append(int(metadata['response_length']))
+        Returns:
+            The snapshot manifest
+        """
+        logger.info(f"Exporting snapshot of '{self.collection_name}' to {path}...")
+        started = time.perf_counter()
+        
+        total = self.backend.count()
+        dimension = 0
+        if total:
+            first = self.backend.get(limit=1, include=['embeddings'])
+            dimension = len(first['embeddings'][0])
+        
+        def pages():
+            for offset in range(0, total, page_size):
+                yield self.backend.get(
+                    limit=page_size,
+                    offset=offset,
+                    include=['documents', 'metadatas', 'embeddings']
+                )
+        
+        manifest = write_snapshot(path, pages(), total, dimension, {
+            'collection_name': self.collection_name,
+            'embedding_model': self.embedding_model_name,
+            'embedding_backend': self.embedding_backend
+        }, aliases=self.duplicate_index.aliases())
+        
+        logger.info(f"✅ Exported {total} documents in {time.perf_counter() - started:.2f}s")
+        return manifest
+    
+    def import_snapshot(self, path: str, force: bool = False, batch_size: int = 1000, verify: bool = True) -> Dict:
+        """Replace the collection with the contents of a snapshot, without re-embedding
+        
+        Args:
+            path: Snapshot directory written by export_snapshot
+            force: Import even if the snapshot was built with a different embedding
+                model or an encoder backend that produces different vectors
+            batch_size: Number of records written to the backend at a time
+            verify: Check file checksums before importing
             
-            if instruction_lengths:
-                stats['avg_instruction_length'] = sum(instruction_lengths) // len(instruction_lengths)
-            if response_lengths:
-                stats['avg_response_length'] = sum(response_lengths) // len(response_lengths)
+        Returns:
+            The snapshot manifest
+        """
+        logger.info(f"Importing snapshot from {path} into '{self.collection_name}'...")
+        started = time.perf_counter()
         
-        return stats
+        manifest, vectors, ids, documents, metadatas, aliases = read_snapshot(path, verify=verify)
+        if manifest.get('embedding_model') != self.embedding_model_name and not force:
+            raise SnapshotError(
+                f"Snapshot was embedded with {manifest.get('embedding_model')}, "
+                f"but this database uses {self.embedding_model_name}"
+            )
+        
+        # torch and fp32 ONNX share vectors; the int8 encoder does not
+        snapshot_backend = manifest.get('embedding_backend', 'torch')
+        snapshot_encoder = cache_model_key(self.embedding_model_name, snapshot_backend)
+        if snapshot_encoder != self.encoder_key:
+            message = (
+                f"Snapshot was embedded with the {snapshot_backend} encoder, "
+                f"but this database uses {self.embedding_backend}"
+            )
+            if not force:
+                raise SnapshotError(message)
+            logger.warning(f"{message}; importing anyway (force)")
+        
+        # Load into a shadow collection that replaces the live one once complete
+        def fill():
+            for i in range(0, len(ids), batch_size):
+                batch_ids = ids[i:i + batch_size]
+                self.backend.add(
+                    ids=batch_ids,
+                    embeddings=np.asarray(vectors[i:i + batch_size], dtype=np.float32),
+                    documents=documents[i:i + batch_size],
+                    metadatas=metadatas[i:i + batch_size]
+                )
+                self.lexical_index.add_many(batch_ids, documents[i:i + batch_size])
+                for metadata in metadatas[i:i + batch_size]:
+                    self.stats.add(metadata)
+            
+            self.stats.record_build({'processed': len(ids), 'added': len(ids)})
+            self.backend.flush()
+            self.lexical_index.save()
+            self._rebuild_duplicate_index()
+            for doc_id, canonical_id in aliases.items():
+                self.duplicate_index.add_alias(doc_id, canonical_id)
+            self.duplicate_index.save()
+            self.stats.save()
+            return manifest, len(ids)
+        
+        self._build_and_swap(fill)
+        
+        logger.info(f"✅ Imported {len(ids)} documents in {time.perf_counter() - started:.2f}s")
+        return manifest
     
     def reset_database(self):
         """Reset the entire database (use with caution!)"""
         logger.warning("Resetting database...")
-        self.client.delete_collection(name=self.collection_name)
-        self.collection = self._get_or_create_collection()
+        self.backend.reset()
+        self.lexical_index.clear()
+        self.lexical_index.save()
+        self.duplicate_index.clear()
+        self.duplicate_index.save()
+        self.stats.clear()
+        self.stats.save()
+        self._index_changed()
         logger.info("Database reset complete")
 
-def load_qa_data(filename: str = "legal_data_all.json", data_dir: str = "../scrapers/data/raw") -> List[Dict]:
-    """Load Q&A data from JSON file
+def skill_key(skill: str) -> str:
+    """Metadata key flagging that a document lists `skill`"""
+    return f"skill:{skill.strip().lower()}"
+
+def parse_skills(skills) -> List[str]:
+    """Normalize a CV skills field into a list of unique lowercase skills
+    
+    Accepts either a list of skills or a single string separated by commas,
+    semicolons, pipes, bullets or newlines.
+    """
+    if not skills:
+        return []
+    
+    if isinstance(skills, str):
+        items = re.split(r'[,;|\n•]+', skills)
+    else:
+        items = [str(item) for item in skills]
+    
+    parsed = []
+    for item in items:
+        skill = item.strip().strip('-*').strip().lower()
+        if skill and len(skill) <= 100 and skill not in parsed:
+            parsed.append(skill)
+    
+    return parsed[:50]
+
+# Whitespace and at most one comma between records of a JSON array
+_JSON_SEPARATOR = re.compile(r'\s*,?\s*')
+
+def iter_json_records(filepath: Path, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """Stream records from a JSON array or a JSON Lines file
+    
+    Files ending in .jsonl/.ndjson are read line by line. Other files must
+    contain a top-level JSON array, which is parsed incrementally so only
+    one record (plus a read buffer) is held in memory at a time.
+    """
+    filepath = Path(filepath)
+    
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if filepath.suffix.lower() in ('.jsonl', '.ndjson'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+        
+        decoder = json.JSONDecoder()
+        buffer = f.read(chunk_size)
+        pos = len(buffer) - len(buffer.lstrip())
+        if not buffer.startswith('[', pos):
+            raise json.JSONDecodeError("Expected a top-level JSON array", buffer, pos)
+        pos += 1
+        eof = False
+        
+        # Records are decoded in place from `pos`; the consumed prefix is only
+        # dropped when more data has to be read
+        while True:
+            pos = _JSON_SEPARATOR.match(buffer, pos).end()
+            if buffer.startswith(']', pos):
+                return
+            
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(max(chunk_size, len(buffer) - pos))
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            
+            yield record
+
+def load_qa_data(filename: str = "legal_data_all.json", data_dir: str = "../scrapers/data/raw") -> Iterator[Dict]:
+    """Stream Q&A data from a JSON or JSONL file
     
     Args:
-        filename: Name of the JSON file
+        filename: Name of the JSON (array) or JSONL file
         data_dir: Directory containing the data file
         
-    Returns:
-        List of Q&A pairs with id, Instruction, Response keys
+    Yields:
+        Q&A pairs with id, Instruction, Response keys
+        
+    A missing file yields nothing; malformed JSON is logged and re-raised.
     """
     filepath = Path(data_dir) / filename
     
     logger.info(f"Loading Q&A data from: {filepath}")
     
+    count = 0
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        logger.info(f"✅ Loaded {len(data)} Q&A pairs")
-        
-        # Validate format
-        if data and isinstance(data, list):
-            first_item = data[0]
-            required_keys = {'id', 'Instruction', 'Response'}
-            if not required_keys.issubset(first_item.keys()):
-                logger.warning(f"Data format unexpected. Expected keys: {required_keys}, Got: {first_item.keys()}")
+        for item in iter_json_records(filepath):
+            # Validate format
+            if count == 0:
+                required_keys = {'id', 'Instruction', 'Response'}
+                if not required_keys.issubset(item.keys()):
+                    logger.warning(f"Data format unexpected. Expected keys: {required_keys}, Got: {item.keys()}")
+            
+            count += 1
+            yield item
         
-        return data
+        logger.info(f"✅ Loaded {count} Q&A pairs")
         
     except FileNotFoundError:
         logger.error(f"❌ File not found: {filepath}")
         logger.info("Please run the data loader first: python ../scrapers/dt.py")
-        return []
     except json.JSONDecodeError as e:
-        logger.error(f"❌ Error decoding JSON: {e}")
-        return []
+        # Re-raise: a truncated stream must not be mistaken for the full dataset
+        logger.error(f"❌ Error decoding JSON after {count} records: {e}")
+        raise
     except Exception as e:
         logger.error(f"❌ Error loading data: {e}")
-        return []
+        raise
+
+def cv_to_qa(idx: int, cv: Dict) -> Dict:
+    """Convert one CV record into a Q&A pair for the vector database"""
+    # Create a comprehensive instruction-response pair for each CV
+    instruction = f"Tell me about {cv.get('Name', 'Unknown')}'s background and qualifications"
+    
+    # Build a detailed response with all CV information
+    response_parts = []
+    
+    if cv.get('Name'):
+        response_parts.append(f"**Name:** {cv['Name']}")
+    
+    if cv.get('Email'):
+        email_str = ', '.join(cv['Email']) if isinstance(cv['Email'], list) else cv['Email']
+        response_parts.append(f"**Email:** {email_str}")
+    
+    if cv.get('Sector'):
+        response_parts.append(f"**Sector/Role:** {cv['Sector']}")
+    
+    if cv.get('Experience'):
+        response_parts.append(f"**Experience:** {cv['Experience']}")
+    
+    if cv.get('Education'):
+        response_parts.append(f"**Education:** {cv['Education']}")
+    
+    if cv.get('Skills'):
+        response_parts.append(f"**Skills:** {cv['Skills']}")
+    
+    if cv.get('Projects'):
+        response_parts.append(f"**Projects:** {cv['Projects']}")
+    
+    if cv.get('Certifications'):
+        response_parts.append(f"**Certifications:** {cv['Certifications']}")
+    
+    if cv.get('Hobbies'):
+        response_parts.append(f"**Hobbies:** {cv['Hobbies']}")
+    
+    response = '\n\n'.join(response_parts)
+    
+    return {
+        'id': idx + 1,
+        'Instruction': instruction,
+        'Response': response,
+        'Name': cv.get('Name', 'Unknown'),
+        'Sector': cv.get('Sector', 'Unknown'),
+        'Email': cv.get('Email', []),
+        'Skills': parse_skills(cv.get('Skills')),
+        'source': 'CV Dataset'
+    }
 
-def load_cv_data(filename: str = "Dataset_CV.json", data_dir: str = "../scrapers/data/raw") -> List[Dict]:
-    """Load CV/Resume data from JSON file and convert to Q&A format
+def load_cv_data(filename: str = "Dataset_CV.json", data_dir: str = "../scrapers/data/raw") -> Iterator[Dict]:
+    """Stream CV/Resume data from a JSON or JSONL file, converted to Q&A format
     
     Args:
-        filename: Name of the JSON file containing CV data
+        filename: Name of the JSON (array) or JSONL file containing CV data
         data_dir: Directory containing the data file
         
-    Returns:
-        List of Q&A pairs formatted for vector database
+    Yields:
+        Q&A pairs formatted for vector database
+        
+    A missing file yields nothing; malformed JSON is logged and re-raised.
     """
     filepath = Path(data_dir) / filename
     
     logger.info(f"Loading CV data from: {filepath}")
     
+    count = 0
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            cv_data = json.load(f)
-        
-        logger.info(f"✅ Loaded {len(cv_data)} CV records")
-        
-        # Convert CV data to Q&A format
-        qa_data = []
-        for idx, cv in enumerate(cv_data):
-            # Create a comprehensive instruction-response pair for each CV
-            instruction = f"Tell me about {cv.get('Name', 'Unknown')}'s background and qualifications"
-            
-            # Build a detailed response with all CV information
-            response_parts = []
-            
-            if cv.get('Name'):
-                response_parts.append(f"**Name:** {cv['Name']}")
-            
-            if cv.get('Email'):
-                email_str = ', '.join(cv['Email']) if isinstance(cv['Email'], list) else cv['Email']
-                response_parts.append(f"**Email:** {email_str}")
-            
-            if cv.get('Sector'):
-                response_parts.append(f"**Sector/Role:** {cv['Sector']}")
-            
-            if cv.get('Experience'):
-                response_parts.append(f"**Experience:** {cv['Experience']}")
-            
-            if cv.get('Education'):
-                response_parts.append(f"**Education:** {cv['Education']}")
-            
-            if cv.get('Skills'):
-                response_parts.append(f"**Skills:** {cv['Skills']}")
-            
-            if cv.get('Projects'):
-                response_parts.append(f"**Projects:** {cv['Projects']}")
-            
-            if cv.get('Certifications'):
-                response_parts.append(f"**Certifications:** {cv['Certifications']}")
-            
-            if cv.get('Hobbies'):
-                response_parts.append(f"**Hobbies:** {cv['Hobbies']}")
-            
-            response = '\n\n'.join(response_parts)
-            
-            qa_item = {
-                'id': idx + 1,
-                'Instruction': instruction,
-                'Response': response,
-                'Name': cv.get('Name', 'Unknown'),
-                'Sector': cv.get('Sector', 'Unknown'),
-                'Email': cv.get('Email', []),
-                'source': 'CV Dataset'
-            }
-            
-            qa_data.append(qa_item)
+        for idx, cv in enumerate(iter_json_records(filepath)):
+            count += 1
+            yield cv_to_qa(idx, cv)
         
-        logger.info(f"✅ Converted {len(qa_data)} CV records to Q&A format")
-        return qa_data
+        logger.info(f"✅ Converted {count} CV records to Q&A format")
         
     except FileNotFoundError:
         logger.error(f"❌ File not found: {filepath}")
-        return []
     except json.JSONDecodeError as e:
-        logger.error(f"❌ Error decoding JSON: {e}")
-        return []
+        # Re-raise: a truncated stream must not be mistaken for the full dataset
+        logger.error(f"❌ Error decoding JSON after {count} records: {e}")
+        raise
     except Exception as e:
         logger.error(f"❌ Error loading CV data: {e}")
-        return []
+        raise
 
 def main():
     """Main function to setup vector database with CV data"""
@@ -356,51 +1530,45 @@ def main():
     )
     
     # Check if database is empty
-    current_count = db.collection.count()
+    current_count = db.count()
     
     if current_count == 0:
         print("\n[Database] Database is empty. Loading CV data...")
         
-        # Load CV data
+        # Load CV data (streamed, so only one batch is held in memory)
         cv_data = load_cv_data("Dataset_CV.json", "../scrapers/data/raw")
         
-        if not cv_data:
-            print("[Error] No CV data found. Please check the Dataset_CV.json file.")
-            return
-        
-        print(f"[Info] Found {len(cv_data)} CV records to add")
-        
         # Ask user if they want to add all or a subset
-        choice = input(f"\nAdd all {len(cv_data)} CV records? (y/n): ").lower().strip()
+        choice = input("\nAdd all CV records? (y/n): ").lower().strip()
         
         if choice != 'y':
             try:
                 num = int(input("Enter number of CV records to add: "))
-                cv_data = cv_data[:num]
             except:
                 print("Invalid input. Adding first 1000 records...")
-                cv_data = cv_data[:1000]
+                num = 1000
+            cv_data = islice(cv_data, num)
         
         # Add to database
-        print(f"\n[Processing] Adding {len(cv_data)} CV records to vector database...")
-        db.add_documents(cv_data, batch_size=100)
+        print("\n[Processing] Adding CV records to vector database...")
+        summary = db.add_documents(cv_data, batch_size=100)
+        
+        if summary['processed'] == 0:
+            print("[Error] No CV data found. Please check the Dataset_CV.json file.")
+            return
         
     else:
         print(f"\n[Database] Database already contains {current_count} CV records")
         
-        choice = input("\nAdd more data? (y/n): ").lower().strip()
+        choice = input("\nSync with the CV data file? (y/n): ").lower().strip()
         if choice == 'y':
             cv_data = load_cv_data("Dataset_CV.json", "../scrapers/data/raw")
-            if cv_data:
-                # Skip already added
-                start_id = current_count
-                new_data = [cv for cv in cv_data if cv['id'] >= start_id]
-                
-                if new_data:
-                    print(f"[Info] Found {len(new_data)} new CV records")
-                    db.add_documents(new_data, batch_size=100)
-                else:
-                    print("No new data to add.")
+            
+            # Only new or changed records are re-embedded; removed ones are deleted
+            summary = db.add_documents(cv_data, batch_size=100, prune=True)
+            
+            if summary['processed'] and not (summary['added'] or summary['updated'] or summary['deleted']):
+                print("Database is already up to date.")
     
     # Display stats
     print("\n" + "=" * 60)